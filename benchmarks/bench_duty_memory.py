@@ -0,0 +1,81 @@
+"""Compare memory held by active duty state: dict records vs DutyRecord.
+
+The old layout kept one dict per duty with two datetimes and a reference to
+the moderator's Member object, which also pins its roles, guild avatar and
+presence data. The stand-in member below is deliberately small, so the
+"dict" column understates what a real Member keeps alive.
+
+Usage: python benchmarks/bench_duty_memory.py [duty counts...]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from duty_record import DutyRecord
+
+
+class StandInMember:
+    """Rough shape of a cached discord.Member: a few strings, ids and a role list"""
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"mod{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.roles = [user_id + 1, user_id + 2]
+
+
+def dict_records(count, members):
+    now = datetime.now(timezone.utc)
+    return {
+        user_id: {
+            "user": members[user_id],
+            "start_time": now,
+            "last_continue": datetime.now(timezone.utc),
+            "continues": 3,
+            "reminder_seq": 4,
+            "awaiting_seq": 0,
+        }
+        for user_id in members
+    }
+
+
+def slotted_records(count, members):
+    now = time.time()
+    return {user_id: DutyRecord(user_id, now, now + 1.5, 3, 4, 0) for user_id in members}
+
+
+def measure(build, count, with_members):
+    members = {400000000000000000 + i: None for i in range(count)}
+    gc.collect()
+    tracemalloc.start()
+    if with_members:
+        # Members only count against dict records, which are what kept them alive
+        members = {user_id: StandInMember(user_id) for user_id in members}
+    started = time.perf_counter()
+    duties = build(count, members)
+    elapsed = time.perf_counter() - started
+    del members
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del duties
+    return current, elapsed
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'duties':>8} {'layout':>10} {'total MiB':>10} {'bytes/duty':>11} {'build ms':>9}")
+    for count in counts:
+        for name, build, with_members in (("dict", dict_records, True), ("slots", slotted_records, False)):
+            current, elapsed = measure(build, count, with_members)
+            print(f"{count:>8} {name:>10} {current / 2**20:>10.1f} {current / count:>11.0f} {elapsed * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
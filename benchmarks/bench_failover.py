@@ -0,0 +1,158 @@
+"""Kill the leader replica mid-shift and measure how long failover takes.
+
+Starts several replica processes, each running duty_bot with
+DUTY_REPLICATION=1 over a shared working directory and SQLite database, the
+way setup_hook does minus the gateway connection. Promotion goes through
+the bot's own become_leader, so it runs restore_active_duties and starts the
+scheduler. The first leader starts a duty (the shift) and checkpoints it.
+The harness then SIGKILLs the leader, so it never releases its lease, and
+waits for another replica's become_leader to restore the same duty with its
+expiry timer scheduled. Repeats for several rounds. Nothing talks to
+Discord; discord.py must still be installed because duty_bot imports it.
+
+Usage: python benchmarks/bench_failover.py [--replicas 3] [--rounds 3] [--ttl 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+GUILD_ID = 700000000000000000
+SHIFT_USER_ID = 400000000000000001
+
+
+def emit(event, **details):
+    print(json.dumps({"event": event, "pid": os.getpid(), "at": time.time(), **details}), flush=True)
+
+
+async def run_replica(directory, ttl):
+    os.chdir(directory)  # every replica shares the data files and the lease database
+    os.environ.update({
+        "DUTY_STORAGE": "sqlite",
+        "DUTY_REPLICATION": "1",
+        "DUTY_LEASE_TTL": str(ttl),
+        "DUTY_HOME_GUILD_ID": str(GUILD_ID),
+        "DUTY_LOG_STDOUT": "0",
+        "DUTY_LOG_FILE": os.path.join(directory, f"replica-{os.getpid()}.log"),
+    })
+    import duty_bot as bot
+    from duty_record import DutyRecord
+
+    async def resolve_log_channel(guild_id):
+        return None
+    bot.resolve_log_channel = resolve_log_channel
+
+    promote, demote = bot.become_leader, bot.step_down
+
+    async def become_leader():
+        await promote()
+        state = await bot.guilds.get(GUILD_ID)
+        key = (GUILD_ID, SHIFT_USER_ID)
+        restored = SHIFT_USER_ID in state.duties and bot.scheduler.is_scheduled(bot.EXPIRE, key)
+        if SHIFT_USER_ID not in state.duties:
+            # Start the shift the way /dutystart does
+            state.duties[SHIFT_USER_ID] = DutyRecord(SHIFT_USER_ID)
+            bot.checkpoint_duty(state, SHIFT_USER_ID)
+            bot.note_guild_duties(state)
+            bot.schedule_next_reminder(key)
+            bot.scheduler.schedule(bot.EXPIRE, key, bot.guild_configs.get(GUILD_ID).max_duty_duration.total_seconds())
+        emit("leader", term=bot.leader_lease.term, restored=restored)
+
+    async def step_down():
+        await demote()
+        emit("demoted", term=bot.leader_lease.term)
+
+    bot.become_leader, bot.step_down = become_leader, step_down
+    # The replication half of setup_hook
+    for guild_id in sorted(bot.active_guilds):
+        await bot.reload_guild(await bot.guilds.get(guild_id))
+    bot.start_replication()
+    await asyncio.Event().wait()
+
+
+def read_events(process, events):
+    for line in process.stdout:
+        try:
+            events.put(json.loads(line))
+        except ValueError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--ttl", type=float, default=3.0, help="lease TTL in seconds")
+    parser.add_argument("--replica", metavar="DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.replica:
+        return asyncio.run(run_replica(args.replica, args.ttl))
+
+    directory = tempfile.mkdtemp(prefix="duty-failover-")
+    events = queue.Queue()
+    processes = {}
+
+    def spawn():
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--replica", directory, "--ttl", str(args.ttl)],
+            stdout=subprocess.PIPE, text=True,
+        )
+        threading.Thread(target=read_events, args=(process, events), daemon=True).start()
+        processes[process.pid] = process
+
+    for _ in range(args.replicas):
+        spawn()
+
+    def next_leader(timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            event = events.get(timeout=max(0.0, deadline - time.monotonic()))
+            if event["event"] == "leader":
+                return event
+            print(f"  pid {event['pid']} stepped down (term {event['term']})")
+
+    failures = 0
+    timings = []
+    try:
+        leader = next_leader(60)
+        print(f"initial leader pid {leader['pid']} (term {leader['term']})")
+        for round_number in range(1, args.rounds + 1):
+            time.sleep(1.0)  # let the shift checkpoint land mid-shift
+            killed_at = time.time()
+            os.kill(leader["pid"], signal.SIGKILL)
+            processes.pop(leader["pid"]).wait()
+            leader = next_leader(args.ttl * 5 + 10)
+            failover = leader["at"] - killed_at
+            timings.append(failover)
+            ok = leader["restored"] and leader["pid"] in processes
+            failures += not ok
+            print(f"round {round_number}: pid {leader['pid']} took over in {failover:.2f}s "
+                  f"(term {leader['term']}, shift restored: {leader['restored']})")
+            spawn()  # keep the replica count steady
+    except queue.Empty:
+        failures += 1
+        print("no replica took over the lease")
+    finally:
+        for process in processes.values():
+            process.kill()
+            process.wait()
+        print(f"data and replica logs left in {directory}")
+
+    if timings:
+        print(f"failover: max {max(timings):.2f}s, mean {sum(timings) / len(timings):.2f}s with a {args.ttl:.1f}s lease")
+    print("PASS" if not failures else f"FAIL ({failures} rounds)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
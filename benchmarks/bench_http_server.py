@@ -0,0 +1,104 @@
+"""Measure what the keep-alive HTTP server adds to the bot process: the old Flask thread vs aiohttp.
+
+Each run is a fresh interpreter that first imports discord.py, as the bot
+does, and records its RSS. It then starts one server variant the way the
+bot does: Flask's app.run in a thread, or an aiohttp AppRunner on the
+running event loop. Once the first request to / succeeds it reports the
+time taken and how much RSS grew since discord.py was imported. That
+growth is the cost the server adds to the bot; aiohttp's own import is
+already paid by discord.py. VmRSS is read from /proc (Linux only).
+Requires discord.py and flask.
+
+Usage: python benchmarks/bench_http_server.py [--runs 5] [--port 18080]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROCESS = """
+import asyncio
+import json
+import time
+import urllib.request
+
+def rss_kib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+import discord  # noqa: F401  the bot imports discord.py (and with it aiohttp) before starting the server
+base_rss = rss_kib()
+
+{server}
+
+async def main():
+    started = time.perf_counter()
+    await start_server()
+    url = "http://127.0.0.1:{port}/"
+    while True:
+        try:
+            await asyncio.to_thread(lambda: urllib.request.urlopen(url, timeout=0.5).read())
+            break
+        except OSError:
+            await asyncio.sleep(0.005)
+    print(json.dumps({{"startup": time.perf_counter() - started, "rss": rss_kib() - base_rss}}), flush=True)
+
+asyncio.run(main())
+"""
+
+FLASK_SERVER = """
+async def start_server():
+    from flask import Flask
+    from threading import Thread
+    app = Flask('')
+    @app.route('/')
+    def home():
+        return "Duty Bot is running!"
+    Thread(target=lambda: app.run(host='127.0.0.1', port={port}), daemon=True).start()
+"""
+
+AIOHTTP_SERVER = """
+async def start_server():
+    from aiohttp import web
+    async def home(request):
+        return web.Response(text="Duty Bot is running!")
+    app = web.Application()
+    app.router.add_get('/', home)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', {port}).start()
+"""
+
+
+def measure(server, port):
+    source = PROCESS.format(server=server.format(port=port), port=port)
+    result = subprocess.run([sys.executable, "-c", source], capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "server exited")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    print(f"{'server':<10} {'added startup (median)':>24} {'added RSS (median)':>20}")
+    for offset, (name, server) in enumerate((("flask", FLASK_SERVER), ("aiohttp", AIOHTTP_SERVER))):
+        try:
+            runs = [measure(server, args.port + offset * args.runs + run) for run in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<10} {str(e)}")
+            continue
+        startup = statistics.median(run["startup"] for run in runs)
+        rss = statistics.median(run["rss"] for run in runs)
+        print(f"{name:<10} {startup * 1000:>21.1f} ms {rss / 1024:>16.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
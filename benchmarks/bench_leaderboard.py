@@ -0,0 +1,54 @@
+"""Compare the /leaderboard full sort against the order-statistics index.
+
+Usage: python benchmarks/bench_leaderboard.py [users]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard_index import LeaderboardIndex
+
+QUERIES = 200
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    points = {str(300000000000000000 + i): random.randint(0, 20_000) for i in range(users)}
+    keys = list(points)
+
+    start = time.perf_counter()
+    index = LeaderboardIndex(points)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    full_sort = timed(lambda: sorted(points.items(), key=lambda x: x[1], reverse=True)[:10], 20)
+    top10 = timed(lambda: index.top(10), QUERIES)
+    page = timed(lambda: index.page(random.randrange(index.page_count())), QUERIES)
+    rank = timed(lambda: index.rank(random.choice(keys)), QUERIES)
+    sort_rank = timed(lambda: [u for u, _ in sorted(points.items(), key=lambda x: x[1], reverse=True)].index(random.choice(keys)), 5)
+
+    def bump():
+        uid = random.choice(keys)
+        points[uid] += random.randint(1, 30)
+        index.update(uid, points[uid])
+    update = timed(bump, 5000)
+
+    print(f"users: {users}  index build: {build_ms:.0f} ms")
+    print(f"{'operation':<28} {'full sort (us)':>16} {'index (us)':>12}")
+    print(f"{'top 10':<28} {full_sort:>16.0f} {top10:>12.1f}")
+    print(f"{'random page of 10':<28} {full_sort:>16.0f} {page:>12.1f}")
+    print(f"{'rank of user':<28} {sort_rank:>16.0f} {rank:>12.1f}")
+    print(f"{'points update':<28} {'-':>16} {update:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
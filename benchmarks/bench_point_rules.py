@@ -0,0 +1,88 @@
+"""Re-score a season of duty sessions with the point-rule engine.
+
+Generates packed SessionHistory records scored with the default rules, then
+times rescore_records under a set of rules with hour and weekend multipliers,
+a shift cap and an auto-end penalty. Runs the NumPy path when NumPy is
+installed and always runs the pure-Python fallback, and checks both agree
+with PointRules.score record by record.
+
+Usage: python benchmarks/bench_point_rules.py [--sessions 1000000] [--users 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import point_rules
+from history import RECORD
+from point_rules import PointRules, parse_hour_multipliers, rescore_records
+
+
+def make_records(count, users, rules):
+    rng = random.Random(42)
+    season_start = time.time() - 90 * 86400
+    out = bytearray(count * RECORD.size)
+    for index in range(count):
+        start = season_start + rng.random() * 90 * 86400
+        end = start + rng.uniform(60, 12 * 3600)
+        auto = rng.random() < 0.2
+        RECORD.pack_into(out, index * RECORD.size, 400000000000000000 + rng.randrange(users), start, end,
+                         rng.randrange(20), rules.score(start, end, auto), auto)
+    return bytes(out)
+
+
+def check(data, rules, rescore):
+    changed = dict(zip(rescore.indices, rescore.points))
+    for index, (_, start, end, _, old, auto) in enumerate(RECORD.iter_unpack(data)):
+        expected = rules.score(start, end, auto)
+        if changed.get(index, old) != expected:
+            return f"record {index}: got {changed.get(index, old)}, expected {expected}"
+    return None
+
+
+def run(label, data, rules):
+    started = time.perf_counter()
+    rescore = rescore_records(data, rules)
+    elapsed = time.perf_counter() - started
+    error = check(data, rules, rescore)
+    print(f"{label:<8} {elapsed:8.2f}s  {rescore.count / elapsed / 1e6:6.2f}M sessions/s  "
+          f"changed {rescore.sessions_changed}  users {len(rescore.user_diffs)}  "
+          f"{'OK' if error is None else 'MISMATCH ' + error}")
+    return error is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+
+    rules = PointRules(
+        minutes_per_point=4,
+        hour_multipliers=parse_hour_multipliers("22-6:1.5,12-14:1.2"),
+        weekend_multiplier=1.25,
+        shift_cap=150,
+        auto_end_multiplier=0.5,
+        auto_end_penalty=5,
+    )
+    print(f"generating {args.sessions} sessions for {args.users} users...")
+    data = make_records(args.sessions, args.users, PointRules())
+
+    ok = True
+    if point_rules.np is not None:
+        ok &= run("numpy", data, rules)
+    else:
+        print("numpy not installed; only the Python fallback is timed")
+    vectorised, point_rules.np = point_rules.np, None
+    try:
+        ok &= run("python", data, rules)
+    finally:
+        point_rules.np = vectorised
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Compare full-rewrite save_points against the write-behind points journal.
+
+Usage: python benchmarks/bench_points_save.py [user counts...]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import PointsJournal
+
+SAVES = 2000
+
+
+def make_points(n):
+    return {str(100000000000000000 + i): random.randint(0, 5000) for i in range(n)}
+
+
+def bench_full_rewrite(directory, points, saves):
+    path = os.path.join(directory, "points_full.json")
+    keys = list(points)
+    start = time.perf_counter()
+    for _ in range(saves):
+        points[random.choice(keys)] += 1
+        with open(path, 'w') as f:
+            json.dump(points, f)
+    return saves / (time.perf_counter() - start)
+
+
+def bench_journal(directory, points, saves):
+    path = os.path.join(directory, "points_journal.json")
+    with open(path, 'w') as f:
+        json.dump(points, f)
+    journal = PointsJournal(path)
+    live = journal.load()
+    keys = list(live)
+    start = time.perf_counter()
+    for _ in range(saves):
+        uid = random.choice(keys)
+        live[uid] += 1
+        journal.add(uid, 1)
+    loop_rate = saves / (time.perf_counter() - start)
+    journal.close()
+    durable_rate = saves / (time.perf_counter() - start)
+
+    reloaded = PointsJournal(path).load()
+    assert reloaded == live, "journal replay diverged from live state"
+    return loop_rate, durable_rate
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [100, 1000, 10000, 100000]
+    print(f"{'users':>8} {'full rewrite/s':>16} {'journal (loop)/s':>18} {'journal (durable)/s':>20}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n in counts:
+            saves = max(20, min(SAVES, 2_000_000 // n))
+            full = bench_full_rewrite(directory, make_points(n), saves)
+            loop_rate, durable_rate = bench_journal(directory, make_points(n), SAVES)
+            print(f"{n:>8} {full:>16.0f} {loop_rate:>18.0f} {durable_rate:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
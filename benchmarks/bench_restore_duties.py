@@ -0,0 +1,86 @@
+"""Time restoring checkpointed active duties at startup.
+
+Runs duty_bot's own restore_guild_duties against a freshly loaded guild
+partition for each storage backend: load the records, insert them into the
+guild's ActiveDuties index, reschedule every reminder and expiry on the
+timer heap and settle the duties that expired while the bot was down.
+Nothing talks to Discord; discord.py must still be installed because
+duty_bot imports it.
+
+Usage: python benchmarks/bench_restore_duties.py [open duties]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+HOME_GUILD_ID = 700000000000000000
+BACKENDS = {"json": 700000000000000001, "sqlite": 700000000000000002}  # backend -> guild partition
+
+
+def checkpoint(bot, guild_id, count):
+    directory = bot.guild_directory(guild_id)
+    os.makedirs(directory, exist_ok=True)
+    storage = bot.create_storage(directory)
+    storage.load_duties()  # the bot always loads before it checkpoints
+    now = time.time()
+    for i in range(count):
+        start = now - random.uniform(0, 13 * 3600)
+        storage.save_duty({
+            "user_id": 400000000000000000 + i,
+            "start": start,
+            "last_continue": min(now, start + random.uniform(0, 3600)),
+            "continues": random.randint(0, 20),
+            "reminder_seq": 0,
+            "awaiting_seq": 0,
+        })
+    storage.close()
+
+
+async def restore(bot, guild_id):
+    state = await bot.guilds.get(guild_id)
+    depth = bot.scheduler.depth
+    started = time.perf_counter()
+    active, expired = bot.restore_guild_duties(state)
+    elapsed = time.perf_counter() - started
+    return elapsed, active, expired, bot.scheduler.depth - depth
+
+
+async def run(bot, count):
+    async def resolve_log_channel(guild_id):
+        return None  # the settled-duties embed is queued but never sent
+    bot.resolve_log_channel = resolve_log_channel
+
+    for name, guild_id in BACKENDS.items():
+        bot.STORAGE_BACKEND = name
+        checkpoint(bot, guild_id, count)
+        elapsed, active, expired, depth = await restore(bot, guild_id)
+        print(f"{name:>6}: restored {count} duties in {elapsed * 1000:.0f} ms "
+              f"({active} active, {expired} expired, {depth} timers scheduled)")
+    for state in bot.guilds:
+        state.log_dispatcher.stop()
+        await asyncio.to_thread(bot.close_guild, state)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    workdir = tempfile.mkdtemp(prefix="duty-restore-")
+    os.chdir(workdir)  # duty_bot keeps its data files in the working directory
+    os.environ.setdefault("DUTY_LOG_STDOUT", "0")
+    os.environ["DUTY_HOME_GUILD_ID"] = str(HOME_GUILD_ID)
+    os.environ.setdefault("DUTY_LOG_FILE", os.path.join(workdir, "duty_bot.log"))
+
+    import duty_bot
+
+    asyncio.run(run(duty_bot, count))
+    duty_bot.event_log.close()
+    print(f"data and logs left in {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Offline load simulation of the duty lifecycle.
+
+Drives duty_bot's command callbacks and reminder button dispatcher with
+fake Interaction/User/Channel objects: moderators start duty, answer (or
+ignore) reminder DMs, end duty or get force-ended, while admins add points
+and page the leaderboard.
+Time is compressed by --time-scale so reminders, reminder timeouts and
+maximum-duration expiries fire within seconds. Everything happens in one
+simulated guild. Nothing talks to Discord; discord.py must still be
+installed because duty_bot imports it.
+
+Reports throughput, p50/p99 latency per command, event-loop lag and memory.
+
+Usage: python benchmarks/loadsim.py --mods 1000 --concurrency 200 --time-scale 600
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+GUILD_ID = 700000000000000000
+
+
+# --- Fakes ---
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+
+
+class FakeMessage:
+    def __init__(self, embeds=None, view=None):
+        self.embeds = embeds or []
+        self.view = view
+
+
+class FakeUser:
+    def __init__(self, sim, user_id, admin=False):
+        self.sim = sim
+        self.id = user_id
+        self.name = f"mod{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.roles = [FakeRole(sim.bot.ADMIN_ROLE_ID)] if admin else []
+        self.dms = 0
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, embed=None, embeds=None, view=None):
+        await asyncio.sleep(self.sim.dm_latency)
+        self.dms += 1
+        message = FakeMessage([embed] if embed else embeds, view)
+        if view is not None:
+            self.sim.on_reminder(self, message)
+        return message
+
+
+class FakeChannel:
+    def __init__(self, sim):
+        self.sim = sim
+        self.messages = 0
+        self.embeds = 0
+
+    async def send(self, content=None, embed=None, embeds=None):
+        await asyncio.sleep(self.sim.api_latency)
+        self.messages += 1
+        self.embeds += len(embeds or [embed])
+        return FakeMessage(embeds)
+
+
+class FakeResponse:
+    def __init__(self, sim):
+        self.sim = sim
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def send_message(self, content=None, embed=None, view=None, ephemeral=False):
+        await asyncio.sleep(self.sim.api_latency)
+        self._done = True
+
+    async def defer(self, ephemeral=False, thinking=False):
+        await asyncio.sleep(self.sim.api_latency)
+        self._done = True
+
+    async def edit_message(self, content=None, embed=None, view=None):
+        await asyncio.sleep(self.sim.api_latency)
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self, sim):
+        self.sim = sim
+
+    async def send(self, content=None, embed=None, view=None, ephemeral=False):
+        await asyncio.sleep(self.sim.api_latency)
+        return FakeMessage([embed] if embed else [], view)
+
+
+class FakeInteraction:
+    def __init__(self, sim, user, data=None):
+        self.user = user
+        self.guild_id = GUILD_ID
+        self.response = FakeResponse(sim)
+        self.followup = FakeFollowup(sim)
+        self.extras = {}
+        self.command = None
+        self.data = data or {}
+        self.type = None
+
+
+# --- Simulation ---
+class Simulation:
+    def __init__(self, bot, args):
+        self.bot = bot
+        self.args = args
+        self.api_latency = args.api_latency / 1000
+        self.dm_latency = args.api_latency / 1000
+        self.latencies = {}
+        self.errors = {}
+        self.channel = FakeChannel(self)
+        self.users = {}
+        self.reminders = 0
+        self.ignored_reminders = 0
+        self.max_duty_seconds = max(2, 12 * 3600 / args.time_scale)
+        self.state = None
+
+    def install(self):
+        bot = self.bot
+        scale = self.args.time_scale
+        bot.REMINDER_INTERVAL = tuple(max(1, int(seconds / scale)) for seconds in (1200, 1800))
+        bot.REMINDER_TIMEOUT = max(0.5, 120 / scale)
+        bot.REMINDER_DELIVERY_TIMEOUT = max(2.0, 900 / scale)
+        bot.guild_configs.defaults["max_duty_hours"] = self.max_duty_seconds / 3600
+
+        async def resolve_log_channel(guild_id):
+            return self.channel
+        bot.resolve_log_channel = resolve_log_channel
+        bot.bot.get_user = lambda user_id: self.users.get(user_id)
+
+        async def fetch_user(user_id):
+            return self.users[user_id]
+        bot.bot.fetch_user = fetch_user
+
+        async def create_dm(user):
+            return self.users[user.id]
+        bot.bot.create_dm = create_dm
+
+        admins = [FakeUser(self, 900000000000000000 + i, admin=True) for i in range(self.args.admins)]
+        mods = [FakeUser(self, 800000000000000000 + i) for i in range(self.args.mods)]
+        for user in admins + mods:
+            self.users[user.id] = user
+        return admins, mods
+
+    async def timed(self, name, coro):
+        started = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            if self.errors[name] == 1:
+                print(f"  {name} raised {type(e).__name__}: {e}")
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    def on_reminder(self, user, message):
+        self.reminders += 1
+        if random.random() < self.args.ignore_rate:
+            self.ignored_reminders += 1
+            return
+        delay = random.uniform(0, self.bot.REMINDER_TIMEOUT * 0.5)
+        asyncio.get_running_loop().call_later(delay, lambda: asyncio.ensure_future(self.click_continue(user, message)))
+
+    async def click_continue(self, user, message):
+        custom_id = message.view.children[0].custom_id  # "duty:continue:<guild id>:<user id>:<seq>"
+        interaction = FakeInteraction(self, user, {"custom_id": custom_id, "component_type": 2})
+        interaction.type = self.bot.discord.InteractionType.component
+        await self.timed("continue_duty", self.bot.handle_duty_component(interaction))
+
+    async def moderator(self, user, admins, semaphore):
+        bot = self.bot
+        async with semaphore:
+            await self.timed("dutystart", bot.dutystart.callback(FakeInteraction(self, user)))
+            shift = random.uniform(0.2, 1.2) * self.max_duty_seconds
+            await asyncio.sleep(shift)
+            if user.id not in self.state.duties:
+                return  # expired or auto-ended while we slept
+            if random.random() < self.args.forceend_rate:
+                admin = random.choice(admins)
+                await self.timed("forceend", bot.forceend.callback(FakeInteraction(self, admin), str(user.id)))
+            else:
+                await self.timed("endduty", bot.endduty.callback(FakeInteraction(self, user)))
+
+    async def admin(self, user, mods, stop):
+        bot = self.bot
+        while not stop.is_set():
+            await asyncio.sleep(random.uniform(0.05, 0.5))
+            if random.random() < 0.5:
+                target = random.choice(mods)
+                await self.timed("addpoints", bot.addpoints.callback(FakeInteraction(self, user), str(target.id), random.randint(1, 10)))
+            else:
+                await self.timed("leaderboard", bot.leaderboard.callback(FakeInteraction(self, user)))
+
+    async def run(self):
+        bot = self.bot
+        admins, mods = self.install()
+        await bot.restore_active_duties()
+        self.state = await bot.guilds.get(GUILD_ID)
+        self.state.mods.replace(user.id for user in mods)
+        bot.scheduler.start()
+        bot.dm_queue.start()
+        bot.loop_lag.start()
+
+        stop = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        admin_tasks = [asyncio.create_task(self.admin(admin, mods, stop)) for admin in admins]
+        started = time.perf_counter()
+        await asyncio.gather(*(self.moderator(user, admins, semaphore) for user in mods))
+        # Let reminder timeouts and queued log embeds drain
+        while self.state.duties or self.state.log_dispatcher.depth or bot.dm_queue.depth:
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*admin_tasks)
+        return elapsed
+
+    def report(self, elapsed):
+        bot = self.bot
+        operations = sum(len(samples) for samples in self.latencies.values())
+        print(f"\nmoderators: {self.args.mods}  concurrency: {self.args.concurrency}  time scale: {self.args.time_scale}x")
+        print(f"wall time: {elapsed:.1f}s  commands: {operations}  throughput: {operations / elapsed:.0f} cmd/s")
+        print(f"{'command':<16} {'count':>8} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+        for name, samples in sorted(self.latencies.items()):
+            samples.sort()
+            p50 = samples[len(samples) // 2] * 1000
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+            print(f"{name:<16} {len(samples):>8} {p50:>10.2f} {p99:>10.2f} {self.errors.get(name, 0):>8}")
+        print(f"reminders: {self.reminders} (ignored {self.ignored_reminders})  scheduler: {bot.scheduler.stats()}")
+        print(f"log channel: {self.channel.messages} messages / {self.channel.embeds} embeds  dispatcher: {self.state.log_dispatcher.stats()}")
+        print(f"dm queue: {bot.dm_queue.stats()}")
+        print(f"event loop lag: max {bot.loop_lag.max_lag * 1000:.1f} ms")
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"python heap: current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB  RSS: {rss_mib():.1f} MiB")
+
+
+def rss_mib():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mods", type=int, default=1000, help="simulated moderators (100 to 50000)")
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=500, help="moderators on duty at once")
+    parser.add_argument("--time-scale", type=float, default=600, help="how many times faster than real time")
+    parser.add_argument("--api-latency", type=float, default=20, help="simulated Discord round trip in ms")
+    parser.add_argument("--ignore-rate", type=float, default=0.05, help="fraction of reminders left unanswered")
+    parser.add_argument("--forceend-rate", type=float, default=0.05)
+    parser.add_argument("--trace-memory", action="store_true", help="track Python heap with tracemalloc (slower)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="duty-loadsim-")
+    os.chdir(workdir)  # duty_bot keeps its data files in the working directory
+    os.environ.setdefault("DUTY_LOG_STDOUT", "0")
+    os.environ["DUTY_HOME_GUILD_ID"] = str(GUILD_ID)
+    os.environ.setdefault("DUTY_LOG_FILE", os.path.join(workdir, "duty_bot.log"))
+    if args.trace_memory:
+        tracemalloc.start()
+
+    import duty_bot
+
+    simulation = Simulation(duty_bot, args)
+    elapsed = asyncio.run(simulation.run())
+    simulation.report(elapsed)
+    for state in duty_bot.guilds:
+        duty_bot.close_guild(state)
+    duty_bot.event_log.close()
+    print(f"data and logs left in {workdir}")
+
+
+if __name__ == "__main__":
+    main()
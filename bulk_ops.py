@@ -0,0 +1,146 @@
+import codecs
+import csv
+import io
+import json
+
+MAX_ROWS = 10000
+MAX_POINTS_PER_ROW = 1000000
+
+
+class BulkError(Exception):
+    """The attachment as a whole could not be read"""
+
+
+class BulkPlan:
+    """Validated result of a bulk file: the changes to apply plus per-row errors.
+
+    Nothing is applied unless the whole file validated; `changes` maps user
+    id to the points to add (or None for moderator changes) and `unchanged`
+    counts rows that were valid but would not change anything.
+    """
+
+    def __init__(self):
+        self.changes = {}
+        self.errors = []  # (line, message)
+        self.unchanged = 0
+        self.rows = 0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def error_report(self):
+        """CSV text of every row error"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(("line", "error"))
+        writer.writerows(self.errors)
+        return out.getvalue()
+
+
+def iter_rows(data, filename):
+    """Yield (line, user_id text, points text or None) from a CSV or JSON attachment.
+
+    CSV rows are decoded and parsed incrementally; a header row is skipped
+    if its first cell is not a number. JSON may be a list of ids or of
+    {"user_id": ..., "points": ...} objects.
+    """
+    if filename.lower().endswith(".json"):
+        yield from _iter_json(data)
+    else:
+        yield from _iter_csv(data)
+
+
+def _iter_csv(data):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    lines = (decoder.decode(line) for line in data.splitlines(keepends=True))
+    reader = csv.reader(lines)
+    try:
+        for row in reader:
+            line = reader.line_num
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if line == 1 and not _is_user_id(row[0].strip()):
+                continue  # header
+            yield line, row[0].strip(), row[1].strip() if len(row) > 1 else None
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise BulkError(f"Could not read CSV: {e}")
+
+
+def _iter_json(data):
+    try:
+        items = json.loads(data)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise BulkError(f"Could not read JSON: {e}")
+    if not isinstance(items, list):
+        raise BulkError("JSON must be a list of user ids or of objects with user_id and points")
+    for index, item in enumerate(items, 1):
+        if isinstance(item, dict):
+            points = item.get("points")
+            yield index, str(item.get("user_id", "")), None if points is None else str(points)
+        else:
+            yield index, str(item), None
+
+
+def _is_user_id(text):
+    # isdigit() alone also accepts characters like "²" that int() rejects
+    return text.isascii() and text.isdecimal()
+
+
+def _user_id(plan, line, text, seen):
+    if not _is_user_id(text):
+        plan.error(line, f"invalid user id {text!r}")
+        return None
+    user_id = int(text)
+    if user_id in seen:
+        plan.error(line, f"user {user_id} already listed on line {seen[user_id]}")
+        return None
+    seen[user_id] = line
+    return user_id
+
+
+def plan_mod_changes(rows, current_mods, remove=False):
+    """Validate rows of user ids to add to (or remove from) the moderator list"""
+    plan = BulkPlan()
+    current = set(current_mods)
+    seen = {}
+    for line, user_text, _ in rows:
+        plan.rows += 1
+        if plan.rows > MAX_ROWS:
+            plan.error(line, f"more than {MAX_ROWS} rows")
+            break
+        user_id = _user_id(plan, line, user_text, seen)
+        if user_id is None:
+            continue
+        if (user_id in current) != remove:
+            plan.unchanged += 1
+        else:
+            plan.changes[user_id] = None
+    return plan
+
+
+def plan_point_grants(rows):
+    """Validate rows of (user id, points) to add"""
+    plan = BulkPlan()
+    seen = {}
+    for line, user_text, points_text in rows:
+        plan.rows += 1
+        if plan.rows > MAX_ROWS:
+            plan.error(line, f"more than {MAX_ROWS} rows")
+            break
+        user_id = _user_id(plan, line, user_text, seen)
+        if user_id is None:
+            continue
+        try:
+            points = int(points_text)
+        except (TypeError, ValueError):
+            plan.error(line, f"invalid points {points_text!r}")
+            continue
+        if not 0 < points <= MAX_POINTS_PER_ROW:
+            plan.error(line, f"points must be between 1 and {MAX_POINTS_PER_ROW}")
+            continue
+        plan.changes[user_id] = points
+    return plan
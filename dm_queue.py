@@ -0,0 +1,155 @@
+import asyncio
+import itertools
+import random
+
+import aiohttp
+
+from log_dispatcher import _retry_after
+
+# Lower numbers are sent first
+PRIORITY_DUTY_END = 0
+PRIORITY_REMINDER = 1
+
+RETRY_BASE_DELAY = 2.0  # seconds before the first retry of a transient failure; doubles per attempt
+RETRY_MAX_DELAY = 60.0
+
+
+class DirectMessage:
+    __slots__ = ("user", "kwargs", "kind", "priority", "seq", "attempts", "is_current", "on_sent", "on_failed")
+
+    def __init__(self, user, kwargs, kind, priority, seq, is_current=None, on_sent=None, on_failed=None):
+        self.user = user
+        self.kwargs = kwargs
+        self.kind = kind
+        self.priority = priority
+        self.seq = seq
+        self.attempts = 0
+        self.is_current = is_current
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class DirectMessageQueue:
+    """Outbound DMs sent by a small pool of workers, highest priority first.
+
+    Messages are delivered by user id to the channel open_channel(user_id)
+    returns, so a user who couldn't be looked up still gets their DM; the
+    message's user is only carried along for the callbacks.
+
+    Callers enqueue and return immediately, so a slow or rate-limited send
+    never holds up the scheduler batch that produced it. A 429 pauses every
+    worker for the advertised retry_after and puts the message back in its
+    original place. Transient failures (5xx, connection errors, timeouts)
+    are retried with exponential backoff; a message that gets
+    max_attempts tries in or hits any other error is failed. Outcomes are
+    reported through the message's async on_sent(message) /
+    on_failed(message, error) callbacks; message.attempts tells a final
+    error from running out of retries. A message whose is_current() returns False by the time a
+    worker picks it up (the duty already ended, say) is skipped.
+    """
+
+    def __init__(self, open_channel, workers=4, max_attempts=5, on_event=None):
+        self.open_channel = open_channel
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.on_event = on_event or (lambda event_type, details: None)
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks = []
+        self._resume_at = 0.0
+        self._backing_off = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.rate_limited = 0
+        self.retried = 0
+
+    # --- Producer side ---
+    def send(self, user, kind, priority, is_current=None, on_sent=None, on_failed=None, **kwargs):
+        """Queue a DM of **kwargs to user.id; returns immediately"""
+        self._queue.put_nowait(DirectMessage(user, kwargs, kind, priority, next(self._seq), is_current, on_sent, on_failed))
+
+    @property
+    def depth(self):
+        """Messages not yet sent, including those waiting out a retry backoff"""
+        return self._queue.qsize() + self._backing_off
+
+    def stats(self):
+        return {
+            "queued": self.depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "rate_limited": self.rate_limited,
+            "retried": self.retried,
+        }
+
+    # --- Workers ---
+    def start(self):
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._run()))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await self._queue.get()
+            pause = self._resume_at - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                await self._deliver(message, loop)
+            except Exception as e:
+                self.on_event("DM_CALLBACK_FAILED", {"Kind": message.kind, "User ID": message.user.id, "Error": str(e)})
+
+    async def _deliver(self, message, loop):
+        if message.is_current is not None and not message.is_current():
+            self.skipped += 1
+            return
+        message.attempts += 1
+        try:
+            channel = await self.open_channel(message.user.id)
+            await channel.send(**message.kwargs)
+        except Exception as e:
+            if getattr(e, 'status', None) == 429 and message.attempts < self.max_attempts:
+                retry_after = _retry_after(e)
+                self.rate_limited += 1
+                self._resume_at = max(self._resume_at, loop.time() + retry_after)
+                self.on_event("DM_RATE_LIMITED", {"Kind": message.kind, "Retry After": f"{retry_after:.2f}s", "Queued": self.depth})
+                self._queue.put_nowait(message)  # keeps its priority and seq, so it goes out next
+                return
+            if _transient(e) and message.attempts < self.max_attempts:
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (message.attempts - 1)) * random.uniform(0.8, 1.2)
+                self.retried += 1
+                self.on_event("DM_RETRYING", {"Kind": message.kind, "User ID": message.user.id, "Attempt": message.attempts,
+                                              "Retry In": f"{delay:.2f}s", "Error": str(e) or type(e).__name__})
+                self._backing_off += 1
+                loop.call_later(delay, self._requeue, message)
+                return
+            self.failed += 1
+            if message.on_failed is not None:
+                await message.on_failed(message, e)
+            return
+        self.sent += 1
+        if message.on_sent is not None:
+            await message.on_sent(message)
+
+    def _requeue(self, message):
+        self._backing_off -= 1
+        self._queue.put_nowait(message)
+
+
+def _transient(error):
+    """Errors worth retrying: Discord 5xx responses, dropped connections and timeouts"""
+    status = getattr(error, 'status', None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
@@ -6,233 +6,663 @@ import asyncio
 import json
 from datetime import datetime, timedelta, timezone
 import random
-from flask import Flask
-from threading import Thread
+import time
+from aiohttp import web
 import os
+import logging
+import hashlib
+import hmac
+import io
+import sqlite3
+from storage import JsonStorage, SqliteStorage
+from journal import atomic_write_json
+from scheduler import DutyScheduler
+from log_dispatcher import LogDispatcher
+from user_cache import UserResolver
+from event_log import EventLog
+from leaderboard_index import LeaderboardIndex
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, LoopLagMonitor
+from history import SessionHistory
+from duty_record import DutyRecord
+from leader import LeaderLease
+from guild_state import GuildConfigStore, GuildRegistry, GuildState
+from dm_queue import DirectMessageQueue, PRIORITY_DUTY_END, PRIORITY_REMINDER
+from bulk_ops import BulkError, iter_rows, plan_mod_changes, plan_point_grants
+from export import EXPORT_FORMATS, EXPORT_TABLES, collect_chunks, export_filename, iter_export
+from point_rules import VECTORISED, PointRules, parse_hour_multipliers, rescore_records
+from seasons import SeasonIndex
+from duty_index import DUTY_SORTS
+from mod_index import ModIndex
 
 TOKEN = os.getenv("DISCORD_TOKEN")
-
-app = Flask('')
-
-@app.route('/')
-def home():
-    return "Duty Bot is running!"
-
-def run():
-    app.run(host='0.0.0.0', port=8080)
-
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+PROCESS_STARTED = time.perf_counter()
 
 # --- Configuration ---
+# Per-guild files; the home guild keeps them in the working directory, other guilds under GUILDS_DIR/<guild id>/
 AUTHORIZED_MODS_FILE = "authorized_mods.json"
 POINTS_FILE = "points.json"
-ACTIVE_DUTIES = {}
-REMINDER_TASKS = {}  # Track reminder tasks to prevent duplicates
-MAX_DUTY_DURATION = timedelta(hours=12)
-
+ACTIVE_DUTIES_FILE = "active_duties.json"
+SESSION_HISTORY_FILE = "duty_history.bin"  # the record of finished sessions; /stats rollups and recomputes read it
+DATABASE_FILE = "duty_bot.db"
+LOG_SPILL_FILE = "log_spill.jsonl"  # log embeds that overflowed the send queue
+GUILDS_DIR = "guilds"
+HOME_GUILD_ID = int(os.getenv("DUTY_HOME_GUILD_ID", "0")) or None  # guild that owns the original single-guild data
+GUILD_CONFIG_FILE = "guild_config.json"
+ACTIVE_GUILDS_FILE = "active_guilds.json"  # guilds with open duties, restored at startup
+GUILD_IDLE_EVICTION = 1800  # seconds before an unused guild without open duties is unloaded
+SHARD_COUNT = int(os.getenv("DUTY_SHARD_COUNT", "0")) or None  # None lets Discord recommend a count
+COMMAND_HASH_FILE = "command_tree.hash"  # hash of the last synced command schema, per scope
+SYNC_GUILD_ID = int(os.getenv("DUTY_SYNC_GUILD_ID", "0")) or None  # sync to one guild for fast iteration
+FORCE_COMMAND_SYNC = os.getenv("DUTY_FORCE_SYNC", "0") == "1"
+LOG_FILE = os.getenv("DUTY_LOG_FILE", "duty_bot.log")
+LOG_SAMPLE_RATES = {"REMINDER_SENT": 0.1, "DUTY_AUTO_CONTINUED": 0.1, "SCHEDULER_BATCH": 0.05}  # fraction of high-frequency events kept
+STORAGE_BACKEND = os.getenv("DUTY_STORAGE", "json")  # "json" or "sqlite"
+# Replicas share state through the SQLite databases; one elected leader runs the timers
+REPLICATION = os.getenv("DUTY_REPLICATION", "0") == "1" and STORAGE_BACKEND == "sqlite"
+REPLICA_ID = os.getenv("DUTY_REPLICA_ID")  # defaults to hostname:pid
+LEASE_TTL = float(os.getenv("DUTY_LEASE_TTL", "10"))  # seconds before a silent leader is replaced
+REPLICA_REFRESH_INTERVAL = 30  # seconds between follower reloads of shared state
+READ_ONLY_COMMANDS = {"total", "rank", "leaderboard", "viewduties", "viewmods", "export"}  # any replica may answer these
+MAX_DUTY_DURATION = timedelta(hours=12)  # default; guilds can override it
+POINT_MINUTES = 4  # default minutes on duty per point; guilds can override it
+REMINDER_INTERVAL = (1200, 1800)  # 20-30 minutes in seconds, picked at random
+REMINDER_TIMEOUT = 120  # seconds to answer a reminder, counted from its delivery, before the duty is auto-ended
+REMINDER_DELIVERY_TIMEOUT = 900  # seconds a reminder may wait in the DM queue before the duty is auto-ended
+ACTIVITY_WINDOW = 600  # a duty whose user posted within this many seconds is continued without a reminder
+DM_WORKERS = 4  # DMs in flight at once
+
+# Scheduler event kinds; events are keyed by (guild id, user id)
+REMINDER = "reminder"
+REMINDER_TIMEOUT_EVENT = "reminder_timeout"
+REMINDER_UNDELIVERED = "reminder_undelivered"
+EXPIRE = "expire"
+DUTY_EVENTS = (REMINDER, REMINDER_TIMEOUT_EVENT, REMINDER_UNDELIVERED, EXPIRE)
+
+# Home guild defaults from before per-guild configuration
 MOD_ROLE_ID = 1399148894566354985
 ADMIN_ROLE_ID = MOD_ROLE_ID
 LOG_CHANNEL_ID = 1399171018630889472
 
+WEB_PORT = int(os.getenv("PORT", "8080"))
+EXPORT_TOKEN = os.getenv("DUTY_EXPORT_TOKEN")  # bearer token for GET /export/...; the endpoint is off without it
+EXPORT_ATTACHMENT_LIMIT = 8 * 1024 * 1024  # bytes, when the guild's own upload limit is unknown
+LIVENESS_MAX_LOOP_LAG = 10.0  # seconds of loop lag before /healthz reports unhealthy
+MOD_WATCH_INTERVAL = 5  # seconds between checks for moderator lists changed outside the bot
+
+# --- Metrics ---
+metrics = Registry()
+loop_lag = LoopLagMonitor()
+evicted_log_stats = {"failed": 0, "dropped": 0}  # counters of unloaded guilds' dispatchers
+COMMAND_LATENCY = metrics.histogram("duty_command_latency_seconds", "Time from dispatch to completion of each slash command", ("command",))
+COMMAND_ERRORS = metrics.counter("duty_command_errors_total", "Slash command errors seen by on_app_command_error", ("command", "error"))
+AUTO_CONTINUES = metrics.counter("duty_auto_continues_total", "Reminders skipped because the moderator was recently active")
+DM_FAILURES = metrics.counter("duty_dm_failures_total", "Direct messages that could not be delivered", ("kind",))
+metrics.gauge("duty_event_loop_lag_seconds", "Overshoot of a 0.5s sleep on the event loop", lambda: f"{loop_lag.lag:.6f}")
+metrics.gauge("duty_active_duties", "Moderators currently on duty", lambda: active_duty_count())
+metrics.gauge("duty_loaded_guilds", "Guild partitions currently loaded", lambda: len(guilds))
+metrics.gauge("duty_reminder_backlog", "Pending reminder and expiry timers", lambda: scheduler.depth)
+metrics.gauge("duty_scheduler_lag_seconds", "How late the last scheduler batch fired", lambda: f"{scheduler.lag:.6f}")
+metrics.gauge("duty_log_queue_depth", "Log embeds waiting to be sent", lambda: sum(state.log_dispatcher.depth for state in guilds))
+metrics.callback_counter("duty_log_send_failures_total", "Log embeds that failed to send",
+                         lambda: evicted_log_stats["failed"] + sum(state.log_dispatcher.failed for state in guilds))
+metrics.callback_counter("duty_log_dropped_total", "Log embeds dropped under overload",
+                         lambda: evicted_log_stats["dropped"] + sum(state.log_dispatcher.dropped for state in guilds))
+metrics.gauge("duty_dm_queue_depth", "Direct messages waiting to be sent", lambda: dm_queue.depth)
+metrics.callback_counter("duty_dm_rate_limited_total", "Direct messages that hit a 429 and were retried", lambda: dm_queue.rate_limited)
+metrics.callback_counter("duty_dm_retries_total", "Direct messages retried after a transient error", lambda: dm_queue.retried)
+metrics.gauge("duty_replica_leader", "1 if this replica runs reminders and expiries", lambda: int(is_leader()))
+
+class HandledByAnotherReplica(app_commands.CheckFailure):
+    """Raised when another replica owns an interaction; it is dropped silently"""
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """Command tree that timestamps each interaction and routes errors to on_app_command_error"""
+
+    async def interaction_check(self, interaction: Interaction):
+        interaction.extras["started"] = time.perf_counter()
+        if not await should_handle(interaction):
+            raise HandledByAnotherReplica()
+        return True
+
+    async def on_error(self, interaction: Interaction, error: app_commands.AppCommandError):
+        self.client.dispatch("app_command_error", interaction, error)
+
+def observe_command(interaction: Interaction, command_name):
+    started = interaction.extras.get("started")
+    if started is not None:
+        COMMAND_LATENCY.observe(time.perf_counter() - started, command_name)
+
 # --- Bot setup ---
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="/", intents=intents)
+bot = commands.AutoShardedBot(command_prefix="/", intents=intents, tree_cls=InstrumentedCommandTree, shard_count=SHARD_COUNT)
 tree = bot.tree
 client = bot
+user_resolver = UserResolver(bot)
 
 # --- Logging Helper ---
+event_log = EventLog(
+    path=LOG_FILE,
+    level=getattr(logging, os.getenv("DUTY_LOG_LEVEL", "INFO").upper(), logging.INFO),
+    stdout=os.getenv("DUTY_LOG_STDOUT", "1") != "0",
+    sample_rates=LOG_SAMPLE_RATES
+)
+
 def log_to_console(event_type, user=None, details=None):
-    """Log events to console for debugging"""
-    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
-    log_message = f"[{timestamp}] {event_type}"
-    
-    if user:
-        log_message += f" - User: {user} (ID: {user.id})"
-    
-    if details:
-        for key, value in details.items():
-            log_message += f" | {key}: {value}"
-    
-    print(log_message)
+    """Queue a structured log event; formatting and output happen on a background thread"""
+    event_log.log(event_type, user, details)
 
 # --- File Handling ---
-def load_authorized_mods():
+def guild_directory(guild_id):
+    return "." if guild_id == HOME_GUILD_ID else os.path.join(GUILDS_DIR, str(guild_id))
+
+def create_storage(directory="."):
+    on_error = lambda error: log_to_console("STORAGE_WRITE_FAILED", details={"Error": str(error), "Partition": directory})
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteStorage(os.path.join(directory, DATABASE_FILE), on_error=on_error)
+    return JsonStorage(*(os.path.join(directory, name) for name in (POINTS_FILE, AUTHORIZED_MODS_FILE, ACTIVE_DUTIES_FILE)), on_error=on_error)
+
+def open_session_history(directory="."):
+    on_error = lambda error: log_to_console("SESSION_HISTORY_WRITE_FAILED", details={"Error": str(error), "Partition": directory})
+    return SessionHistory(os.path.join(directory, SESSION_HISTORY_FILE), on_error=on_error)
+
+def legacy_data_files():
+    """Single-guild data in the working directory; only the home guild's partition reads it"""
+    found = [name for name in (POINTS_FILE, POINTS_FILE + ".journal", AUTHORIZED_MODS_FILE, ACTIVE_DUTIES_FILE, SESSION_HISTORY_FILE)
+             if os.path.exists(name)]
+    if os.path.exists(DATABASE_FILE):
+        # The lease database lives here too; only a storage schema means guild data
+        conn = sqlite3.connect(DATABASE_FILE)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'points'").fetchone():
+                found.append(DATABASE_FILE)
+        finally:
+            conn.close()
+    return found
+
+def load_authorized_mods(storage):
     try:
-        with open(AUTHORIZED_MODS_FILE, 'r') as f:
-            data = json.load(f)
-            log_to_console("SYSTEM", details={"Action": "Loaded authorized mods", "Count": len(data)})
-            return data
+        return storage.load_mods()
     except FileNotFoundError:
-        log_to_console("SYSTEM", details={"Action": "Created new authorized mods file"})
         return []
 
-def save_authorized_mods(mods):
-    with open(AUTHORIZED_MODS_FILE, 'w') as f:
-        json.dump(mods, f)
-    log_to_console("SYSTEM", details={"Action": "Saved authorized mods", "Count": len(mods)})
-
-def load_points():
+def save_authorized_mods(state):
+    state.storage.save_mods(state.mods)
+    log_to_console("SYSTEM", details={"Action": "Saved authorized mods", "Guild": state.guild_id, "Count": len(state.mods)})
+
+def load_guild(guild_id):
+    """Open a guild's partition; runs in a worker thread the first time the guild is used"""
+    started = time.perf_counter()
+    directory = guild_directory(guild_id)
+    os.makedirs(directory, exist_ok=True)
+    state = GuildState(guild_id, directory, create_storage(directory))
+    state.points, state.leaderboard = load_points_table(state.storage)
+    # Read the version first, so a change landing between the two is picked up by the watcher
+    version = state.storage.mods_version()
+    state.mods = ModIndex(load_authorized_mods(state.storage), guild_configs.get(guild_id).mod_role_id, version)
+    state.history = open_session_history(directory)
+    sessions = state.history.load()
+    state.seasons = SeasonIndex(directory)
+    state.seasons.load()
+    log_to_console("GUILD_LOADED", details={
+        "Guild": guild_id,
+        "Users": len(state.points),
+        "Mods": len(state.mods),
+        "Sessions": sessions,
+        "Backend": STORAGE_BACKEND,
+        "Time": f"{(time.perf_counter() - started) * 1000:.1f}ms"
+    })
+    return state
+
+def start_guild(state):
+    """Attach the guild's log queue; runs on the event loop once the partition is loaded"""
+    state.log_dispatcher = LogDispatcher(
+        lambda: resolve_log_channel(state.guild_id),
+        Embed.from_dict,
+        os.path.join(state.directory, LOG_SPILL_FILE),
+        on_event=lambda event_type, details: log_to_console(event_type, details={**details, "Guild": state.guild_id})
+    )
+    state.log_dispatcher.start()
+
+def close_guild(state):
+    """Flush a guild's partition to disk; call from a worker thread, after its log queue is stopped"""
+    state.storage.close()
+    state.history.close()
+    state.seasons.close()
+
+guild_configs = GuildConfigStore(
+    GUILD_CONFIG_FILE,
+    defaults={"point_minutes": POINT_MINUTES, "max_duty_hours": MAX_DUTY_DURATION.total_seconds() / 3600},
+    home_guild_id=HOME_GUILD_ID,
+    home_defaults={"admin_role_id": ADMIN_ROLE_ID, "log_channel_id": LOG_CHANNEL_ID}
+)
+log_to_console("SYSTEM", details={"Action": "Loaded guild config", "Configured Guilds": guild_configs.load(), "Home Guild": HOME_GUILD_ID})
+guilds = GuildRegistry(load_guild, on_loaded=start_guild)
+
+def load_active_guilds():
     try:
-        with open(POINTS_FILE, 'r') as f:
-            data = json.load(f)
-            log_to_console("SYSTEM", details={"Action": "Loaded points data", "Users": len(data)})
-            return data
-    except FileNotFoundError:
-        log_to_console("SYSTEM", details={"Action": "Created new points file"})
-        return {}
-
-def save_points(points):
-    with open(POINTS_FILE, 'w') as f:
-        json.dump(points, f)
-    log_to_console("SYSTEM", details={"Action": "Saved points data", "Users": len(points)})
+        with open(ACTIVE_GUILDS_FILE, 'r') as f:
+            guild_ids = set(json.load(f))
+    except (FileNotFoundError, ValueError):
+        guild_ids = set()
+    if HOME_GUILD_ID is not None:
+        guild_ids.add(HOME_GUILD_ID)  # its duties predate the index
+    return guild_ids
+
+active_guilds = load_active_guilds()
+active_guilds_unsaved = False
+active_guilds_lock = asyncio.Lock()
+active_guilds_saves = set()  # keeps the save tasks referenced until they finish
+
+def note_guild_duties(state):
+    """Keep the index of guilds with open duties current; only transitions touch the file"""
+    global active_guilds_unsaved
+    has_duties = bool(state.duties)
+    if has_duties != (state.guild_id in active_guilds):
+        if has_duties:
+            active_guilds.add(state.guild_id)
+        else:
+            active_guilds.discard(state.guild_id)
+        active_guilds_unsaved = True
+        task = asyncio.create_task(save_active_guilds())
+        active_guilds_saves.add(task)
+        task.add_done_callback(active_guilds_saves.discard)
+
+async def save_active_guilds():
+    """Write the index in a worker thread; saves run one at a time and queued ones share a write"""
+    global active_guilds_unsaved
+    async with active_guilds_lock:
+        if not active_guilds_unsaved:
+            return  # a save that was waiting ahead of this one already wrote the latest set
+        active_guilds_unsaved = False
+        try:
+            await asyncio.to_thread(atomic_write_json, ACTIVE_GUILDS_FILE, sorted(active_guilds))
+        except OSError as e:
+            active_guilds_unsaved = True
+            log_to_console("ACTIVE_GUILDS_WRITE_FAILED", details={"Error": str(e)})
+
+def active_duty_count():
+    return sum(len(state.duties) for state in guilds)
+
+def add_points(state, user_id_str, amount):
+    """Add points in memory and persist the delta; the write happens off the event loop"""
+    state.points[user_id_str] = state.points.get(user_id_str, 0) + amount
+    state.storage.add_points(user_id_str, amount)
+    state.leaderboard.update(user_id_str, state.points[user_id_str])
+    return state.points[user_id_str]
+
+def add_points_many(state, deltas):
+    """Add {user_id_str: amount} in memory and persist it as one write"""
+    for user_id_str, amount in deltas.items():
+        state.points[user_id_str] = state.points.get(user_id_str, 0) + amount
+        state.leaderboard.update(user_id_str, state.points[user_id_str])
+    state.storage.add_points_many(deltas)
+
+def reset_points(state):
+    state.points.clear()
+    state.storage.reset_points()
+    state.leaderboard.clear()
+
+async def roll_over_season(state, name=None):
+    """Archive the current points table as a season, then start a fresh one.
+
+    The archive is written from a copy in a worker thread; points earned
+    while it is being written carry over into the new season.
+    """
+    frozen = dict(state.points)
+    entry = await asyncio.to_thread(state.seasons.freeze, frozen, name, time.time())
+    carry = {}
+    for user_id_str, value in state.points.items():
+        delta = value - frozen.get(user_id_str, 0)
+        if delta > 0:
+            carry[user_id_str] = delta
+    reset_points(state)
+    if carry:
+        add_points_many(state, carry)
+    return entry, len(carry)
+
+def season_board(state, season):
+    """Ranked points of a past season, or the live leaderboard index when season is None"""
+    return state.leaderboard if season is None else state.seasons.archive(season)
+
+def checkpoint_duty(state, user_id):
+    """Persist the current state of an active duty so a restart can resume it"""
+    state.duties.touch(user_id)
+    state.storage.save_duty(state.duties[user_id].to_dict())
+
+def record_session(state, user_id, start_time, end_time, continues, awarded_points, auto):
+    """Append a finished session to the guild's session history, the one store of past sessions"""
+    state.history.append(user_id, start_time.timestamp(), end_time.timestamp(), continues, awarded_points, auto)
+
+# --- Replication ---
+# With DUTY_REPLICATION=1 every replica connects to the gateway and sees every
+# interaction. The lease holder runs the scheduler and handles all writes;
+# read-only commands are claimed by whichever replica gets there first and are
+# answered from state that followers reload every REPLICA_REFRESH_INTERVAL.
+leader_lease = None
+replica_refresh_task = None
+
+def is_leader():
+    return leader_lease is None or leader_lease.is_leader
+
+async def should_handle(interaction: Interaction):
+    if leader_lease is None:
+        return True
+    if interaction.command is not None and interaction.command.name in READ_ONLY_COMMANDS:
+        return await leader_lease.claim(interaction.id)
+    return leader_lease.is_leader
+
+def load_points_table(storage):
+    """A guild's points and the leaderboard index over them; call from a worker thread"""
+    points = storage.load_points()
+    return points, LeaderboardIndex(points)
+
+async def reload_guild(state, duties=True):
+    """Re-read a guild's points, mods and (optionally) active duties written by the leader"""
+    # The fresh table is indexed off the loop and swapped in whole, so a refresh never sorts every user on the loop
+    state.points, state.leaderboard = await asyncio.to_thread(load_points_table, state.storage)
+    state.mods.role_id = guild_configs.get(state.guild_id).mod_role_id
+    await reload_mods(state)
+    await asyncio.to_thread(state.seasons.load)
+    if duties:
+        records = await asyncio.to_thread(state.storage.load_duties)
+        state.duties.clear()
+        for record in records:
+            duty_data = DutyRecord.from_dict(record)
+            state.duties[duty_data.user_id] = duty_data
+
+async def become_leader():
+    """Take over the timers: reload everything the previous leader wrote, then restore duties"""
+    global active_guilds
+    started = time.perf_counter()
+    await asyncio.to_thread(guild_configs.load)  # the previous leader may have changed settings
+    for state in guilds:
+        await reload_guild(state, duties=False)
+        previous, state.history = state.history, open_session_history(state.directory)
+        await asyncio.to_thread(state.history.load)
+        await asyncio.to_thread(previous.close)
+        state.duties.clear()
+    active_guilds = load_active_guilds()
+    await restore_active_duties()
+    if not is_leader():
+        return  # the lease lapsed while restoring; step_down runs next and clears the timers
+    scheduler.start()
+    log_to_console("REPLICA_PROMOTED", details={
+        "Replica": leader_lease.holder,
+        "Term": leader_lease.term,
+        "Takeover": f"{(time.perf_counter() - started) * 1000:.0f}ms"
+    })
 
-points = load_points()
-authorized_mods = load_authorized_mods()
+async def step_down():
+    """Stop firing timers; the new leader reschedules them from the checkpoints"""
+    scheduler.stop()
+    scheduler.clear()
+    log_to_console("REPLICA_DEMOTED", details={"Replica": leader_lease.holder, "Active Duties": active_duty_count()})
+
+async def follower_refresh_loop():
+    while True:
+        await asyncio.sleep(REPLICA_REFRESH_INTERVAL)
+        if is_leader():
+            continue
+        try:
+            await asyncio.to_thread(guild_configs.load)
+        except Exception as e:
+            log_to_console("REPLICA_REFRESH_FAILED", details={"File": GUILD_CONFIG_FILE, "Error": str(e)})
+        for state in guilds:
+            try:
+                await reload_guild(state)
+            except Exception as e:
+                log_to_console("REPLICA_REFRESH_FAILED", details={"Guild": state.guild_id, "Error": str(e)})
+
+def start_replication():
+    global leader_lease, replica_refresh_task
+    leader_lease = LeaderLease(
+        DATABASE_FILE,
+        holder=REPLICA_ID,
+        ttl=LEASE_TTL,
+        renew_interval=max(0.5, LEASE_TTL / 4),
+        on_acquire=become_leader,
+        on_release=step_down,
+        on_event=lambda event_type, details: log_to_console(event_type, details=details)
+    )
+    leader_lease.start()
+    replica_refresh_task = asyncio.create_task(follower_refresh_loop())
+
+async def evict_idle_guilds():
+    """Unload guild partitions nobody has used for a while; they reload on next use"""
+    while True:
+        await asyncio.sleep(GUILD_IDLE_EVICTION / 6)
+        for state in guilds.idle(GUILD_IDLE_EVICTION):
+            # Re-check each time: closing the previous guild awaited, and this one may have been used since
+            if state.duties or state.log_dispatcher.depth or state.guild_id == HOME_GUILD_ID \
+                    or time.monotonic() - state.last_used < GUILD_IDLE_EVICTION:
+                continue
+            state.log_dispatcher.stop()
+            evicted_log_stats["failed"] += state.log_dispatcher.failed
+            evicted_log_stats["dropped"] += state.log_dispatcher.dropped
+            await guilds.unload(state, close_guild)
+            log_to_console("GUILD_UNLOADED", details={"Guild": state.guild_id, "Loaded Guilds": len(guilds)})
+
+async def reload_mods(state):
+    """Re-read a guild's moderator list; returns (added, removed), or None if it changed locally meanwhile"""
+    revision = state.mods.revision
+    version = await asyncio.to_thread(state.storage.mods_version)
+    fresh = await asyncio.to_thread(load_authorized_mods, state.storage)
+    if state.mods.revision != revision:
+        return None  # an add/remove landed while reading; the next check sees its write
+    return state.mods.replace(fresh, version)
+
+async def watch_mod_lists():
+    """Pick up moderator lists edited outside the bot (by hand, or by another replica) without a restart"""
+    while True:
+        await asyncio.sleep(MOD_WATCH_INTERVAL)
+        for state in guilds:
+            try:
+                if await asyncio.to_thread(state.storage.mods_version) == state.mods.version:
+                    continue
+                changes = await reload_mods(state)
+                if changes and any(changes):
+                    added, removed = changes
+                    log_to_console("MODS_RELOADED", details={
+                        "Guild": state.guild_id,
+                        "Added": sorted(added),
+                        "Removed": sorted(removed),
+                        "Count": len(state.mods)
+                    })
+            except Exception as e:
+                log_to_console("MODS_RELOAD_FAILED", details={"Guild": state.guild_id, "Error": str(e)})
 
 # --- Checks ---
 def is_admin(interaction: Interaction):
-    return any(role.id == ADMIN_ROLE_ID for role in interaction.user.roles) if hasattr(interaction.user, 'roles') else False
-
-def is_authorized_mod(user_id: int):
-    return user_id in authorized_mods
-
-# --- Reminder View ---
-class ReminderView(View):
-    def __init__(self, user_id):
-        super().__init__(timeout=120)
-        self.user_id = user_id
-        self.responded = False
+    config = guild_configs.get(interaction.guild_id)
+    if config.admin_role_id is None:
+        permissions = getattr(interaction.user, 'guild_permissions', None)
+        return bool(permissions and permissions.administrator)
+    return any(role.id == config.admin_role_id for role in interaction.user.roles) if hasattr(interaction.user, 'roles') else False
+
+def is_authorized_mod(state, member):
+    return state.mods.allows(member)
+
+# --- Activity Tracking ---
+# Messages from on-duty moderators stand in for answering the next reminder
+@bot.listen("on_message")
+async def track_duty_activity(message):
+    """Note when on-duty moderators post; a dict lookup per message, nothing stored for anyone else"""
+    if message.guild is None:
+        return
+    state = guilds.peek(message.guild.id)
+    if state is None:
+        return  # a guild with open duties is always loaded
+    duty = state.duties.get(message.author.id)
+    if duty is not None:
+        duty.last_seen = time.time()
+
+# --- Reminder Buttons ---
+# Reminder buttons carry "duty:<action>:<guild id>:<user id>:<reminder seq>" custom_ids
+# and are handled by one on_interaction listener, so no View object or timer lives per
+# reminder and buttons keep working across restarts. The 2-minute no-response
+# auto-end is a REMINDER_TIMEOUT event on the scheduler, armed once the DM is delivered.
+REMINDER_BUTTON_PREFIX = "duty:"
+
+def reminder_components(guild_id, user_id, seq):
+    view = View(timeout=None)
+    view.add_item(Button(label="Continue Duty", style=ButtonStyle.blurple, custom_id=f"duty:continue:{guild_id}:{user_id}:{seq}"))
+    view.add_item(Button(label="End Duty", style=ButtonStyle.danger, custom_id=f"duty:end:{guild_id}:{user_id}:{seq}"))
+    # A finished view is rendered but never stored in discord.py's view store
+    view.stop()
+    return view
+
+def parse_reminder_custom_id(custom_id):
+    """(action, guild id, user id, seq); buttons sent before guilds were partitioned belong to the home guild"""
+    parts = custom_id.split(":")
+    if len(parts) == 4:
+        _, action, user_id, seq = parts
+        return action, HOME_GUILD_ID, int(user_id), int(seq)
+    _, action, guild_id, user_id, seq = parts
+    return action, int(guild_id), int(user_id), int(seq)
+
+async def reply_ephemeral(interaction: Interaction, message):
+    try:
+        await interaction.response.send_message(message, ephemeral=True)
+    except discord.errors.NotFound:
+        pass  # Interaction already handled or expired
 
-    @discord.ui.button(label="Continue Duty", style=ButtonStyle.blurple)
-    async def continue_duty(self, interaction: Interaction, button: Button):
-        if interaction.user.id != self.user_id:
-            try:
-                await interaction.response.send_message("You cannot respond to this duty.", ephemeral=True)
-            except discord.errors.NotFound:
-                pass  # Interaction already handled or expired
-            return
-        
-        self.responded = True
-        duty = ACTIVE_DUTIES.get(self.user_id)
-        if duty:
-            duty['last_continue'] = datetime.now(timezone.utc)
-            duty['continues'] += 1
-            
-            log_to_console("DUTY_CONTINUED", interaction.user, {
-                "Continue Count": duty['continues'],
-                "Total Duration": str(datetime.now(timezone.utc) - duty['start_time'])[:-7]
-            })
-            
-            await send_log_embed("Duty Continued", interaction.user, {
-                "User": f"{interaction.user} ({interaction.user.id})",
-                "Continue Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p'),
-                "Continue Count": duty['continues'],
-                "Total Duration": str(datetime.now(timezone.utc) - duty['start_time'])[:-7]
-            })
-        
-        try:
-            await interaction.response.send_message("Duty continued.", ephemeral=True)
-        except discord.errors.NotFound:
-            pass  # Interaction already handled or expired
-        self.stop()
+@bot.listen("on_interaction")
+async def handle_duty_component(interaction: Interaction):
+    """Single dispatcher for every reminder button ever sent"""
+    if interaction.type != discord.InteractionType.component:
+        return
+    custom_id = (interaction.data or {}).get("custom_id", "")
+    if not custom_id.startswith(REMINDER_BUTTON_PREFIX) or not is_leader():
+        return
 
-    @discord.ui.button(label="End Duty", style=ButtonStyle.danger)
-    async def end_duty(self, interaction: Interaction, button: Button):
-        if interaction.user.id != self.user_id:
-            try:
-                await interaction.response.send_message("You cannot end this duty.", ephemeral=True)
-            except discord.errors.NotFound:
-                pass  # Interaction already handled or expired
-            return
-        
-        self.responded = True
-        await end_duty_session(interaction.user, auto=False)
-        try:
-            await interaction.response.send_message("Duty ended.", ephemeral=True)
-        except discord.errors.NotFound:
-            pass  # Interaction already handled or expired
-        self.stop()
+    try:
+        action, guild_id, user_id, seq = parse_reminder_custom_id(custom_id)
+    except ValueError:
+        return
+    if interaction.user.id != user_id:
+        return await reply_ephemeral(interaction, "You cannot end this duty." if action == "end" else "You cannot respond to this duty.")
+
+    # Stale buttons (older reminders, ended duties) and double clicks fail this check.
+    # A guild with an open duty is always loaded, so peek is enough.
+    state = guilds.peek(guild_id)
+    duty = state.duties.get(user_id) if state is not None else None
+    if duty is None or duty.awaiting_seq != seq:
+        log_to_console("REMINDER_CLICK_REJECTED", interaction.user, {"Action": action, "Guild": guild_id, "Sequence": seq})
+        return await reply_ephemeral(interaction, "This reminder is no longer active.")
+
+    duty.awaiting_seq = 0
+    scheduler.cancel(REMINDER_TIMEOUT_EVENT, (guild_id, user_id))
+    scheduler.cancel(REMINDER_UNDELIVERED, (guild_id, user_id))
+
+    if action == "end":
+        await end_duty_session(state, interaction.user, auto=False)
+        return await reply_ephemeral(interaction, "Duty ended.")
+
+    duty.last_continue = time.time()
+    duty.continues += 1
+    checkpoint_duty(state, user_id)
+    
+    log_to_console("DUTY_CONTINUED", interaction.user, {
+        "Guild": guild_id,
+        "Continue Count": duty.continues,
+        "Total Duration": str(datetime.now(timezone.utc) - duty.start_time)[:-7]
+    })
+    
+    send_log_embed(state, "Duty Continued", interaction.user, {
+        "User": f"{interaction.user} ({interaction.user.id})",
+        "Continue Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p'),
+        "Continue Count": duty.continues,
+        "Total Duration": str(datetime.now(timezone.utc) - duty.start_time)[:-7]
+    }, console=False)
+    
+    await reply_ephemeral(interaction, "Duty continued.")
 
-    async def on_timeout(self):
-        """Handle timeout when user doesn't respond to reminder"""
-        log_to_console("REMINDER_TIMEOUT", details={"User ID": self.user_id, "Responded": self.responded, "In Active Duties": self.user_id in ACTIVE_DUTIES})
-        
-        if not self.responded and self.user_id in ACTIVE_DUTIES:
-            user = ACTIVE_DUTIES[self.user_id]['user']
-            log_to_console("DUTY_AUTO_ENDED", user, {"Reason": "No response to reminder", "Timeout": "2 minutes"})
-            await end_duty_session(user, auto=True, reason="No response to reminder (2 minute timeout)")
+async def reminder_timed_out(state, user, duty_data):
+    """Handle timeout when user doesn't respond to reminder"""
+    log_to_console("REMINDER_TIMEOUT", details={"User ID": user.id, "Guild": state.guild_id, "Sequence": duty_data.awaiting_seq})
+    if duty_data.awaiting_seq:
+        log_to_console("DUTY_AUTO_ENDED", user, {"Reason": "No response to reminder", "Timeout": "2 minutes"})
+        await end_duty_session(state, user, auto=True, reason="No response to reminder (2 minute timeout)")
 
 # --- Log Helper ---
-async def send_log_embed(title=None, user=None, fields=None, embed=None):
-    """Send embed to log channel and print to console"""
-    log_channel = bot.get_channel(LOG_CHANNEL_ID)
+async def resolve_log_channel(guild_id):
+    """The guild's log channel, or None if it has none configured; raises if the configured one is unusable"""
+    channel_id = guild_configs.get(guild_id).log_channel_id
+    if channel_id is None:
+        return None  # logging not configured for this guild
+    log_channel = bot.get_channel(channel_id)
     if not log_channel:
         try:
-            log_channel = await bot.fetch_channel(LOG_CHANNEL_ID)
+            log_channel = await bot.fetch_channel(channel_id)
         except Exception as e:
-            log_to_console("LOG_CHANNEL_FETCH_FAILED", details={"Error": str(e)})
-            return
-
+            log_to_console("LOG_CHANNEL_FETCH_FAILED", details={"Guild": guild_id, "Error": str(e)})
+            raise
+    if not hasattr(log_channel, 'send'):
+        log_to_console("LOG_CHANNEL_INVALID", details={"Guild": guild_id, "Channel Type": type(log_channel).__name__})
+        raise TypeError(f"log channel {channel_id} is a {type(log_channel).__name__}, which can't receive messages")
+    return log_channel
+
+def send_log_embed(state, title=None, user=None, fields=None, embed=None, console=True):
+    """Queue an embed for the guild's log channel, if it has one, and log it; never waits on Discord.
+
+    Pass console=False when the caller has already logged the same event.
+    """
     if embed is None:
         embed = Embed(title=title, color=discord.Color.blue())
         if fields:
             for key, value in fields.items():
                 embed.add_field(name=key, value=value, inline=False)
 
-    # Log to console
-    if user:
+    if console:
         log_to_console(title or "LOG_EVENT", user, fields)
-    else:
-        log_to_console(title or "LOG_EVENT", details=fields)
 
-    try:
-        if hasattr(log_channel, 'send'):
-            await log_channel.send(embed=embed)
-        else:
-            log_to_console("LOG_CHANNEL_INVALID", details={"Channel Type": type(log_channel).__name__})
-    except Exception as e:
-        log_to_console("LOG_SEND_FAILED", details={"Error": str(e)})
+    if guild_configs.get(state.guild_id).log_channel_id is not None:
+        state.log_dispatcher.enqueue(embed)
 
 # --- Duty Management ---
-async def end_duty_session(user, auto=False, reason=None):
+def guild_name(guild_id):
+    guild = bot.get_guild(guild_id) if guild_id else None
+    return guild.name if guild else None
+
+def guild_point_rules(guild_id):
+    config = guild_configs.get(guild_id)
+    return PointRules.from_dict(config.point_rules, config.point_minutes)
+
+async def end_duty_session(state, user, auto=False, reason=None):
     """End a duty session and award points"""
-    if user.id not in ACTIVE_DUTIES:
+    if user.id not in state.duties:
         return
 
-    duty_data = ACTIVE_DUTIES[user.id]
-    duration = datetime.now(timezone.utc) - duty_data["start_time"]
+    duty_data = state.duties[user.id]
+    end_time = datetime.now(timezone.utc)
+    duration = end_time - duty_data.start_time
     
-    # Calculate points (1 point per 4 minutes)
-    total_minutes = int(duration.total_seconds() // 60)
-    awarded_points = total_minutes // 4
+    # Calculate points with the guild's rules (1 point per 4 minutes by default)
+    awarded_points = guild_point_rules(state.guild_id).score(duty_data.start, end_time.timestamp(), auto)
     
     # Add points to user
     user_id_str = str(user.id)
-    if user_id_str not in points:
-        points[user_id_str] = 0
-    points[user_id_str] += awarded_points
-    save_points(points)
+    add_points(state, user_id_str, awarded_points)
+    record_session(state, user.id, duty_data.start_time, end_time, duty_data.continues, awarded_points, auto)
 
-    # Clean up active duty and reminder task
-    del ACTIVE_DUTIES[user.id]
-    if user.id in REMINDER_TASKS:
-        REMINDER_TASKS[user.id].cancel()
-        del REMINDER_TASKS[user.id]
+    # Clean up active duty and its pending reminder/expiry
+    del state.duties[user.id]
+    state.storage.delete_duty(user.id)
+    scheduler.cancel_user((state.guild_id, user.id), DUTY_EVENTS)
+    note_guild_duties(state)
 
     # Create embed for logging
     embed_title = "Duty Auto-Ended" if auto else "Duty Ended"
     embed_color = discord.Color.orange() if auto else discord.Color.red()
     
     log_fields = {
-        "User": f"{user} ({user.id})",
+        "User": f"<@{user.id}> ({user.id})",
         "End Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p'),
         "Duration": str(duration)[:-7],
         "Points Earned": awarded_points,
-        "Total Points": points[user_id_str],
-        "Continues": duty_data['continues']
+        "Total Points": state.points[user_id_str],
+        "Continues": duty_data.continues
     }
     
     if auto and reason:
@@ -243,103 +673,244 @@ async def end_duty_session(user, auto=False, reason=None):
     for key, value in log_fields.items():
         embed.add_field(name=key, value=value, inline=False)
     
-    await send_log_embed(embed=embed)
+    send_log_embed(state, embed_title, user, log_fields, embed=embed)
 
-    # Send DM to user
-    try:
-        dm_embed = Embed(
-            title="Duty Ended" if not auto else "Duty Auto-Ended",
-            color=embed_color
-        )
-        dm_embed.add_field(name="Duration", value=str(duration)[:-7], inline=False)
-        
-        if auto and reason:
-            dm_embed.add_field(name="Reason", value=reason, inline=False)
-            dm_embed.description = "Your duty was automatically ended."
-        else:
-            dm_embed.description = "Thank you for your service!"
+    # Queue DM to user; end notices go out ahead of reminders
+    dm_embed = Embed(
+        title="Duty Ended" if not auto else "Duty Auto-Ended",
+        color=embed_color
+    )
+    dm_embed.add_field(name="Duration", value=str(duration)[:-7], inline=False)
+    
+    if auto and reason:
+        dm_embed.add_field(name="Reason", value=reason, inline=False)
+        dm_embed.description = "Your duty was automatically ended."
+    else:
+        dm_embed.description = "Thank you for your service!"
+    if guild_name(state.guild_id):
+        dm_embed.set_footer(text=guild_name(state.guild_id))
+
+    dm_queue.send(user, "duty_end", PRIORITY_DUTY_END, on_sent=duty_end_dm_sent, on_failed=duty_end_dm_failed, embed=dm_embed)
+
+async def duty_end_dm_sent(message):
+    log_to_console("DM_SENT", message.user, {"Type": "Duty End Notification"})
+
+async def duty_end_dm_failed(message, error):
+    DM_FAILURES.inc("duty_end")
+    if isinstance(error, discord.Forbidden):
+        log_to_console("DM_FAILED", message.user, {"Reason": "DMs disabled or blocked"})
+    else:
+        log_to_console("DM_FAILED", message.user, {"Error": str(error)})
+
+def schedule_next_reminder(key):
+    scheduler.schedule(REMINDER, key, random.randint(*REMINDER_INTERVAL))
 
-        await user.send(embed=dm_embed)
-        log_to_console("DM_SENT", user, {"Type": "Duty End Notification"})
-    except discord.Forbidden:
-        log_to_console("DM_FAILED", user, {"Reason": "DMs disabled or blocked"})
+async def handle_due_events(batch):
+    """Fire a batch of due scheduler events concurrently"""
+    log_to_console("SCHEDULER_BATCH", details={"Events": len(batch), "Lag": f"{scheduler.lag:.3f}s", "Queue Depth": scheduler.depth})
+    await asyncio.gather(*(fire_event(kind, key) for kind, key in batch))
+
+async def fire_event(kind, key):
+    guild_id, user_id = key
+    state = guilds.peek(guild_id)
+    duty_data = state.duties.get(user_id) if state is not None else None
+    if duty_data is None:
+        return
+    if kind == REMINDER and not duty_data.awaiting_seq and time.time() - duty_data.last_seen <= ACTIVITY_WINDOW \
+            and duty_data.elapsed() < guild_configs.get(guild_id).max_duty_duration.total_seconds():
+        return auto_continue_duty(state, duty_data)
+    user = await duty_user(guild_id, user_id)
+    try:
+        config = guild_configs.get(guild_id)
+        current_duration = datetime.now(timezone.utc) - duty_data.start_time
+        if kind == EXPIRE or current_duration >= config.max_duty_duration:
+            log_to_console("DUTY_AUTO_ENDED", user, {"Reason": "Maximum duration exceeded", "Guild": guild_id})
+            await end_duty_session(state, user, auto=True, reason=f"Maximum duty duration ({config.max_duty_hours:g} hours) exceeded")
+        elif kind == REMINDER:
+            await send_reminder(state, user, duty_data, current_duration)
+        elif kind == REMINDER_TIMEOUT_EVENT:
+            await reminder_timed_out(state, user, duty_data)
+        elif kind == REMINDER_UNDELIVERED and duty_data.awaiting_seq:
+            log_to_console("DUTY_AUTO_ENDED", user, {"Reason": "Reminder not delivered", "Queued DMs": dm_queue.depth})
+            await end_duty_session(state, user, auto=True, reason="Reminder could not be delivered in time")
     except Exception as e:
-        log_to_console("DM_FAILED", user, {"Error": str(e)})
+        log_to_console("REMINDER_ERROR", user, {"Guild": guild_id, "Error": str(e)})
+
+def auto_continue_duty(state, duty_data):
+    """Continue the duty of a recently active moderator without sending a reminder"""
+    idle = time.time() - duty_data.last_seen
+    duty_data.last_continue = time.time()
+    duty_data.continues += 1
+    checkpoint_duty(state, duty_data.user_id)
+    schedule_next_reminder((state.guild_id, duty_data.user_id))
+    AUTO_CONTINUES.inc()
+    log_to_console("DUTY_AUTO_CONTINUED", details={
+        "User ID": duty_data.user_id,
+        "Guild": state.guild_id,
+        "Last Seen": f"{idle:.0f}s ago",
+        "Continue Count": duty_data.continues
+    })
 
-async def schedule_reminder(user):
-    """Schedule reminder for duty"""
-    while user.id in ACTIVE_DUTIES:
-        try:
-            # Wait for 20-30 minutes randomly
-            wait_time = random.randint(1200, 1800)  # 20-30 minutes in seconds
-            await asyncio.sleep(wait_time)
-            
-            if user.id not in ACTIVE_DUTIES:
-                break
-                
-            duty_data = ACTIVE_DUTIES[user.id]
-            current_duration = datetime.now(timezone.utc) - duty_data["start_time"]
-            
-            # Check if duty has exceeded maximum duration
-            if current_duration >= MAX_DUTY_DURATION:
-                log_to_console("DUTY_AUTO_ENDED", user, {"Reason": "Maximum duration exceeded"})
-                await end_duty_session(user, auto=True, reason="Maximum duty duration (12 hours) exceeded")
-                break
-            
-            # Send reminder
-            embed = Embed(
-                title="Duty Reminder",
-                description=f"You have been on duty for {str(current_duration)[:-7]}. Please choose an option:",
-                color=discord.Color.yellow()
-            )
-            embed.add_field(name="Current Duration", value=str(current_duration)[:-7], inline=False)
-            embed.add_field(name="Continue Count", value=duty_data['continues'], inline=False)
+async def send_reminder(state, user, duty_data, current_duration):
+    """Queue a duty reminder; the next one is scheduled once it is delivered"""
+    key = (state.guild_id, user.id)
+    embed = Embed(
+        title="Duty Reminder",
+        description=f"You have been on duty for {str(current_duration)[:-7]}. Please choose an option:",
+        color=discord.Color.yellow()
+    )
+    embed.add_field(name="Current Duration", value=str(current_duration)[:-7], inline=False)
+    embed.add_field(name="Continue Count", value=duty_data.continues, inline=False)
+    if guild_name(state.guild_id):
+        embed.set_footer(text=guild_name(state.guild_id))
+
+    seq = duty_data.reminder_seq + 1
+    duty_data.reminder_seq = seq
+    duty_data.awaiting_seq = seq
+    checkpoint_duty(state, user.id)
+    # A reminder stuck in the DM queue ends the duty only after this much longer deadline;
+    # the response window proper starts in on_sent
+    scheduler.schedule(REMINDER_UNDELIVERED, key, REMINDER_DELIVERY_TIMEOUT)
+
+    def is_current():
+        return state.duties.get(user.id) is duty_data and duty_data.awaiting_seq == seq
+
+    async def on_sent(message):
+        if not is_current():
+            return
+        # The response window starts when the reminder arrives, not when it was queued
+        scheduler.cancel(REMINDER_UNDELIVERED, key)
+        scheduler.schedule(REMINDER_TIMEOUT_EVENT, key, REMINDER_TIMEOUT)
+        schedule_next_reminder(key)
+        log_to_console("REMINDER_SENT", user, {
+            "Guild": state.guild_id,
+            "Duration": str(current_duration)[:-7],
+            "Continue Count": duty_data.continues
+        })
+        
+        # Also send to log channel
+        send_log_embed(state, "Duty Reminder Sent", user, {
+            "User": f"<@{user.id}> ({user.id})",
+            "Duration": str(current_duration)[:-7],
+            "Continue Count": duty_data.continues,
+            "Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p')
+        }, console=False)
+
+    async def on_failed(message, error):
+        DM_FAILURES.inc("reminder")
+        if isinstance(error, discord.Forbidden):
+            log_to_console("REMINDER_FAILED", user, {"Reason": "DMs disabled"})
+            # If we can't send DM, auto-end the duty
+            if user.id in state.duties:
+                await end_duty_session(state, user, auto=True, reason="Unable to send reminder (DMs disabled)")
+        else:
+            log_to_console("REMINDER_FAILED", user, {"Error": str(error), "Attempts": message.attempts})
+            # Retries ran out, so nothing will arrive to answer; don't leave the duty waiting out the
+            # delivery deadline. Any other error is left to that deadline rather than ending the shift now.
+            if message.attempts >= dm_queue.max_attempts and is_current():
+                await end_duty_session(state, user, auto=True, reason="Unable to send reminder")
+
+    dm_queue.send(user, "reminder", PRIORITY_REMINDER, is_current=is_current, on_sent=on_sent, on_failed=on_failed,
+                  embed=embed, view=reminder_components(state.guild_id, user.id, seq))
+
+scheduler = DutyScheduler(handle_due_events)
+dm_queue = DirectMessageQueue(
+    lambda user_id: bot.create_dm(discord.Object(id=user_id)),
+    workers=DM_WORKERS,
+    on_event=lambda event_type, details: log_to_console(event_type, details=details)
+)
+
+async def duty_user(guild_id, user_id):
+    """User object for an active duty.
+
+    Duty records only hold the id; the user is looked up (usually a cache
+    hit) when a log event needs it and is never kept on the record. If the
+    lookup fails the result is a bare discord.Object: DMs go out by id and
+    embeds show a mention, so only .id may be relied on.
+    """
+    return await user_resolver.resolve(user_id, guild_id) or discord.Object(id=user_id)
+
+async def restore_active_duties():
+    """Reload checkpointed duties of every guild that had some, reschedule their timers and settle the expired ones"""
+    started = time.perf_counter()
+    restored = expired = 0
+    for guild_id in sorted(active_guilds):
+        state = await guilds.get(guild_id)
+        active, settled = restore_guild_duties(state)
+        restored += active
+        expired += settled
+    log_to_console("DUTIES_RESTORED", details={
+        "Guilds": len(active_guilds),
+        "Active": restored,
+        "Expired": expired,
+        "Time": f"{(time.perf_counter() - started) * 1000:.1f}ms"
+    })
 
-            view = ReminderView(user.id)
-            
-            try:
-                await user.send(embed=embed, view=view)
-                log_to_console("REMINDER_SENT", user, {
-                    "Duration": str(current_duration)[:-7],
-                    "Continue Count": duty_data['continues']
-                })
-                
-                # Also send to log channel
-                await send_log_embed("Duty Reminder Sent", user, {
-                    "User": f"{user} ({user.id})",
-                    "Duration": str(current_duration)[:-7],
-                    "Continue Count": duty_data['continues'],
-                    "Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p')
-                })
-            except discord.Forbidden:
-                log_to_console("REMINDER_FAILED", user, {"Reason": "DMs disabled"})
-                # If we can't send DM, auto-end the duty
-                await end_duty_session(user, auto=True, reason="Unable to send reminder (DMs disabled)")
-                break
-            except Exception as e:
-                log_to_console("REMINDER_FAILED", user, {"Error": str(e)})
-                break
-                
-        except asyncio.CancelledError:
-            log_to_console("REMINDER_TASK_CANCELLED", user)
-            break
-        except Exception as e:
-            log_to_console("REMINDER_ERROR", user, {"Error": str(e)})
-            break
+def restore_guild_duties(state):
+    now = time.time()
+    max_seconds = guild_configs.get(state.guild_id).max_duty_duration.total_seconds()
+    expired = []
+    for record in state.storage.load_duties():
+        duty_data = DutyRecord.from_dict(record)
+        user_id = duty_data.user_id
+        key = (state.guild_id, user_id)
+        state.duties[user_id] = duty_data
+        remaining = duty_data.start + max_seconds - now
+        if remaining <= 0:
+            expired.append(user_id)
+            continue
+        # Next reminder counts from the last continue; overdue ones are spread over a minute
+        due = duty_data.last_continue - now + random.randint(*REMINDER_INTERVAL)
+        scheduler.schedule(REMINDER, key, due if due > 0 else random.uniform(0, 60))
+        scheduler.schedule(EXPIRE, key, remaining)
+        # An unanswered reminder gets a fresh response window; its buttons still work
+        if duty_data.awaiting_seq:
+            scheduler.schedule(REMINDER_TIMEOUT_EVENT, key, REMINDER_TIMEOUT)
+
+    if expired:
+        settle_expired_duties(state, expired)
+    note_guild_duties(state)
+    return len(state.duties), len(expired)
+
+def settle_expired_duties(state, user_ids):
+    """End duties that ran past the guild's maximum duration while the bot was down, in one batch.
+
+    Each is credited for the maximum duration and summarised in a single log
+    embed; no DMs are sent since the shift ended long ago.
+    """
+    config = guild_configs.get(state.guild_id)
+    rules = guild_point_rules(state.guild_id)
+    lines = []
+    for user_id in user_ids:
+        duty_data = state.duties.pop(user_id)
+        state.storage.delete_duty(user_id)
+        end_time = duty_data.start_time + config.max_duty_duration
+        awarded_points = rules.score(duty_data.start, end_time.timestamp(), True)
+        add_points(state, str(user_id), awarded_points)
+        record_session(state, user_id, duty_data.start_time, end_time, duty_data.continues, awarded_points, True)
+        lines.append(f"<@{user_id}> +{awarded_points}")
+
+    embed = Embed(title="Duties Auto-Ended After Restart", color=discord.Color.orange())
+    embed.description = "\n".join(lines)[:4000]
+    embed.add_field(name="Count", value=len(user_ids), inline=False)
+    embed.add_field(name="Reason", value=f"Maximum duty duration ({config.max_duty_hours:g} hours) exceeded while the bot was offline", inline=False)
+    send_log_embed(state, embed=embed)
 
 
 # --- Commands ---
+# Every command runs inside a guild and works on that guild's partition
 @tree.command(name="addmod", description="Add a moderator who can use duty commands (Admin only)")
+@app_commands.guild_only()
 async def addmod(interaction: Interaction, user_id: str):
     if not is_admin(interaction):
         return await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
     
     try:
         uid = int(user_id)
-        if uid not in authorized_mods:
-            authorized_mods.append(uid)
-            save_authorized_mods(authorized_mods)
-            log_to_console("MOD_ADDED", interaction.user, {"Added User ID": uid})
+        state = await guilds.get(interaction.guild_id)
+        if state.mods.add(uid):
+            save_authorized_mods(state)
+            log_to_console("MOD_ADDED", interaction.user, {"Guild": state.guild_id, "Added User ID": uid})
             await interaction.response.send_message(f"User ID {uid} added as authorized mod.", ephemeral=True)
         else:
             await interaction.response.send_message(f"User ID {uid} is already authorized.", ephemeral=True)
@@ -347,16 +918,17 @@ async def addmod(interaction: Interaction, user_id: str):
         await interaction.response.send_message("Invalid user ID.", ephemeral=True)
 
 @tree.command(name="removemod", description="Remove a moderator's duty command access (Admin only)")
+@app_commands.guild_only()
 async def removemod(interaction: Interaction, user_id: str):
     if not is_admin(interaction):
         return await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
     
     try:
         uid = int(user_id)
-        if uid in authorized_mods:
-            authorized_mods.remove(uid)
-            save_authorized_mods(authorized_mods)
-            log_to_console("MOD_REMOVED", interaction.user, {"Removed User ID": uid})
+        state = await guilds.get(interaction.guild_id)
+        if state.mods.remove(uid):
+            save_authorized_mods(state)
+            log_to_console("MOD_REMOVED", interaction.user, {"Guild": state.guild_id, "Removed User ID": uid})
             await interaction.response.send_message(f"User ID {uid} removed from authorized mods.", ephemeral=True)
         else:
             await interaction.response.send_message(f"User ID {uid} is not in the list.", ephemeral=True)
@@ -364,55 +936,174 @@ async def removemod(interaction: Interaction, user_id: str):
         await interaction.response.send_message("Invalid user ID.", ephemeral=True)
 
 @tree.command(name="viewmods", description="View all authorized moderator IDs (Admin only)")
+@app_commands.guild_only()
 async def viewmods(interaction: Interaction):
     if not is_admin(interaction):
         await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
         return
 
+    await interaction.response.defer(ephemeral=True)
+    state = await guilds.get(interaction.guild_id)
+
     embed = Embed(title="Authorized Moderators", color=discord.Color.orange())
-    if not authorized_mods:
+    if not state.mods:
         embed.description = "No moderators added yet."
     else:
-        for mod_id in authorized_mods:
-            try:
-                user = await bot.fetch_user(mod_id)
+        mod_ids = list(state.mods)
+        users = await user_resolver.resolve_many(mod_ids, state.guild_id)
+        for mod_id, user in zip(mod_ids, users):
+            if user is not None:
                 embed.add_field(name=f"{user}", value=f"ID: {mod_id}", inline=False)
-            except:
+            else:
                 embed.add_field(name="Unknown User", value=f"ID: {mod_id}", inline=False)
 
-    log_to_console("VIEWMODS_COMMAND", interaction.user, {"Mod Count": len(authorized_mods)})
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    log_to_console("VIEWMODS_COMMAND", interaction.user, {"Mod Count": len(state.mods), "User Cache Hit Rate": f"{user_resolver.hit_rate:.0%}"})
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
-@tree.command(name="viewduties", description="View all current active duties (Admin only)")
-async def viewduties(interaction: Interaction):
+DUTIES_PAGE_SIZE = 10
+DUTY_SORT_NAMES = {
+    "longest": "Longest on duty",
+    "newest": "Most recently started",
+    "stale": "Longest since a continue",
+    "recent": "Most recently continued"
+}
+DUTY_SORT_CHOICES = [app_commands.Choice(name=DUTY_SORT_NAMES[sort], value=sort) for sort in DUTY_SORTS]
+
+async def build_duties_embed(state, page, sort="longest", min_hours=None, idle_minutes=None):
+    """Render one page of active duties; returns (embed, page shown, page count).
+
+    A page past the end shows the last page instead.
+
+    Pages are cached on the guild's duty index until the duty set changes.
+    Times are Discord timestamps, so a cached page never goes stale; when a
+    time filter is set the filter is evaluated per minute.
+    """
+    filtered = min_hours is not None or idle_minutes is not None
+    minute = int(time.time() // 60) if filtered else None
+    key = (sort, min_hours, idle_minutes, minute, page)
+    cached = state.duties.pages.get(key)
+    if cached is not None:
+        return cached
+
+    version = state.duties.version
+    now = minute * 60 if filtered else time.time()
+    matching, rows = state.duties.select(now, sort, min_hours, idle_minutes, page * DUTIES_PAGE_SIZE, DUTIES_PAGE_SIZE)
+    page_count = max(1, -(-matching // DUTIES_PAGE_SIZE))
+    if page >= page_count:  # asked past the end, e.g. the list shrank since the last page was shown
+        page = page_count - 1
+        _, rows = state.duties.select(now, sort, min_hours, idle_minutes, page * DUTIES_PAGE_SIZE, DUTIES_PAGE_SIZE)
+    users = await user_resolver.resolve_many((duty.user_id for duty in rows), state.guild_id)
+
+    embed = Embed(title="Active Duties", color=discord.Color.teal())
+    if not rows:
+        embed.description = "There are no active duties." if not filtered else "No active duties match these filters."
+    for duty, user in zip(rows, users):
+        embed.add_field(
+            name=f"{user.display_name if user is not None else 'Unknown User'} (ID: {duty.user_id})",
+            value=f"Started <t:{int(duty.start)}:f> (<t:{int(duty.start)}:R>) · "
+                  f"last continued <t:{int(duty.last_continue)}:R> · {duty.continues} continues",
+            inline=False
+        )
+    filters = []
+    if min_hours is not None:
+        filters.append(f"on duty > {min_hours:g}h")
+    if idle_minutes is not None:
+        filters.append(f"not continued in {idle_minutes}m")
+    embed.set_footer(text=" · ".join([
+        f"Page {page + 1}/{page_count}",
+        f"{matching} of {len(state.duties)} duties",
+        DUTY_SORT_NAMES[sort]
+    ] + filters))
+
+    # Don't cache a page the duty set changed underneath while names were resolved
+    if state.duties.version == version:
+        state.duties.cache_page(key, (embed, page, page_count))
+    return embed, page, page_count
+
+class DutiesView(View):
+    def __init__(self, state, owner_id, page, page_count, sort, min_hours, idle_minutes):
+        super().__init__(timeout=180)
+        self.state = state
+        self.owner_id = owner_id
+        self.page = page
+        self.page_count = page_count
+        self.sort = sort
+        self.min_hours = min_hours
+        self.idle_minutes = idle_minutes
+        self.sync_buttons()
+
+    def sync_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+
+    async def show_page(self, interaction: Interaction, page):
+        if interaction.user.id != self.owner_id:
+            return await interaction.response.send_message("This duty list belongs to someone else.", ephemeral=True)
+        embed, self.page, self.page_count = await build_duties_embed(
+            self.state, max(0, page), self.sort, self.min_hours, self.idle_minutes
+        )
+        self.sync_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Previous", style=ButtonStyle.secondary)
+    async def previous_page(self, interaction: Interaction, button: Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Refresh", style=ButtonStyle.secondary)
+    async def refresh(self, interaction: Interaction, button: Button):
+        await self.show_page(interaction, self.page)
+
+    @discord.ui.button(label="Next", style=ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, button: Button):
+        await self.show_page(interaction, self.page + 1)
+
+@tree.command(name="viewduties", description="View current active duties, filtered and sorted (Admin only)")
+@app_commands.guild_only()
+@app_commands.choices(sort=DUTY_SORT_CHOICES)
+@app_commands.describe(
+    sort="Order of the list (default: longest on duty first)",
+    min_hours="Only duties running for more than this many hours",
+    idle_minutes="Only duties not continued for more than this many minutes",
+    page="Page to open"
+)
+async def viewduties(interaction: Interaction, sort: app_commands.Choice[str] = None, min_hours: float = None,
+                     idle_minutes: int = None, page: int = 1):
     if not is_admin(interaction):
         await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
         return
-
-    embed = discord.Embed(title="Active Duties", color=discord.Color.teal())
-    if not ACTIVE_DUTIES:
-        embed.description = "There are no active duties."
-    else:
-        for user_id, data in ACTIVE_DUTIES.items():
-            embed.add_field(
-                name=f"{data['user']} (ID: {user_id})",
-                value=f"Start: {data['start_time'].strftime('%Y-%m-%d %H:%M:%S')}",
-                inline=False
-            )
-
-    log_to_console("VIEWDUTIES_COMMAND", interaction.user, {"Active Duties": len(ACTIVE_DUTIES)})
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    if (min_hours is not None and min_hours < 0) or (idle_minutes is not None and idle_minutes < 0):
+        return await interaction.response.send_message("Filters must not be negative.", ephemeral=True)
+
+    state = await guilds.get(interaction.guild_id)
+    await interaction.response.defer(ephemeral=True)
+
+    sort_value = sort.value if sort else "longest"
+    # Pages are bisected out of the duty index's start/continue orderings and cached until a duty changes
+    embed, page, page_count = await build_duties_embed(state, max(0, page - 1), sort_value, min_hours, idle_minutes)
+    view = DutiesView(state, interaction.user.id, page, page_count, sort_value, min_hours, idle_minutes)
+
+    log_to_console("VIEWDUTIES_COMMAND", interaction.user, {
+        "Guild": state.guild_id,
+        "Active Duties": len(state.duties),
+        "Sort": sort_value,
+        "Min Hours": min_hours,
+        "Idle Minutes": idle_minutes,
+        "Page": page + 1
+    })
+    await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
 @tree.command(name="dutystart", description="Start your duty shift and begin receiving reminders")
+@app_commands.guild_only()
 async def dutystart(interaction: Interaction):
-    if not is_authorized_mod(interaction.user.id):
+    state = await guilds.get(interaction.guild_id)
+    if not is_authorized_mod(state, interaction.user):
         try:
             await interaction.response.send_message("You are not authorized to start duty.", ephemeral=True)
         except discord.errors.NotFound:
             pass
         return
 
-    if interaction.user.id in ACTIVE_DUTIES:
+    if interaction.user.id in state.duties:
         try:
             await interaction.response.send_message("You are already on duty.", ephemeral=True)
         except discord.errors.NotFound:
@@ -424,20 +1115,22 @@ async def dutystart(interaction: Interaction):
     except discord.errors.NotFound:
         return
 
-    # Cancel any existing reminder task
-    if interaction.user.id in REMINDER_TASKS:
-        REMINDER_TASKS[interaction.user.id].cancel()
-        del REMINDER_TASKS[interaction.user.id]
+    key = (state.guild_id, interaction.user.id)
+    # Drop any leftover reminder from a previous duty
+    if scheduler.is_scheduled(REMINDER, key):
+        scheduler.cancel_user(key, DUTY_EVENTS)
         log_to_console("REMINDER_TASK_CANCELLED", interaction.user, {"Reason": "Starting new duty"})
 
-    now = datetime.now(timezone.utc)
+    state.duties[interaction.user.id] = DutyRecord(interaction.user.id)
+    now = state.duties[interaction.user.id].start_time
+    checkpoint_duty(state, interaction.user.id)
+    note_guild_duties(state)
 
-    ACTIVE_DUTIES[interaction.user.id] = {
-        "user": interaction.user,
-        "start_time": now,
-        "last_continue": now,
-        "continues": 0
-    }
+    # Schedule the first reminder and the maximum-duration expiry before any await, so an
+    # /endduty racing this command always finds them to cancel
+    schedule_next_reminder(key)
+    scheduler.schedule(EXPIRE, key, guild_configs.get(state.guild_id).max_duty_duration.total_seconds())
+    log_to_console("REMINDER_TASK_STARTED", interaction.user, {"Guild": state.guild_id, "Queue Depth": scheduler.depth})
 
     embed = Embed(
         title="Duty Started",
@@ -450,53 +1143,100 @@ async def dutystart(interaction: Interaction):
 
     await interaction.followup.send(embed=embed, ephemeral=True)
 
-    await send_log_embed("Duty Started", interaction.user, {
+    send_log_embed(state, "Duty Started", interaction.user, {
         "User": f"{interaction.user} ({interaction.user.id})",
         "Start Time": now.strftime('%A, %d %B %Y %H:%M %p')
     })
 
-    # Start reminder task
-    task = asyncio.create_task(schedule_reminder(interaction.user))
-    REMINDER_TASKS[interaction.user.id] = task
-    log_to_console("REMINDER_TASK_STARTED", interaction.user)
-
 
 @tree.command(name="endduty", description="End your current duty shift")
+@app_commands.guild_only()
 async def endduty(interaction: Interaction):
     await interaction.response.defer(ephemeral=True)  # 🔁 Defer immediately
 
-    if interaction.user.id not in ACTIVE_DUTIES:
+    state = await guilds.get(interaction.guild_id)
+    if interaction.user.id not in state.duties:
         return await interaction.followup.send("You are not on duty.", ephemeral=True)
 
-    await end_duty_session(interaction.user, auto=False)
+    await end_duty_session(state, interaction.user, auto=False)
     await interaction.followup.send("Duty ended.", ephemeral=True)
 
 @tree.command(name="total", description="View a user's total points")
-async def total(interaction: Interaction, user_id: str):
+@app_commands.guild_only()
+async def total(interaction: Interaction, user_id: str, season: int = None):
     if not is_admin(interaction):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
     
     try:
         uid = str(int(user_id))
-        user_points = points.get(uid, 0)
-        log_to_console("TOTAL_COMMAND", interaction.user, {"Queried User ID": uid, "Points": user_points})
-        await interaction.response.send_message(f"<@{uid}> has **{user_points}** points.", ephemeral=True)
+        state = await guilds.get(interaction.guild_id)
+        if season is None:
+            user_points = await state.storage.get_points(uid)
+            suffix = ""
+        else:
+            archive = state.seasons.archive(season)
+            if archive is None:
+                return await interaction.response.send_message(f"There is no archived season {season}.", ephemeral=True)
+            user_points = archive.points(uid)
+            suffix = f" in {archive.meta['name']}"
+        log_to_console("TOTAL_COMMAND", interaction.user, {"Guild": state.guild_id, "Queried User ID": uid, "Season": season, "Points": user_points})
+        await interaction.response.send_message(f"<@{uid}> has **{user_points}** points{suffix}.", ephemeral=True)
     except ValueError:
         await interaction.response.send_message("Invalid user ID.", ephemeral=True)
 
-@tree.command(name="resetpoints", description="Reset all points (Admin only)")
-async def resetpoints(interaction: Interaction):
+@tree.command(name="resetpoints", description="Archive this season's points and start a new season (Admin only)")
+@app_commands.guild_only()
+async def resetpoints(interaction: Interaction, season_name: str = None):
     if not is_admin(interaction):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+    state = await guilds.get(interaction.guild_id)
+    if state.points_table_lock.locked():
+        return await interaction.response.send_message("The points table is already being rewritten; try again shortly.", ephemeral=True)
     
-    old_count = len(points)
-    points.clear()
-    save_points(points)
+    await interaction.response.defer(ephemeral=True)
+    async with state.points_table_lock:
+        entry, carried = await roll_over_season(state, season_name)
     
-    log_to_console("POINTS_RESET", interaction.user, {"Previous User Count": old_count})
-    await interaction.response.send_message("All points have been reset.", ephemeral=True)
+    log_to_console("SEASON_ARCHIVED", interaction.user, {
+        "Guild": state.guild_id,
+        "Season": entry["season"],
+        "Users": entry["users"],
+        "Total Points": entry["total"],
+        "Carried Over": carried
+    })
+    send_log_embed(state, "Season Archived", interaction.user, {
+        "Admin": f"{interaction.user} ({interaction.user.id})",
+        "Season": f"{entry['name']} (#{entry['season']})",
+        "Users": entry["users"],
+        "Total Points": entry["total"],
+        "Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p')
+    }, console=False)
+    await interaction.followup.send(
+        f"Archived **{entry['name']}** ({entry['users']} users, {entry['total']} points). "
+        f"Points start from zero for season {state.seasons.current}; past seasons stay available with `season:{entry['season']}`.",
+        ephemeral=True
+    )
+
+@tree.command(name="seasons", description="List archived point seasons (Admin only)")
+@app_commands.guild_only()
+async def seasons(interaction: Interaction):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+
+    state = await guilds.get(interaction.guild_id)
+    embed = Embed(title="Seasons", color=discord.Color.gold())
+    for entry in state.seasons.seasons[-24:]:
+        started = f"<t:{int(entry['started'])}:d>" if entry["started"] else "the beginning"
+        embed.add_field(
+            name=f"#{entry['season']} · {entry['name']}",
+            value=f"{started} – <t:{int(entry['ended'])}:d> · {entry['users']} users · {entry['total']} points",
+            inline=False
+        )
+    embed.description = f"Season {state.seasons.current} is in progress." + ("" if state.seasons.seasons else " No seasons have been archived yet.")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @tree.command(name="addpoints", description="Add points to a user (Admin only)")
+@app_commands.guild_only()
 async def addpoints(interaction: Interaction, user_id: str, points_to_add: int):
     if not is_admin(interaction):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
@@ -509,92 +1249,654 @@ async def addpoints(interaction: Interaction, user_id: str, points_to_add: int):
             return await interaction.response.send_message("Points must be a positive number.", ephemeral=True)
         
         # Add points to user
-        if uid not in points:
-            points[uid] = 0
-        
-        old_points = points[uid]
-        points[uid] += points_to_add
-        save_points(points)
+        state = await guilds.get(interaction.guild_id)
+        old_points = state.points.get(uid, 0)
+        add_points(state, uid, points_to_add)
         
         log_to_console("ADDPOINTS_COMMAND", interaction.user, {
+            "Guild": state.guild_id,
             "Target User ID": uid, 
             "Points Added": points_to_add,
             "Previous Points": old_points,
-            "New Total": points[uid]
+            "New Total": state.points[uid]
         })
         
-        await send_log_embed("Points Manually Added", interaction.user, {
+        send_log_embed(state, "Points Manually Added", interaction.user, {
             "Admin": f"{interaction.user} ({interaction.user.id})",
             "Target User": f"<@{uid}> ({uid})",
             "Points Added": points_to_add,
-            "New Total": points[uid],
+            "New Total": state.points[uid],
             "Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p')
-        })
+        }, console=False)
         
         await interaction.response.send_message(
-            f"Added **{points_to_add}** points to <@{uid}>. New total: **{points[uid]}** points.", 
+            f"Added **{points_to_add}** points to <@{uid}>. New total: **{state.points[uid]}** points.",
             ephemeral=True
         )
         
     except ValueError:
         await interaction.response.send_message("Invalid user ID.", ephemeral=True)
 
-@tree.command(name="leaderboard", description="View the points leaderboard (Admin only)")
-async def leaderboard(interaction: Interaction):
-    if not is_admin(interaction):
-        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
-    
-    if not points:
-        return await interaction.response.send_message("No points data available.", ephemeral=True)
-    
-    # Sort users by points (descending)
-    sorted_users = sorted(points.items(), key=lambda x: x[1], reverse=True)
+LEADERBOARD_PAGE_SIZE = 10
+
+async def build_leaderboard_embed(state, page, season=None):
+    index = season_board(state, season)
+    rows = index.page(page, LEADERBOARD_PAGE_SIZE)
+    users = await user_resolver.resolve_many((user_id for _, user_id, _ in rows), state.guild_id)
     
-    embed = Embed(title="Points Leaderboard", color=discord.Color.gold())
+    title = "Points Leaderboard" if season is None else f"Points Leaderboard · {index.meta['name']}"
+    embed = Embed(title=title, color=discord.Color.gold())
     
-    for i, (user_id, user_points) in enumerate(sorted_users[:10], 1):  # Top 10
-        try:
-            user = await bot.fetch_user(int(user_id))
+    for (rank, user_id, user_points), user in zip(rows, users):
+        if user is not None:
             embed.add_field(
-                name=f"{i}. {user.display_name}",
+                name=f"{rank}. {user.display_name}",
                 value=f"{user_points} points",
                 inline=False
             )
-        except:
+        else:
             embed.add_field(
-                name=f"{i}. Unknown User",
+                name=f"{rank}. Unknown User",
                 value=f"{user_points} points (ID: {user_id})",
                 inline=False
             )
+    embed.set_footer(text=f"Page {page + 1}/{index.page_count(LEADERBOARD_PAGE_SIZE)} · {len(index)} users")
+    return embed
+
+class LeaderboardView(View):
+    def __init__(self, state, owner_id, page=0, season=None):
+        super().__init__(timeout=180)
+        self.state = state
+        self.owner_id = owner_id
+        self.page = page
+        self.season = season  # archived season number, None for the live table
+        self.sync_buttons()
+
+    def page_count(self):
+        return season_board(self.state, self.season).page_count(LEADERBOARD_PAGE_SIZE)
+
+    def sync_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.page_count() - 1
+
+    async def show_page(self, interaction: Interaction, page):
+        if interaction.user.id != self.owner_id:
+            return await interaction.response.send_message("This leaderboard belongs to someone else.", ephemeral=True)
+        self.page = max(0, min(page, self.page_count() - 1))
+        self.sync_buttons()
+        await interaction.response.edit_message(embed=await build_leaderboard_embed(self.state, self.page, self.season), view=self)
+
+    @discord.ui.button(label="Previous", style=ButtonStyle.secondary)
+    async def previous_page(self, interaction: Interaction, button: Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, button: Button):
+        await self.show_page(interaction, self.page + 1)
+
+@tree.command(name="leaderboard", description="View the points leaderboard (Admin only)")
+@app_commands.guild_only()
+async def leaderboard(interaction: Interaction, page: int = 1, season: int = None):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+    
+    state = await guilds.get(interaction.guild_id)
+    board = season_board(state, season)
+    if board is None:
+        return await interaction.response.send_message(f"There is no archived season {season}.", ephemeral=True)
+    if not len(board):
+        return await interaction.response.send_message("No points data available.", ephemeral=True)
     
-    log_to_console("LEADERBOARD_COMMAND", interaction.user, {"Total Users": len(points)})
+    await interaction.response.defer(ephemeral=True)
+
+    # Pages come straight out of the order-statistics index (or the season archive's rank blocks), no sorting needed
+    page_count = board.page_count(LEADERBOARD_PAGE_SIZE)
+    view = LeaderboardView(state, interaction.user.id, max(0, min(page - 1, page_count - 1)), season)
+    embed = await build_leaderboard_embed(state, view.page, season)
+    
+    log_to_console("LEADERBOARD_COMMAND", interaction.user, {"Guild": state.guild_id, "Season": season, "Total Users": len(board), "Page": view.page + 1, "User Cache Hit Rate": f"{user_resolver.hit_rate:.0%}"})
+    await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+
+@tree.command(name="rank", description="View your leaderboard rank, or another user's (admins only)")
+@app_commands.guild_only()
+async def rank(interaction: Interaction, user_id: str = None):
+    try:
+        uid = int(user_id) if user_id else interaction.user.id
+    except ValueError:
+        return await interaction.response.send_message("Invalid user ID.", ephemeral=True)
+
+    if uid != interaction.user.id and not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to view other users' ranks.", ephemeral=True)
+
+    state = await guilds.get(interaction.guild_id)
+    user_rank = state.leaderboard.rank(uid)
+    log_to_console("RANK_COMMAND", interaction.user, {"Guild": state.guild_id, "Queried User ID": uid, "Rank": user_rank})
+    if user_rank is None:
+        return await interaction.response.send_message(f"<@{uid}> has no points yet.", ephemeral=True)
+    await interaction.response.send_message(
+        f"<@{uid}> is ranked **#{user_rank}** of {len(state.leaderboard)} with **{state.points.get(str(uid), 0)}** points.",
+        ephemeral=True
+    )
+
+STATS_PERIODS = [
+    app_commands.Choice(name="Today", value="day"),
+    app_commands.Choice(name="This week", value="week"),
+    app_commands.Choice(name="All time", value="all")
+]
+
+def format_hours(seconds):
+    return f"{seconds / 3600:.1f}h"
+
+@tree.command(name="stats", description="View duty time for a user or the top moderators for a period")
+@app_commands.guild_only()
+@app_commands.choices(period=STATS_PERIODS)
+async def stats(interaction: Interaction, period: app_commands.Choice[str] = None, user_id: str = None, top: int = 10):
+    period_value = period.value if period else "week"
+    period_name = period.name if period else "This week"
+    now = datetime.now(timezone.utc).timestamp()
+
+    if user_id is None and not is_admin(interaction):
+        user_id = str(interaction.user.id)
+    try:
+        uid = int(user_id) if user_id else None
+    except ValueError:
+        return await interaction.response.send_message("Invalid user ID.", ephemeral=True)
+    if uid is not None and uid != interaction.user.id and not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to view other users' stats.", ephemeral=True)
+
+    state = await guilds.get(interaction.guild_id)
+    embed = Embed(title=f"Duty Stats · {period_name}", color=discord.Color.purple())
+    if uid is not None:
+        seconds, sessions, earned = state.history.user_stats(uid, period_value, now)
+        embed.description = f"<@{uid}>"
+        embed.add_field(name="Time on Duty", value=format_hours(seconds), inline=True)
+        embed.add_field(name="Sessions", value=sessions, inline=True)
+        embed.add_field(name="Points Earned", value=earned, inline=True)
+    else:
+        rows = state.history.top(period_value, now, max(1, min(top, 25)))
+        if not rows:
+            embed.description = "No finished duty sessions in this period."
+        for i, (row_user_id, seconds, sessions, earned) in enumerate(rows, 1):
+            embed.add_field(
+                name=f"{i}. {format_hours(seconds)}",
+                value=f"<@{row_user_id}> · {sessions} sessions · {earned} points",
+                inline=False
+            )
+
+    log_to_console("STATS_COMMAND", interaction.user, {"Guild": state.guild_id, "Period": period_value, "Queried User ID": uid})
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @tree.command(name="forceend", description="Force end a user's duty (Admin only)")
+@app_commands.guild_only()
 async def forceend(interaction: Interaction, user_id: str):
     if not is_admin(interaction):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
     
     try:
         uid = int(user_id)
-        if uid not in ACTIVE_DUTIES:
+        state = await guilds.get(interaction.guild_id)
+        if uid not in state.duties:
             return await interaction.response.send_message("User is not on duty.", ephemeral=True)
         
-        user = ACTIVE_DUTIES[uid]['user']
-        await end_duty_session(user, auto=True, reason=f"Force ended by {interaction.user}")
+        user = await duty_user(state.guild_id, uid)
+        await end_duty_session(state, user, auto=True, reason=f"Force ended by {interaction.user}")
         
-        log_to_console("FORCE_END", interaction.user, {"Target User ID": uid})
+        log_to_console("FORCE_END", interaction.user, {"Guild": state.guild_id, "Target User ID": uid})
         await interaction.response.send_message(f"Force ended duty for <@{uid}>.", ephemeral=True)
         
     except ValueError:
         await interaction.response.send_message("Invalid user ID.", ephemeral=True)
 
+# --- Bulk Operations ---
+BULK_MAX_BYTES = 2 * 1024 * 1024
+BULK_ERRORS_SHOWN = 15
+BULK_MOD_ACTIONS = [
+    app_commands.Choice(name="Add", value="add"),
+    app_commands.Choice(name="Remove", value="remove")
+]
+
+async def load_bulk_plan(interaction: Interaction, file: discord.Attachment, plan_rows):
+    """Read and validate an attachment off the event loop; replies and returns None if it is unreadable"""
+    if file.size > BULK_MAX_BYTES:
+        await interaction.followup.send(f"File is too large (max {BULK_MAX_BYTES // 1024} KiB).", ephemeral=True)
+        return None
+    data = await file.read()
+    try:
+        return await asyncio.to_thread(lambda: plan_rows(iter_rows(data, file.filename)))
+    except BulkError as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return None
+
+async def send_bulk_report(interaction: Interaction, title, plan, dry_run):
+    embed = Embed(title=f"{title} (dry run)" if dry_run else title, color=discord.Color.green() if plan.ok else discord.Color.red())
+    embed.add_field(name="Rows", value=plan.rows, inline=True)
+    embed.add_field(name="Changes", value=len(plan.changes), inline=True)
+    embed.add_field(name="Unchanged", value=plan.unchanged, inline=True)
+    embed.add_field(name="Errors", value=len(plan.errors), inline=True)
+    if plan.errors:
+        shown = "\n".join(f"Line {line}: {message}" for line, message in plan.errors[:BULK_ERRORS_SHOWN])
+        embed.description = f"Nothing was applied. Fix these rows and upload the file again:\n{shown}"[:4000]
+    elif dry_run:
+        embed.description = "The file is valid. Run the command again without dry_run to apply it."
+    else:
+        embed.description = "All changes were applied."
+
+    files = []
+    if len(plan.errors) > BULK_ERRORS_SHOWN:
+        files.append(discord.File(io.BytesIO(plan.error_report().encode()), filename="errors.csv"))
+    await interaction.followup.send(embed=embed, files=files, ephemeral=True)
+
+@tree.command(name="bulkmods", description="Add or remove moderators listed in a CSV or JSON file (Admin only)")
+@app_commands.guild_only()
+@app_commands.choices(action=BULK_MOD_ACTIONS)
+async def bulkmods(interaction: Interaction, action: app_commands.Choice[str], file: discord.Attachment, dry_run: bool = False):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    state = await guilds.get(interaction.guild_id)
+    remove = action.value == "remove"
+    current = set(state.mods)
+    plan = await load_bulk_plan(interaction, file, lambda rows: plan_mod_changes(rows, current, remove))
+    if plan is None:
+        return
+
+    if plan.ok and not dry_run and plan.changes:
+        if remove:
+            state.mods.remove_many(plan.changes)
+        else:
+            state.mods.add_many(plan.changes)
+        save_authorized_mods(state)
+
+        send_log_embed(state, "Moderators Bulk Removed" if remove else "Moderators Bulk Added", interaction.user, {
+            "Admin": f"{interaction.user} ({interaction.user.id})",
+            "File": file.filename,
+            "Moderators": len(plan.changes),
+            "Unchanged": plan.unchanged,
+            "Users": ", ".join(f"<@{uid}>" for uid in plan.changes)[:1000],
+            "Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p')
+        }, console=False)
+
+    log_to_console("BULKMODS_COMMAND", interaction.user, {
+        "Guild": state.guild_id,
+        "Action": action.value,
+        "Rows": plan.rows,
+        "Changes": len(plan.changes),
+        "Errors": len(plan.errors),
+        "Dry Run": dry_run
+    })
+    await send_bulk_report(interaction, f"Bulk {action.name} Moderators", plan, dry_run)
+
+@tree.command(name="bulkpoints", description="Add points to the users listed in a CSV or JSON file (Admin only)")
+@app_commands.guild_only()
+async def bulkpoints(interaction: Interaction, file: discord.Attachment, dry_run: bool = False, reason: str = None):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    state = await guilds.get(interaction.guild_id)
+    plan = await load_bulk_plan(interaction, file, plan_point_grants)
+    if plan is None:
+        return
+
+    total_points = sum(plan.changes.values())
+    if plan.ok and not dry_run and plan.changes:
+        add_points_many(state, {str(uid): amount for uid, amount in plan.changes.items()})
+
+        log_fields = {
+            "Admin": f"{interaction.user} ({interaction.user.id})",
+            "File": file.filename,
+            "Users": len(plan.changes),
+            "Points Added": total_points,
+            "Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p')
+        }
+        if reason:
+            log_fields["Reason"] = reason
+        send_log_embed(state, "Points Bulk Added", interaction.user, log_fields, console=False)
+
+    log_to_console("BULKPOINTS_COMMAND", interaction.user, {
+        "Guild": state.guild_id,
+        "Rows": plan.rows,
+        "Users": len(plan.changes),
+        "Points": total_points,
+        "Errors": len(plan.errors),
+        "Dry Run": dry_run
+    })
+    await send_bulk_report(interaction, "Bulk Add Points", plan, dry_run)
+
+# --- Export ---
+EXPORT_FORMAT_CHOICES = [
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="NDJSON", value="ndjson")
+]
+
+async def collect_export(state, table, fmt, limit):
+    """Gzip export of one table in memory, or None once it grows past limit bytes"""
+    chunks = iter_export(state, table, fmt)  # snapshots the table here, on the loop
+    return await asyncio.to_thread(collect_chunks, chunks, limit)
+
+@tree.command(name="export", description="Export points, and optionally moderators and active duties, as gzip files (Admin only)")
+@app_commands.guild_only()
+@app_commands.choices(format=EXPORT_FORMAT_CHOICES)
+async def export_command(interaction: Interaction, format: app_commands.Choice[str] = None, include_mods: bool = False, include_duties: bool = False):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    state = await guilds.get(interaction.guild_id)
+    fmt = format.value if format else "csv"
+    tables = ["points"] + (["mods"] if include_mods else []) + (["duties"] if include_duties else [])
+    remaining = getattr(interaction.guild, 'filesize_limit', None) or EXPORT_ATTACHMENT_LIMIT
+
+    files = []
+    for table in tables:
+        buffer = await collect_export(state, table, fmt, remaining)
+        if buffer is None:
+            message = f"The {table} export is too large to attach."
+            if EXPORT_TOKEN:
+                message += f" Download it from `/export/{state.guild_id}/{table}?format={fmt}` on the bot's web server instead."
+            log_to_console("EXPORT_TOO_LARGE", interaction.user, {"Guild": state.guild_id, "Table": table, "Limit": remaining})
+            return await interaction.followup.send(message, ephemeral=True)
+        remaining -= buffer.getbuffer().nbytes
+        files.append(discord.File(buffer, filename=export_filename(state.guild_id, table, fmt)))
+
+    log_to_console("EXPORT_COMMAND", interaction.user, {
+        "Guild": state.guild_id,
+        "Tables": ",".join(tables),
+        "Format": fmt,
+        "Users": len(state.points)
+    })
+    await interaction.followup.send(f"Exported {len(state.points)} users.", files=files, ephemeral=True)
+
+@tree.command(name="guildconfig", description="View or change this server's duty settings (Admin only)")
+@app_commands.guild_only()
+@app_commands.describe(mod_role="Members with this role may start duty without being added with /addmod")
+async def guildconfig(interaction: Interaction, admin_role: discord.Role = None, mod_role: discord.Role = None,
+                      log_channel: discord.TextChannel = None, point_minutes: app_commands.Range[int, 1, 1440] = None,
+                      max_duty_hours: app_commands.Range[float, 0.5, 72.0] = None):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+
+    changes = {}
+    if admin_role is not None:
+        changes["admin_role_id"] = admin_role.id
+    if mod_role is not None:
+        changes["mod_role_id"] = mod_role.id
+    if log_channel is not None:
+        changes["log_channel_id"] = log_channel.id
+    if point_minutes is not None:
+        changes["point_minutes"] = point_minutes
+    if max_duty_hours is not None:
+        changes["max_duty_hours"] = max_duty_hours
+
+    config = guild_configs.update(interaction.guild_id, **changes) if changes else guild_configs.get(interaction.guild_id)
+    if changes:
+        log_to_console("GUILD_CONFIG_CHANGED", interaction.user, {"Guild": interaction.guild_id, **changes})
+    state = guilds.peek(interaction.guild_id)
+    if state is not None:
+        state.mods.role_id = config.mod_role_id
+
+    embed = Embed(title="Duty Settings", color=discord.Color.dark_teal())
+    embed.add_field(name="Admin Role", value=f"<@&{config.admin_role_id}>" if config.admin_role_id else "Administrator permission", inline=False)
+    embed.add_field(name="Moderator Role", value=f"<@&{config.mod_role_id}>" if config.mod_role_id else "Listed moderators only", inline=False)
+    embed.add_field(name="Log Channel", value=f"<#{config.log_channel_id}>" if config.log_channel_id else "Not set", inline=False)
+    embed.add_field(name="Point Rules", value="\n".join(guild_point_rules(interaction.guild_id).describe()), inline=False)
+    embed.add_field(name="Maximum Duty Duration", value=f"{config.max_duty_hours:g} hours", inline=False)
+    if changes:
+        embed.set_footer(text="A new maximum applies to duties started from now on")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# --- Point Rules ---
+@tree.command(name="pointrules", description="View or change how finished shifts are scored (Admin only)")
+@app_commands.guild_only()
+@app_commands.describe(
+    hour_multipliers="UTC hour ranges by shift start, e.g. 22-6:1.5,12-14:1.2",
+    shift_cap="Most points one shift can earn; 0 removes the cap",
+    reset="Go back to the plain point rate before applying the other options"
+)
+async def pointrules(interaction: Interaction, hour_multipliers: str = None, weekend_multiplier: app_commands.Range[float, 0.0, 10.0] = None,
+                     shift_cap: app_commands.Range[int, 0, 100000] = None, auto_end_multiplier: app_commands.Range[float, 0.0, 1.0] = None,
+                     auto_end_penalty: app_commands.Range[int, 0, 10000] = None, reset: bool = False):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+
+    rules = PointRules() if reset else guild_point_rules(interaction.guild_id)
+    try:
+        if hour_multipliers is not None:
+            rules.hour_multipliers = parse_hour_multipliers(hour_multipliers)
+    except ValueError as e:
+        return await interaction.response.send_message(f"Invalid hour multipliers: {e}", ephemeral=True)
+    if weekend_multiplier is not None:
+        rules.weekend_multiplier = weekend_multiplier
+    if shift_cap is not None:
+        rules.shift_cap = shift_cap or None
+    if auto_end_multiplier is not None:
+        rules.auto_end_multiplier = auto_end_multiplier
+    if auto_end_penalty is not None:
+        rules.auto_end_penalty = auto_end_penalty
+
+    changed = reset or any(value is not None for value in (hour_multipliers, weekend_multiplier, shift_cap, auto_end_multiplier, auto_end_penalty))
+    if changed:
+        guild_configs.update(interaction.guild_id, point_rules=rules.to_dict())
+        log_to_console("POINT_RULES_CHANGED", interaction.user, {"Guild": interaction.guild_id, **rules.to_dict()})
+
+    embed = Embed(title="Point Rules", description="\n".join(guild_point_rules(interaction.guild_id).describe()), color=discord.Color.dark_teal())
+    if changed:
+        embed.set_footer(text="New rules apply to shifts ending from now on; use /recomputepoints to re-score past shifts")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@tree.command(name="recomputepoints", description="Re-score this season's shifts with the current point rules (Admin only)")
+@app_commands.guild_only()
+async def recomputepoints(interaction: Interaction, apply: bool = False):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+    state = await guilds.get(interaction.guild_id)
+    if state.points_table_lock.locked():
+        return await interaction.response.send_message("The points table is already being rewritten; try again shortly.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    async with state.points_table_lock:
+        rules = guild_point_rules(state.guild_id)
+        started = time.perf_counter()
+        data = await asyncio.to_thread(state.history.read_records)
+        # Archived seasons are frozen: only shifts that ended in (and so were credited to) this season are re-scored
+        rescore = await asyncio.to_thread(rescore_records, data, rules, state.seasons.current_started)
+        elapsed = time.perf_counter() - started
+
+        applied = apply and rescore.sessions_changed > 0
+        if applied:
+            await asyncio.to_thread(state.history.rewrite_points, rescore.indices, rescore.points)
+            state.history.adjust_points(rescore.day_deltas)
+            add_points_many(state, {str(user_id): new - old for user_id, (old, new) in rescore.user_diffs.items()})
+
+    engine = "NumPy" if VECTORISED else "Python"
+    embed = Embed(title="Points Recomputed" if applied else "Points Recompute Preview", color=discord.Color.purple())
+    embed.description = "\n".join(rules.describe())
+    embed.add_field(name="Sessions Scored", value=rescore.count, inline=True)
+    embed.add_field(name="Sessions Changed", value=rescore.sessions_changed, inline=True)
+    embed.add_field(name="Users Affected", value=len(rescore.user_diffs), inline=True)
+    embed.add_field(name="Their Session Points", value=f"{rescore.old_total} → {rescore.new_total}", inline=True)
+    biggest = sorted(rescore.user_diffs.items(), key=lambda item: abs(item[1][1] - item[1][0]), reverse=True)[:5]
+    if biggest:
+        embed.add_field(
+            name="Largest Changes",
+            value="\n".join(f"<@{user_id}> {old} → {new} ({new - old:+d})" for user_id, (old, new) in biggest),
+            inline=False
+        )
+    embed.set_footer(text=f"{engine} engine, {elapsed:.2f}s" + ("" if applied or not rescore.sessions_changed else " · run with apply to commit these changes"))
+    files = []
+    if rescore.user_diffs:
+        files.append(discord.File(io.BytesIO(rescore.report_csv().encode()), filename=f"{state.guild_id}-recompute.csv"))
+
+    log_to_console("RECOMPUTE_POINTS", interaction.user, {
+        "Guild": state.guild_id,
+        "Sessions": rescore.count,
+        "Changed": rescore.sessions_changed,
+        "Users": len(rescore.user_diffs),
+        "Applied": applied,
+        "Engine": engine,
+        "Time": f"{elapsed:.2f}s"
+    })
+    if applied:
+        send_log_embed(state, "Points Recomputed", interaction.user, {
+            "Admin": f"{interaction.user} ({interaction.user.id})",
+            "Sessions Changed": rescore.sessions_changed,
+            "Users Affected": len(rescore.user_diffs),
+            "Session Points": f"{rescore.old_total} → {rescore.new_total}",
+            "Time": datetime.now(timezone.utc).strftime('%A, %d %B %Y %H:%M %p')
+        }, console=False)
+    await interaction.followup.send(embed=embed, files=files, ephemeral=True)
+
+# --- Web Server ---
+# Runs on the bot's own event loop, so handlers can read live state directly.
+connected_shards = set()
+web_runner = None
+
+def gateway_connected():
+    return bool(connected_shards) and len(connected_shards) >= (bot.shard_count or 1)
+
+async def home(request):
+    return web.Response(text="Duty Bot is running!")
+
+async def liveness(request):
+    """The process is alive as long as the event loop keeps turning"""
+    if loop_lag.lag > LIVENESS_MAX_LOOP_LAG:
+        return web.json_response({"status": "stalled", "loop_lag": loop_lag.lag}, status=503)
+    return web.json_response({"status": "ok", "loop_lag": round(loop_lag.lag, 4)})
+
+async def readiness(request):
+    """Ready only while every shard is connected to the gateway and able to handle commands"""
+    ready = gateway_connected() and bot.is_ready() and not bot.is_closed()
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "gateway_connected": gateway_connected(),
+        "shards": {"connected": len(connected_shards), "total": bot.shard_count},
+        "latency": None if bot.latency != bot.latency else round(bot.latency, 4),  # NaN before the first heartbeat
+        "active_duties": active_duty_count(),
+        "loaded_guilds": len(guilds),
+        "role": "leader" if is_leader() else "follower"
+    }
+    return web.json_response(body, status=200 if ready else 503)
+
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+async def export_endpoint(request):
+    """Stream one table of a guild as chunked, gzip-compressed CSV or NDJSON"""
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {EXPORT_TOKEN}".encode()):
+        return web.json_response({"error": "unauthorized"}, status=401)
+    table = request.match_info["table"]
+    fmt = request.query.get("format", "csv")
+    if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        return web.json_response({"error": "unknown table or format"}, status=404)
+    try:
+        guild_id = int(request.match_info["guild_id"])
+    except ValueError:
+        return web.json_response({"error": "invalid guild id"}, status=404)
+    if bot.get_guild(guild_id) is None:
+        return web.json_response({"error": "unknown guild"}, status=404)  # don't create partitions for arbitrary ids
+
+    state = await guilds.get(guild_id)
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/gzip",
+        "Content-Disposition": f'attachment; filename="{export_filename(guild_id, table, fmt)}"'
+    })
+    chunks = iter_export(state, table, fmt)  # snapshot before the first await, so the download is consistent
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    while True:
+        # Ranking, encoding and compression work on the snapshot, so they can run off the loop
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        await response.write(chunk)
+    await response.write_eof()
+    log_to_console("EXPORT_DOWNLOADED", details={"Guild": guild_id, "Table": table, "Format": fmt, "Remote": request.remote})
+    return response
+
+async def start_web_server():
+    """Start the HTTP server once; later calls are no-ops"""
+    global web_runner
+    if web_runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/healthz', liveness)
+    app.router.add_get('/readyz', readiness)
+    app.router.add_get('/metrics', metrics_endpoint)
+    if EXPORT_TOKEN:
+        app.router.add_get('/export/{guild_id}/{table}', export_endpoint)
+    web_runner = web.AppRunner(app, access_log=None)
+    await web_runner.setup()
+    await web.TCPSite(web_runner, '0.0.0.0', WEB_PORT).start()
+    log_to_console("WEB_SERVER_STARTED", details={"Port": WEB_PORT})
+
+# --- Command Sync ---
+def command_tree_hash(guild=None):
+    """Stable hash of the registered command schema"""
+    payload = []
+    for command in tree.get_commands(guild=guild):
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:  # discord.py < 2.4
+            payload.append(command.to_dict())
+    payload.sort(key=lambda entry: (entry.get("type", 1), entry["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+def load_command_hashes():
+    try:
+        with open(COMMAND_HASH_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+async def sync_commands(force=False, guild_id=None):
+    """Sync the command tree only if its schema changed since the last sync for this scope"""
+    guild = discord.Object(id=guild_id) if guild_id else None
+    if guild is not None:
+        tree.copy_global_to(guild=guild)
+    scope = str(guild_id) if guild_id else "global"
+    schema_hash = command_tree_hash(guild)
+    hashes = load_command_hashes()
+
+    if not force and hashes.get(scope) == schema_hash:
+        log_to_console("COMMANDS_SYNC_SKIPPED", details={"Scope": scope, "Hash": schema_hash[:12]})
+        return None
+
+    synced = await tree.sync(guild=guild)
+    hashes[scope] = schema_hash
+    atomic_write_json(COMMAND_HASH_FILE, hashes)
+    log_to_console("COMMANDS_SYNCED", details={"Scope": scope, "Command Count": len(synced), "Hash": schema_hash[:12], "Forced": force})
+    return synced
+
+@tree.command(name="synccommands", description="Force a slash command sync (Admin only)")
+@app_commands.guild_only()
+async def synccommands(interaction: Interaction, this_guild_only: bool = False):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    guild_id = interaction.guild_id if this_guild_only else None
+    try:
+        synced = await sync_commands(force=True, guild_id=guild_id)
+    except Exception as e:
+        log_to_console("COMMAND_SYNC_FAILED", interaction.user, {"Error": str(e)})
+        return await interaction.followup.send(f"Sync failed: {e}", ephemeral=True)
+    await interaction.followup.send(f"Synced {len(synced)} commands {'to this guild' if guild_id else 'globally'}.", ephemeral=True)
+
 # --- Error Handling ---
 @bot.event
 async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
     """Handle application command errors"""
+    if isinstance(error, HandledByAnotherReplica):
+        return
+    command_name = interaction.command.name if interaction.command else "Unknown"
+    COMMAND_ERRORS.inc(command_name, type(error).__name__)
+    observe_command(interaction, command_name)
+    note_first_command(command_name)
     log_to_console("COMMAND_ERROR", interaction.user if hasattr(interaction, 'user') else None, {
-        "Command": interaction.command.name if interaction.command else "Unknown",
+        "Command": command_name,
         "Error": str(error),
         "Error Type": type(error).__name__
     })
@@ -606,18 +1908,66 @@ async def on_app_command_error(interaction: discord.Interaction, error: discord.
         )
 
 # --- Events ---
+guild_eviction_task = None
+mod_watch_task = None
+
 @bot.event
-async def on_ready():
-    log_to_console("BOT_READY", details={"Bot User": str(bot.user), "Guild Count": len(bot.guilds)})
-    
+async def setup_hook():
+    global guild_eviction_task, mod_watch_task
+    if REPLICATION:
+        # Followers serve reads from shared state; the lease decides who restores and runs timers
+        for guild_id in sorted(active_guilds):
+            await reload_guild(await guilds.get(guild_id))
+        start_replication()
+    else:
+        await restore_active_duties()
+        scheduler.start()
+    dm_queue.start()
+    loop_lag.start()
+    guild_eviction_task = asyncio.create_task(evict_idle_guilds())
+    mod_watch_task = asyncio.create_task(watch_mod_lists())
+    # Start the web server to keep the bot alive; setup_hook runs once, unlike on_ready
+    await start_web_server()
+
     try:
-        synced = await tree.sync()
-        log_to_console("COMMANDS_SYNCED", details={"Command Count": len(synced)})
+        await sync_commands(force=FORCE_COMMAND_SYNC, guild_id=SYNC_GUILD_ID)
     except Exception as e:
         log_to_console("COMMAND_SYNC_FAILED", details={"Error": str(e)})
-    
-    # Start the web server to keep the bot alive
-    keep_alive()
+
+@bot.event
+async def on_shard_connect(shard_id):
+    connected_shards.add(shard_id)
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    connected_shards.add(shard_id)
+
+@bot.event
+async def on_shard_disconnect(shard_id):
+    connected_shards.discard(shard_id)
+
+first_command_handled = False
+
+def note_first_command(command_name):
+    global first_command_handled
+    if not first_command_handled:
+        first_command_handled = True
+        log_to_console("FIRST_COMMAND_HANDLED", details={"Command": command_name, "Since Start": f"{time.perf_counter() - PROCESS_STARTED:.2f}s"})
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(interaction, command.name)
+    note_first_command(command.name)
+
+@bot.event
+async def on_ready():
+    # Commands are synced once from setup_hook, so reconnects don't hit the sync endpoint
+    log_to_console("BOT_READY", details={
+        "Bot User": str(bot.user),
+        "Guild Count": len(bot.guilds),
+        "Shard Count": bot.shard_count,
+        "Since Start": f"{time.perf_counter() - PROCESS_STARTED:.2f}s"
+    })
 
 # --- Main ---
 if __name__ == "__main__":
@@ -626,10 +1976,26 @@ if __name__ == "__main__":
     if not TOKEN:
         print("ERROR: DISCORD_TOKEN environment variable not set")
         exit(1)
+    legacy_files = legacy_data_files() if HOME_GUILD_ID is None else []
+    if legacy_files:
+        # Without a home guild every guild gets its own directory and this data would be silently ignored
+        print(f"ERROR: found single-guild data ({', '.join(legacy_files)}) but DUTY_HOME_GUILD_ID is not set; "
+              "set it to the id of the server this data belongs to")
+        exit(1)
     
     try:
         bot.run(TOKEN)
     except discord.LoginFailure:
         print("ERROR: Invalid bot token")
     except Exception as e:
-        print(f"ERROR: Failed to start bot: {e}")
\ No newline at end of file
+        print(f"ERROR: Failed to start bot: {e}")
+    finally:
+        # Flush outstanding writes before exiting
+        if leader_lease is not None:
+            leader_lease.close()  # hand the lease over now instead of after LEASE_TTL
+        for state in guilds:
+            state.log_dispatcher.spill_pending()
+            close_guild(state)
+        if active_guilds_unsaved:
+            atomic_write_json(ACTIVE_GUILDS_FILE, sorted(active_guilds))
+        event_log.close()
@@ -0,0 +1,147 @@
+from bisect import bisect_right, insort
+
+HOUR = 3600
+MINUTE = 60
+DUTY_SORTS = ("longest", "newest", "stale", "recent")
+MAX_CACHED_PAGES = 64
+
+
+class ActiveDuties:
+    """A guild's active duties (user id -> DutyRecord) with ordered indexes.
+
+    Behaves like the plain dict it replaces, and additionally keeps the
+    duties sorted by start time and by last continue, so filtered and sorted
+    pages of /viewduties are bisected out of the indexes instead of scanned.
+    Every change bumps `version` and drops `pages`, the rendered-page cache
+    kept here on behalf of the caller. Call touch() after changing a duty's
+    last_continue.
+    """
+
+    def __init__(self):
+        self._duties = {}
+        self._by_start = []  # sorted (start, user_id)
+        self._by_continue = []  # sorted (last_continue, user_id)
+        self._continue_keys = {}  # user_id -> its key in _by_continue
+        self.version = 0
+        self.pages = {}
+
+    def __len__(self):
+        return len(self._duties)
+
+    def __iter__(self):
+        return iter(self._duties)
+
+    def __contains__(self, user_id):
+        return user_id in self._duties
+
+    def __getitem__(self, user_id):
+        return self._duties[user_id]
+
+    def get(self, user_id, default=None):
+        return self._duties.get(user_id, default)
+
+    def keys(self):
+        return self._duties.keys()
+
+    def values(self):
+        return self._duties.values()
+
+    def items(self):
+        return self._duties.items()
+
+    # --- Mutation ---
+    def __setitem__(self, user_id, duty):
+        if user_id in self._duties:
+            self._unindex(self._duties[user_id])
+        self._duties[user_id] = duty
+        insort(self._by_start, (duty.start, user_id))
+        key = self._continue_keys[user_id] = (duty.last_continue, user_id)
+        insort(self._by_continue, key)
+        self._changed()
+
+    def __delitem__(self, user_id):
+        self._unindex(self._duties.pop(user_id))
+        self._changed()
+
+    def pop(self, user_id):
+        duty = self._duties[user_id]
+        del self[user_id]
+        return duty
+
+    def clear(self):
+        self._duties.clear()
+        self._by_start.clear()
+        self._by_continue.clear()
+        self._continue_keys.clear()
+        self._changed()
+
+    def touch(self, user_id):
+        """Re-index a duty whose last_continue changed"""
+        duty = self._duties[user_id]
+        old = self._continue_keys[user_id]
+        if old[0] == duty.last_continue:
+            return
+        _remove(self._by_continue, old)
+        key = self._continue_keys[user_id] = (duty.last_continue, user_id)
+        insort(self._by_continue, key)
+        self._changed()
+
+    def _unindex(self, duty):
+        _remove(self._by_start, (duty.start, duty.user_id))
+        _remove(self._by_continue, self._continue_keys.pop(duty.user_id))
+
+    def _changed(self):
+        self.version += 1
+        self.pages.clear()
+
+    # --- Queries ---
+    def select(self, now, sort="longest", min_hours=None, idle_minutes=None, offset=0, limit=None):
+        """(number of matching duties, matching duties offset..offset+limit) in the given order.
+
+        Duties match if on duty for over min_hours and/or not continued for
+        over idle_minutes. longest/newest order by start time, stale/recent
+        by last continue. The filter on the sort's own index is a bisect, so
+        without the other filter only the requested rows are touched; the
+        other filter is checked per row while walking the bisected range.
+        """
+        start_cutoff = now - min_hours * HOUR if min_hours is not None else None
+        continue_cutoff = now - idle_minutes * MINUTE if idle_minutes is not None else None
+        if sort in ("longest", "newest"):
+            keys, cutoff, other = self._by_start, start_cutoff, continue_cutoff
+            check = lambda duty: duty.last_continue < other
+        elif sort in ("stale", "recent"):
+            keys, cutoff, other = self._by_continue, continue_cutoff, start_cutoff
+            check = lambda duty: duty.start < other
+        else:
+            raise ValueError(f"unknown sort {sort!r}")
+
+        end = len(keys) if cutoff is None else bisect_right(keys, (cutoff, -1))
+        descending = sort in ("newest", "recent")
+        stop = end if limit is None else offset + limit
+        duties = self._duties
+        if other is None:
+            positions = range(offset, min(stop, end))
+            if descending:
+                positions = (end - 1 - position for position in positions)
+            return end, [duties[keys[position][1]] for position in positions]
+
+        total = 0
+        rows = []
+        for position in (range(end - 1, -1, -1) if descending else range(end)):
+            duty = duties[keys[position][1]]
+            if check(duty):
+                if offset <= total < stop:
+                    rows.append(duty)
+                total += 1
+        return total, rows
+
+    def cache_page(self, key, page):
+        if len(self.pages) >= MAX_CACHED_PAGES:
+            self.pages.clear()
+        self.pages[key] = page
+
+
+def _remove(keys, key):
+    position = bisect_right(keys, key) - 1
+    if position >= 0 and keys[position] == key:
+        del keys[position]
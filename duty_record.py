@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timezone
+
+
+class DutyRecord:
+    """State of one active duty.
+
+    Holds only the user id and epoch-second timestamps (no Member object),
+    so a record is a few dozen bytes and doesn't pin guild or member caches.
+    The user is resolved when a DM or log embed actually needs it.
+    last_seen (epoch seconds of the user's latest guild message) is kept in
+    memory only and is not part of the checkpoint.
+    """
+
+    __slots__ = ("user_id", "start", "last_continue", "continues", "reminder_seq", "awaiting_seq", "last_seen")
+
+    def __init__(self, user_id, start=None, last_continue=None, continues=0, reminder_seq=0, awaiting_seq=0):
+        self.user_id = user_id
+        self.start = time.time() if start is None else start
+        self.last_continue = self.start if last_continue is None else last_continue
+        self.continues = continues
+        self.reminder_seq = reminder_seq
+        self.awaiting_seq = awaiting_seq
+        self.last_seen = 0.0
+
+    @property
+    def start_time(self):
+        return datetime.fromtimestamp(self.start, timezone.utc)
+
+    @property
+    def last_continue_time(self):
+        return datetime.fromtimestamp(self.last_continue, timezone.utc)
+
+    def elapsed(self, now=None):
+        """Seconds on duty so far"""
+        return (time.time() if now is None else now) - self.start
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "start": self.start,
+            "last_continue": self.last_continue,
+            "continues": self.continues,
+            "reminder_seq": self.reminder_seq,
+            "awaiting_seq": self.awaiting_seq,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            int(data["user_id"]),
+            data["start"],
+            data["last_continue"],
+            data["continues"],
+            data.get("reminder_seq", 0),
+            data.get("awaiting_seq", 0),
+        )
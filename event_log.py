@@ -0,0 +1,115 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+logger = logging.getLogger("duty_bot")
+
+
+def level_for(event_type):
+    if event_type == "COMMAND_ERROR" or event_type.endswith("_ERROR"):
+        return logging.ERROR
+    if event_type.endswith("_FAILED") or event_type.endswith("_INVALID"):
+        return logging.WARNING
+    return logging.INFO
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line; runs on the listener thread, not the caller's"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            "level": record.levelname,
+            "event": record.msg,
+        }
+        if record.user_id is not None:
+            entry["user"] = record.user_name
+            entry["user_id"] = record.user_id
+        if record.details:
+            entry["details"] = {str(key): _jsonable(value) for key, value in record.details.items()}
+        if record.sample_rate < 1:
+            entry["sample_rate"] = record.sample_rate
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _jsonable(value):
+    return value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+
+
+def _user_name(user):
+    # A user that couldn't be looked up is a bare discord.Object with no name
+    return str(user) if getattr(user, "name", None) is not None else f"<@{user.id}>"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that hands raw records to the listener and counts drops when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record  # formatting happens on the listener thread
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventLog:
+    """Queue-backed structured event logger.
+
+    log() only samples, builds a LogRecord and enqueues it; a QueueListener
+    thread formats JSON lines and writes them to a size-rotated file and
+    optionally stdout, so slow output never stalls the event loop.
+    """
+
+    def __init__(self, path=None, level=logging.INFO, stdout=True, max_bytes=10 * 1024 * 1024,
+                 backup_count=5, sample_rates=None, max_queue=10000):
+        self.sample_rates = sample_rates or {}
+        self.level = level
+        formatter = JsonLineFormatter()
+        handlers = []
+        if path:
+            file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            handlers.append(file_handler)
+        if stdout:
+            handlers.append(logging.StreamHandler(sys.stdout))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=max_queue))
+        self.listener = logging.handlers.QueueListener(self.handler.queue, *handlers, respect_handler_level=False)
+        logger.handlers[:] = [self.handler]
+        logger.setLevel(level)
+        logger.propagate = False
+        self.listener.start()
+
+    def log(self, event_type, user=None, details=None, level=None):
+        level = level or level_for(event_type)
+        if level < self.level:
+            return
+        rate = self.sample_rates.get(event_type, 1.0)
+        if rate < 1 and random.random() >= rate:
+            return
+        record = logger.makeRecord(logger.name, level, "", 0, event_type, None, None, extra={
+            "user_name": _user_name(user) if user is not None else None,
+            "user_id": user.id if user is not None else None,
+            "details": details,
+            "sample_rate": rate,
+        })
+        self.handler.enqueue(record)
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def close(self):
+        """Drain the queue and stop the listener thread"""
+        self.listener.stop()
@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+import zlib
+
+EXPORT_TABLES = ("points", "mods", "duties")
+EXPORT_FORMATS = ("csv", "ndjson")
+COLUMNS = {
+    "points": ("rank", "user_id", "points"),
+    "mods": ("user_id",),
+    "duties": ("user_id", "start", "last_continue", "continues"),
+}
+CHUNK_ROWS = 1000
+
+
+def iter_table(state, table, chunk_rows=CHUNK_ROWS):
+    """Chunks of a guild's rows as lists of tuples matching COLUMNS[table].
+
+    The table is copied when this is called, on the event loop, and the
+    chunks are produced from that copy. An export is therefore one
+    consistent snapshot however many awaits it spans, and the chunks may be
+    consumed in a worker thread. Points are ranked like the leaderboard
+    (points descending, ties by user id) while the chunks are consumed.
+    """
+    if table == "points":
+        return _ranked_chunks(dict(state.points), chunk_rows)
+    if table == "mods":
+        rows = [(user_id,) for user_id in state.mods]
+    elif table == "duties":
+        rows = [
+            (duty.user_id, duty.start_time.isoformat(), duty.last_continue_time.isoformat(), duty.continues)
+            for duty in state.duties.values()
+        ]
+    else:
+        raise ValueError(f"unknown export table {table!r}")
+    return (rows[start:start + chunk_rows] for start in range(0, len(rows), chunk_rows))
+
+
+def _ranked_chunks(points, chunk_rows):
+    keys = sorted((-value, int(user_id)) for user_id, value in points.items())
+    for start in range(0, len(keys), chunk_rows):
+        yield [(rank, user_id, -negated) for rank, (negated, user_id) in enumerate(keys[start:start + chunk_rows], start + 1)]
+
+
+def encode_chunks(chunks, columns, fmt):
+    """Serialise row chunks to CSV (with a header) or NDJSON bytes, one bytes object per chunk"""
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+        if out.tell():
+            yield out.getvalue().encode()  # header of an empty table
+    elif fmt == "ndjson":
+        for rows in chunks:
+            yield "".join(json.dumps(dict(zip(columns, row)), separators=(',', ':')) + "\n" for row in rows).encode()
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of bytes into a single gzip member, chunk by chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(state, table, fmt):
+    """Gzip-compressed bytes of one table snapshotted now, produced lazily"""
+    return gzip_chunks(encode_chunks(iter_table(state, table), COLUMNS[table], fmt))
+
+
+def collect_chunks(chunks, limit):
+    """Gather a byte stream into a BytesIO, or None once it grows past limit bytes"""
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+        if buffer.tell() > limit:
+            return None
+    buffer.seek(0)
+    return buffer
+
+
+def export_filename(guild_id, table, fmt):
+    return f"{guild_id}-{table}.{fmt}.gz"
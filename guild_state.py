@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from duty_index import ActiveDuties
+from journal import atomic_write_json
+from mod_index import ModIndex
+
+
+class GuildConfig:
+    """Per-guild settings. A guild without an admin role falls back to the Administrator permission;
+    without a moderator role only listed moderators may go on duty."""
+
+    __slots__ = ("admin_role_id", "mod_role_id", "log_channel_id", "point_minutes", "max_duty_hours", "point_rules")
+
+    def __init__(self, admin_role_id=None, mod_role_id=None, log_channel_id=None, point_minutes=4, max_duty_hours=12, point_rules=None):
+        self.admin_role_id = admin_role_id
+        self.mod_role_id = mod_role_id  # members with this role may go on duty without being listed
+        self.log_channel_id = log_channel_id
+        self.point_minutes = point_minutes  # minutes on duty per point
+        self.max_duty_hours = max_duty_hours
+        self.point_rules = point_rules  # PointRules.to_dict() of the guild's multipliers, cap and penalties
+
+    @property
+    def max_duty_duration(self):
+        return timedelta(hours=self.max_duty_hours)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class GuildConfigStore:
+    """guild_config.json holds only the fields each guild has overridden.
+
+    Everything else comes from `defaults`, plus `home_defaults` for the guild
+    the bot was originally built for, whose role and channel ids used to be
+    hard-coded.
+    """
+
+    def __init__(self, path, defaults=None, home_guild_id=None, home_defaults=None):
+        self.path = path
+        self.defaults = defaults or {}
+        self.home_guild_id = home_guild_id
+        self.home_defaults = home_defaults or {}
+        self._overrides = {}  # guild_id -> {field: value}
+        self._configs = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self._overrides = {int(guild_id): fields for guild_id, fields in json.load(f).items()}
+        except FileNotFoundError:
+            self._overrides = {}
+        self._configs.clear()
+        return len(self._overrides)
+
+    def get(self, guild_id):
+        config = self._configs.get(guild_id)
+        if config is None:
+            fields = dict(self.defaults)
+            if guild_id == self.home_guild_id:
+                fields.update(self.home_defaults)
+            fields.update(self._overrides.get(guild_id, {}))
+            config = self._configs[guild_id] = GuildConfig(**{k: v for k, v in fields.items() if k in GuildConfig.__slots__})
+        return config
+
+    def update(self, guild_id, **changes):
+        self.load()  # another replica may have written the file since we last read it
+        self._overrides.setdefault(guild_id, {}).update(changes)
+        self._configs.pop(guild_id, None)
+        atomic_write_json(self.path, {str(guild_id): fields for guild_id, fields in self._overrides.items()})
+        return self.get(guild_id)
+
+
+class GuildState:
+    """One guild's partition of the bot's state: storage, points, moderators, active duties, history and past seasons"""
+
+    def __init__(self, guild_id, directory, storage):
+        self.guild_id = guild_id
+        self.directory = directory
+        self.storage = storage
+        self.points = {}
+        self.leaderboard = None
+        self.mods = ModIndex()
+        self.duties = ActiveDuties()  # user id -> DutyRecord, indexed by start and last continue
+        self.history = None
+        self.seasons = None
+        self.points_table_lock = asyncio.Lock()  # season rollovers and recomputes rewrite the whole points table
+        self.log_dispatcher = None
+        self.last_used = time.monotonic()
+
+
+class GuildRegistry:
+    """GuildState per guild id, loaded on first use.
+
+    Loading runs `load(guild_id)` in a worker thread so a big partition
+    never stalls the event loop, and concurrent requests for the same guild
+    share one load. `on_loaded(state)` then runs on the loop. A guild being
+    unloaded is reloaded only after its old state has been closed, so the
+    two never touch the partition's files at the same time.
+    """
+
+    def __init__(self, load, on_loaded=None):
+        self._load = load
+        self._on_loaded = on_loaded
+        self._states = {}
+        self._loading = {}
+        self._closing = {}  # guild_id -> task closing its unloaded state
+
+    def __len__(self):
+        return len(self._states)
+
+    def __iter__(self):
+        return iter(list(self._states.values()))
+
+    def peek(self, guild_id):
+        """The state if it is already loaded, else None; never loads"""
+        return self._states.get(guild_id)
+
+    async def get(self, guild_id):
+        state = self._states.get(guild_id)
+        if state is None and guild_id in self._closing:
+            await asyncio.wait([self._closing[guild_id]])  # the closer reports its own errors
+            state = self._states.get(guild_id)
+        if state is None:
+            task = self._loading.get(guild_id)
+            if task is None:
+                task = self._loading[guild_id] = asyncio.ensure_future(self._load_state(guild_id))
+            state = await asyncio.shield(task)
+        state.last_used = time.monotonic()
+        return state
+
+    async def _load_state(self, guild_id):
+        try:
+            state = await asyncio.to_thread(self._load, guild_id)
+            if self._on_loaded is not None:
+                self._on_loaded(state)
+            self._states[guild_id] = state
+            return state
+        finally:
+            self._loading.pop(guild_id, None)
+
+    def idle(self, max_idle):
+        cutoff = time.monotonic() - max_idle
+        return [state for state in self._states.values() if state.last_used < cutoff]
+
+    async def unload(self, state, close):
+        """Drop a loaded state and run close(state) in a worker thread; get() for the guild waits for it"""
+        guild_id = state.guild_id
+        self._states.pop(guild_id, None)
+        task = self._closing[guild_id] = asyncio.ensure_future(asyncio.to_thread(close, state))
+        task.add_done_callback(lambda _: self._closing.pop(guild_id, None))
+        await asyncio.shield(task)
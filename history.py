@@ -0,0 +1,215 @@
+import heapq
+import os
+import struct
+import tempfile
+import threading
+
+# user_id, start, end (epoch seconds), continues, points, auto-ended
+RECORD = struct.Struct("<QddHiB")
+DAY = 86400
+
+
+def day_of(timestamp):
+    return int(timestamp // DAY)
+
+
+def week_of(timestamp):
+    # Epoch day 0 was a Thursday; shifting by 3 makes weeks start on Monday
+    return (day_of(timestamp) + 3) // 7
+
+
+class SessionHistory:
+    """Append-only store of finished duty sessions with per-user rollups; the bot's only record of past sessions.
+
+    Sessions are packed into fixed-size binary records (31 bytes each) and
+    written by a background thread. Daily, weekly and all-time totals per
+    user are rebuilt with one sequential scan at startup and then updated on
+    every append, so per-user/per-period lookups are dict hits. Sessions are
+    attributed to the day and week they started in. A failed write keeps its
+    records pending, cuts the file back to where they started and is retried
+    next second; errors go to on_error.
+    """
+
+    def __init__(self, path, keep_days=400, on_error=None):
+        self.path = path
+        self.keep_days = keep_days
+        self.on_error = on_error
+        self.daily = {}  # day -> {user_id: [seconds, sessions, points]}
+        self.weekly = {}  # week -> {user_id: [seconds, sessions, points]}
+        self.totals = {}  # user_id -> [seconds, sessions, points]
+        self.count = 0
+        self._top_cache = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()  # serialises appends to the file with rewrites of it
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    # --- Loading ---
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        usable = len(data) - len(data) % RECORD.size  # ignore a torn final record
+        for record in RECORD.iter_unpack(memoryview(data)[:usable]):
+            self._roll_up(*record)
+        self._prune()
+        self._thread = threading.Thread(target=self._run, name="session-history", daemon=True)
+        self._thread.start()
+        return self.count
+
+    # --- Writing ---
+    def append(self, user_id, start, end, continues, points, auto):
+        record = (int(user_id), start, end, min(continues, 0xFFFF), points, 1 if auto else 0)
+        with self._lock:
+            self._pending.append(RECORD.pack(*record))
+        self._wake.set()
+        self._roll_up(*record)
+        if len(self.daily) > self.keep_days + 7:
+            self._prune()
+
+    def _roll_up(self, user_id, start, end, continues, points, auto):
+        seconds = max(0.0, end - start)
+        for buckets, key in ((self.daily, day_of(start)), (self.weekly, week_of(start))):
+            row = buckets.setdefault(key, {}).setdefault(user_id, [0.0, 0, 0])
+            row[0] += seconds
+            row[1] += 1
+            row[2] += points
+        row = self.totals.setdefault(user_id, [0.0, 0, 0])
+        row[0] += seconds
+        row[1] += 1
+        row[2] += points
+        self.count += 1
+        self._top_cache.clear()
+
+    def _prune(self):
+        if not self.daily:
+            return
+        cutoff = max(self.daily) - self.keep_days
+        for day in [day for day in self.daily if day < cutoff]:
+            del self.daily[day]
+        week_cutoff = (cutoff + 3) // 7
+        for week in [week for week in self.weekly if week < week_cutoff]:
+            del self.weekly[week]
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(1.0)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # The records are still pending; keep the thread alive and retry next round
+                if self.on_error is not None:
+                    self.on_error(e)
+
+    def flush(self):
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except BaseException:
+                    with self._lock:
+                        self._pending = batch + self._pending
+                    raise
+
+    def _write_batch(self, batch):
+        with open(self.path, 'ab') as f:
+            start = f.tell()
+            try:
+                f.write(b"".join(batch))
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                # Drop any partial record, so the retry lands on a record boundary and writes nothing twice
+                try:
+                    f.truncate(start)
+                except OSError:
+                    pass
+                raise
+
+    # --- Re-scoring ---
+    def read_records(self):
+        """Every record written so far as packed bytes (flushes pending appends first)"""
+        self.flush()
+        with self._io_lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return b""
+        return data[:len(data) - len(data) % RECORD.size]
+
+    def rewrite_points(self, indices, points):
+        """Replace the points of the records at the given positions; the file is swapped atomically.
+
+        Records appended after the positions were computed are untouched.
+        Call from a worker thread; the rollups are patched separately with
+        adjust_points on the event loop.
+        """
+        self.flush()
+        with self._io_lock:
+            with open(self.path, 'rb') as f:
+                data = bytearray(f.read())
+            offset = RECORD.size - 5  # points field: "<i" before the trailing auto byte
+            for index, value in zip(indices, points):
+                struct.pack_into("<i", data, index * RECORD.size + offset, value)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def adjust_points(self, day_deltas):
+        """Apply {(day, user_id): points delta} to the daily, weekly and all-time rollups"""
+        for (day, user_id), delta in day_deltas.items():
+            buckets = ((self.daily, day), (self.weekly, (day + 3) // 7))
+            for rollup, key in buckets:
+                row = rollup.get(key, {}).get(user_id)
+                if row is not None:
+                    row[2] += delta
+            row = self.totals.get(user_id)
+            if row is not None:
+                row[2] += delta
+        self._top_cache.clear()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    # --- Queries ---
+    def _buckets(self, period, timestamp):
+        if period == "day":
+            return self.daily.get(day_of(timestamp), {})
+        if period == "week":
+            return self.weekly.get(week_of(timestamp), {})
+        return self.totals
+
+    def user_stats(self, user_id, period, timestamp):
+        """(seconds, sessions, points) for a user in the period containing timestamp"""
+        seconds, sessions, points = self._buckets(period, timestamp).get(int(user_id), (0.0, 0, 0))
+        return seconds, sessions, points
+
+    def top(self, period, timestamp, limit=10):
+        """[(user_id, seconds, sessions, points)] ordered by time on duty"""
+        key = (period, day_of(timestamp) if period == "day" else week_of(timestamp) if period == "week" else None, limit)
+        cached = self._top_cache.get(key)
+        if cached is None:
+            rows = heapq.nlargest(limit, self._buckets(period, timestamp).items(), key=lambda item: item[1][0])
+            cached = self._top_cache[key] = [(user_id, *row) for user_id, row in rows]
+        return cached
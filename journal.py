@@ -0,0 +1,249 @@
+import json
+import os
+import tempfile
+import threading
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file, fsync it and rename it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class WriteBehindJournal:
+    """Snapshot file plus an append-only journal flushed by a background thread.
+
+    Callers append small ops from the event loop; the writer thread batches
+    them into one write + fsync per flush and periodically compacts the
+    journal into a new snapshot. Every op carries a sequence number and the
+    snapshot records the last one it contains, so replay after a crash
+    between the snapshot rename and the journal truncate never double-applies.
+    A failed flush keeps its batch pending, cuts the journal back to where
+    the batch started and is retried next interval; errors go to on_error.
+    """
+
+    def __init__(self, path, flush_interval=0.5, batch_size=512, compact_every=20000, on_error=None):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.compact_every = compact_every
+        self.on_error = on_error
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._seq = 0
+        self._state = None  # writer-thread mirror of the live state
+        self._journal_entries = 0
+        self._closed = False
+        self._thread = None
+
+    # --- Subclass hooks ---
+    def empty_state(self):
+        raise NotImplementedError
+
+    def apply(self, state, op):
+        raise NotImplementedError
+
+    def decode_snapshot(self, data):
+        return data
+
+    def encode_snapshot(self, state):
+        return state
+
+    # --- Loading ---
+    def load(self):
+        """Replay snapshot + journal and start the writer thread; returns a fresh copy of the state"""
+        state = self.empty_state()
+        snapshot_seq = 0
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and "seq" in data and "data" in data:
+                snapshot_seq = data["seq"]
+                state = self.decode_snapshot(data["data"])
+            else:
+                # Files written before the journal existed are a bare snapshot
+                state = self.decode_snapshot(data)
+        except FileNotFoundError:
+            pass
+
+        self._seq = snapshot_seq
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        break  # torn final write from a crash; everything before it is intact
+                    self._journal_entries += 1
+                    if op["s"] <= snapshot_seq:
+                        continue
+                    self.apply(state, op)
+                    self._seq = op["s"]
+        except FileNotFoundError:
+            pass
+
+        self._state = state
+        self.start()
+        return self.copy_state(state)
+
+    def copy_state(self, state):
+        return json.loads(json.dumps(state))
+
+    # --- Writing ---
+    def append(self, op):
+        """Queue an op for the writer thread; never blocks on disk"""
+        with self._lock:
+            self._seq += 1
+            op["s"] = self._seq
+            self._pending.append(op)
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"journal:{os.path.basename(self.path)}", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # The batch is still pending; keep the thread alive and retry next interval
+                if self.on_error is not None:
+                    self.on_error(e)
+
+    def flush(self):
+        """Write and fsync all pending ops, compacting if the journal has grown too long"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            try:
+                self._write_batch(batch)
+            except BaseException:
+                with self._lock:
+                    self._pending = batch + self._pending
+                raise
+            for op in batch:
+                self.apply(self._state, op)
+            self._journal_entries += len(batch)
+        if self._journal_entries >= self.compact_every:
+            self.compact()
+
+    def _write_batch(self, batch):
+        with open(self.journal_path, 'a') as f:
+            start = f.tell()
+            try:
+                f.write("".join(json.dumps(op, separators=(',', ':')) + "\n" for op in batch))
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                # Drop whatever part of the batch reached the file, so the retry can't apply it twice
+                try:
+                    f.truncate(start)
+                except OSError:
+                    pass
+                raise
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot"""
+        seq = self._state_seq()
+        atomic_write_json(self.path, {"seq": seq, "data": self.encode_snapshot(self._state)})
+        with open(self.journal_path, 'w') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries = 0
+
+    def _state_seq(self):
+        # The mirror only contains ops that have been flushed; anything still
+        # pending has a higher seq and will land in the new journal.
+        with self._lock:
+            return self._seq - len(self._pending)
+
+    def close(self):
+        """Stop the writer thread after a final flush and compaction"""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._state is not None:
+            self.flush()
+            self.compact()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+
+class PointsJournal(WriteBehindJournal):
+    """Journal of per-user point deltas over a {user_id: points} snapshot"""
+
+    def empty_state(self):
+        return {}
+
+    def copy_state(self, state):
+        return dict(state)
+
+    def apply(self, state, op):
+        if "r" in op:
+            state.clear()
+        elif "b" in op:
+            for user_id, delta in op["b"].items():
+                state[user_id] = state.get(user_id, 0) + delta
+        else:
+            state[op["u"]] = state.get(op["u"], 0) + op["d"]
+
+    def add(self, user_id, delta):
+        self.append({"u": user_id, "d": delta})
+
+    def add_many(self, deltas):
+        """One journal record for a whole batch, so it is applied all-or-nothing on replay"""
+        self.append({"b": dict(deltas)})
+
+    def reset(self):
+        self.append({"r": 1})
+
+
+class DutyJournal(WriteBehindJournal):
+    """Journal of active duty records over a {user_id: record} snapshot"""
+
+    def __init__(self, path, **kwargs):
+        kwargs.setdefault("compact_every", 5000)
+        super().__init__(path, **kwargs)
+
+    def empty_state(self):
+        return {}
+
+    def copy_state(self, state):
+        return dict(state)
+
+    def apply(self, state, op):
+        if "x" in op:
+            state.pop(op["u"], None)
+        else:
+            state[op["u"]] = op["v"]
+
+    def put(self, user_id, record):
+        self.append({"u": str(user_id), "v": record})
+
+    def delete(self, user_id):
+        self.append({"u": str(user_id), "x": 1})
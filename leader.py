@@ -0,0 +1,180 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LEASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    term INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS interaction_claims (
+    interaction_id INTEGER PRIMARY KEY,
+    holder TEXT NOT NULL,
+    claimed_at REAL NOT NULL
+);
+"""
+
+CLAIM_RETENTION = 900  # seconds; interactions can't be answered after 15 minutes anyway
+
+
+def default_replica_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def connect_leases(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(LEASE_SCHEMA)
+    return conn
+
+
+def try_acquire(conn, name, holder, ttl, now):
+    """One election round: renew our lease or take an expired one. Returns (holding, term)"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT holder, term, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            term = 1
+            conn.execute("INSERT INTO leases (name, holder, term, expires_at) VALUES (?, ?, ?, ?)", (name, holder, term, now + ttl))
+        elif row[0] == holder or row[2] <= now:
+            term = row[1] if row[0] == holder else row[1] + 1
+            conn.execute("UPDATE leases SET holder = ?, term = ?, expires_at = ? WHERE name = ?", (holder, term, now + ttl, name))
+        else:
+            conn.execute("COMMIT")
+            return False, row[1]
+        conn.execute("COMMIT")
+        return True, term
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class LeaderLease:
+    """Lease-based leader election over a shared SQLite file.
+
+    Every replica runs one election round per renew_interval: the holder
+    extends its lease, the others take it over once it has expired, so a
+    crashed leader is replaced within ttl + renew_interval seconds. The
+    holder considers itself leader only until its last successful renewal
+    plus ttl minus a safety margin, so it steps down on its own before any
+    other replica can win. on_acquire/on_release run in their own task, one
+    after another, so a slow promotion never holds up renewing the lease.
+    Interaction claims in the same database let exactly one replica answer
+    each interaction.
+    """
+
+    def __init__(self, path, holder=None, name="duty-leader", ttl=10.0, renew_interval=3.0,
+                 on_acquire=None, on_release=None, on_event=None):
+        self.path = path
+        self.holder = holder or default_replica_id()
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self.on_event = on_event
+        self.term = 0
+        self.transitions = 0
+        self._leader = False
+        self._valid_until = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LeaderLease")
+        self._conn = self._executor.submit(connect_leases, path).result()
+        self._task = None
+        self._callback_task = None
+
+    @property
+    def is_leader(self):
+        return self._leader and time.monotonic() < self._valid_until
+
+    # --- Election ---
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._round()
+            await asyncio.sleep(self.renew_interval)
+
+    async def _round(self):
+        started = time.monotonic()
+        try:
+            holding, term = await asyncio.wrap_future(
+                self._executor.submit(try_acquire, self._conn, self.name, self.holder, self.ttl, time.time())
+            )
+        except sqlite3.Error as e:
+            holding, term = self._leader and time.monotonic() < self._valid_until, self.term
+            self._emit("LEASE_ROUND_FAILED", {"Error": str(e), "Leader": holding})
+        else:
+            if holding:
+                # Margin covers clock skew between replicas and the time this round took
+                self._valid_until = started + self.ttl - max(1.0, self.ttl * 0.2)
+                if self._leader:
+                    self._executor.submit(self._prune_claims)
+        self._set_leader(holding, term)
+
+    def _set_leader(self, holding, term):
+        self.term = term
+        if holding == self._leader:
+            return
+        self._leader = holding
+        self.transitions += 1
+        self._emit("LEADER_ACQUIRED" if holding else "LEADER_LOST", {"Holder": self.holder, "Term": term})
+        callback = self.on_acquire if holding else self.on_release
+        if callback is not None:
+            self._callback_task = asyncio.create_task(self._run_callback(callback, holding, self._callback_task))
+
+    async def _run_callback(self, callback, holding, previous):
+        # Transitions are handled in order: a release waits for the promotion it undoes
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await callback()
+        except Exception as e:
+            self._emit("LEADER_CALLBACK_ERROR", {"Error": str(e), "Leader": holding})
+
+    def _emit(self, event_type, details):
+        if self.on_event is not None:
+            self.on_event(event_type, details)
+
+    # --- Interaction claims ---
+    async def claim(self, interaction_id):
+        """True if this replica is the first to claim the interaction"""
+        return await asyncio.wrap_future(self._executor.submit(self._claim, int(interaction_id)))
+
+    def _claim(self, interaction_id):
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO interaction_claims (interaction_id, holder, claimed_at) VALUES (?, ?, ?)",
+            (interaction_id, self.holder, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def _prune_claims(self):
+        try:
+            self._conn.execute("DELETE FROM interaction_claims WHERE claimed_at < ?", (time.time() - CLAIM_RETENTION,))
+        except sqlite3.Error:
+            pass  # retried on the next renewal
+
+    # --- Shutdown ---
+    def _release(self):
+        self._conn.execute("UPDATE leases SET expires_at = 0 WHERE name = ? AND holder = ?", (self.name, self.holder))
+
+    def close(self):
+        """Stop electing and hand the lease over immediately if we hold it"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._callback_task is not None:
+            self._callback_task.cancel()
+            self._callback_task = None
+        if self._leader:
+            self._leader = False
+            self._executor.submit(self._release).result()
+        self._executor.submit(self._conn.close)
+        self._executor.shutdown(wait=True)
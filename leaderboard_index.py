@@ -0,0 +1,171 @@
+import random
+
+MAX_LEVEL = 32
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class LeaderboardIndex:
+    """Order-statistics index over user points.
+
+    Backed by an indexable skip list keyed by (-points, user_id), so ranks
+    are ordered by points descending with ties broken by user id. Updates,
+    rank-of-user and positional lookups are all O(log n) expected.
+    """
+
+    def __init__(self, points=None):
+        self._keys = {}  # user_id -> key currently in the list
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        if points:
+            self.load(points)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, user_id):
+        return int(user_id) in self._keys
+
+    # --- Mutation ---
+    def load(self, points):
+        """Rebuild from a {user_id: points} mapping in O(n log n)"""
+        self.clear()
+        keys = sorted((-value, int(uid)) for uid, value in points.items())
+        update = [self._head] * MAX_LEVEL
+        distance = [0] * MAX_LEVEL
+        for position, key in enumerate(keys, 1):
+            level = self._random_level()
+            node = _Node(key, level)
+            for i in range(level):
+                prev = update[i]
+                prev.next[i] = node
+                prev.width[i] = position - distance[i]
+                update[i] = node
+                distance[i] = position
+            self._level = max(self._level, level)
+            self._keys[key[1]] = key
+        # Widths of the last node on each level run to the end of the list
+        for i in range(MAX_LEVEL):
+            update[i].width[i] = len(keys) + 1 - distance[i]
+
+    def clear(self):
+        self._keys.clear()
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+
+    def update(self, user_id, value):
+        user_id = int(user_id)
+        old = self._keys.get(user_id)
+        key = (-value, user_id)
+        if old == key:
+            return
+        if old is not None:
+            self._remove(old)
+        self._insert(key)
+        self._keys[user_id] = key
+
+    def remove(self, user_id):
+        key = self._keys.pop(int(user_id), None)
+        if key is not None:
+            self._remove(key)
+
+    @staticmethod
+    def _random_level():
+        level = 1
+        while level < MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def _insert(self, key):
+        update = [None] * MAX_LEVEL
+        steps = [0] * MAX_LEVEL
+        node = self._head
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                steps[i] += node.width[i]
+                node = node.next[i]
+            update[i] = node
+
+        level = self._random_level()
+        self._level = max(self._level, level)
+        new = _Node(key, level)
+        travelled = 0
+        for i in range(level):
+            prev = update[i]
+            new.next[i] = prev.next[i]
+            prev.next[i] = new
+            new.width[i] = prev.width[i] - travelled
+            prev.width[i] = travelled + 1
+            travelled += steps[i]
+        for i in range(level, MAX_LEVEL):
+            update[i].width[i] += 1
+
+    def _remove(self, key):
+        update = [None] * MAX_LEVEL
+        node = self._head
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+
+        target = update[0].next[0]
+        for i in range(MAX_LEVEL):
+            prev = update[i]
+            if prev.next[i] is target:
+                prev.width[i] += target.width[i] - 1
+                prev.next[i] = target.next[i]
+            else:
+                prev.width[i] -= 1
+
+    # --- Queries ---
+    def rank(self, user_id):
+        """1-based rank of a user, or None if they have no points entry"""
+        key = self._keys.get(int(user_id))
+        if key is None:
+            return None
+        position = 0
+        node = self._head
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key <= key:
+                position += node.width[i]
+                node = node.next[i]
+        return position
+
+    def _node_at(self, index):
+        """Node at 0-based position index"""
+        position = index + 1
+        node = self._head
+        for i in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[i] is not None and node.width[i] <= position:
+                position -= node.width[i]
+                node = node.next[i]
+        return node
+
+    def slice(self, start, stop):
+        """[(rank, user_id, points), ...] for 0-based positions start..stop-1"""
+        stop = min(stop, len(self._keys))
+        if start >= stop:
+            return []
+        node = self._node_at(start)
+        rows = []
+        for rank in range(start + 1, stop + 1):
+            rows.append((rank, node.key[1], -node.key[0]))
+            node = node.next[0]
+        return rows
+
+    def top(self, k):
+        return self.slice(0, k)
+
+    def page(self, page, page_size=10):
+        """Rows for a 0-based page number"""
+        return self.slice(page * page_size, (page + 1) * page_size)
+
+    def page_count(self, page_size=10):
+        return max(1, -(-len(self._keys) // page_size))
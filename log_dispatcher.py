@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+
+class LogDispatcher:
+    """Background queue that packs log embeds into as few channel messages as possible.
+
+    Callers enqueue and return immediately. A single worker sends up to ten
+    embeds per message, flushing when a message is full or flush_interval
+    has passed since the first queued embed. A 429 pauses the worker for the
+    advertised retry_after and resends the same batch. When the queue is
+    full, embeds are spilled to a JSON-lines file and replayed once the
+    backlog clears; if even that fails they are dropped and counted. If
+    resolve_channel() returns None there is nowhere to log to (no channel
+    configured), and the batch is discarded without counting as a failure;
+    an error raised while resolving does count as one.
+    """
+
+    def __init__(self, resolve_channel, embed_from_dict, spill_path, max_queue=1000, flush_interval=2.0, on_event=None):
+        self.resolve_channel = resolve_channel
+        self.embed_from_dict = embed_from_dict
+        self.spill_path = spill_path
+        self.flush_interval = flush_interval
+        self.on_event = on_event or (lambda event_type, details: None)
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self.sent_messages = 0
+        self.sent_embeds = 0
+        self.failed = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.discarded = 0
+        self.rate_limited = 0
+
+    # --- Producer side ---
+    def enqueue(self, embed):
+        try:
+            self._queue.put_nowait(embed)
+        except asyncio.QueueFull:
+            self._spill([embed])
+
+    def _spill(self, embeds):
+        try:
+            with open(self.spill_path, 'a') as f:
+                for embed in embeds:
+                    f.write(json.dumps(embed.to_dict(), separators=(',', ':')) + "\n")
+            self.spilled += len(embeds)
+        except (OSError, TypeError, ValueError):
+            self.dropped += len(embeds)
+
+    def spill_pending(self):
+        """Write anything still queued to the spill file (used at shutdown)"""
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            self._spill(pending)
+
+    def _replay_spill(self):
+        """Move spilled embeds back into the queue once there is room for them"""
+        if not os.path.exists(self.spill_path):
+            return
+        replay_path = self.spill_path + ".replay"
+        try:
+            os.replace(self.spill_path, replay_path)
+            with open(replay_path, 'r') as f:
+                lines = f.readlines()
+            os.unlink(replay_path)
+        except OSError:
+            return
+        self.spilled -= min(self.spilled, len(lines))
+        for line in lines:
+            try:
+                self.enqueue(self.embed_from_dict(json.loads(line)))
+            except ValueError:
+                self.dropped += 1
+
+    # --- Worker ---
+    def start(self):
+        if self._task is None or self._task.done():
+            self._replay_spill()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Stop the worker and spill whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.spill_pending()
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queued": self.depth,
+            "messages": self.sent_messages,
+            "embeds": self.sent_embeds,
+            "failed": self.failed,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "discarded": self.discarded,
+            "rate_limited": self.rate_limited,
+        }
+
+    async def _run(self):
+        carry = None
+        while True:
+            first = carry if carry is not None else await self._queue.get()
+            carry = None
+            batch = [first]
+            chars = len(first)
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                if not self._queue.empty():
+                    embed = self._queue.get_nowait()
+                else:
+                    timeout = deadline - asyncio.get_running_loop().time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        embed = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if chars + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE:
+                    carry = embed
+                    break
+                batch.append(embed)
+                chars += len(embed)
+
+            await self._send(batch)
+            if self._queue.empty() and carry is None:
+                self._replay_spill()
+
+    async def _send(self, batch):
+        while True:
+            try:
+                channel = await self.resolve_channel()
+                if channel is None:
+                    self.discarded += len(batch)
+                    return
+                await channel.send(embeds=batch)
+                self.sent_messages += 1
+                self.sent_embeds += len(batch)
+                return
+            except Exception as e:
+                if getattr(e, 'status', None) != 429:
+                    self.failed += len(batch)
+                    self.on_event("LOG_SEND_FAILED", {"Error": str(e), "Embeds": len(batch)})
+                    return
+                retry_after = _retry_after(e)
+                self.rate_limited += 1
+                self.on_event("LOG_RATE_LIMITED", {"Retry After": f"{retry_after:.2f}s", "Queued": self.depth})
+                await asyncio.sleep(retry_after)
+
+
+def _retry_after(error):
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        try:
+            retry_after = float(headers.get('Retry-After', 1.0))
+        except (TypeError, ValueError):
+            retry_after = 1.0
+    return max(float(retry_after), 0.0)
@@ -0,0 +1,69 @@
+class ModIndex:
+    """Who may go on duty in one guild: moderators listed by user id, plus an optional moderator role.
+
+    The listed ids are kept in a dict used as an ordered set, so membership
+    is a hash lookup and /viewmods keeps the order moderators were added in.
+    allows() checks the member's cached role ids for role_id without
+    building a list, so a check is constant-time and allocates nothing.
+
+    `revision` counts local changes, so a reload read from disk can tell
+    whether the list changed underneath it; `version` is the storage
+    token (see Storage.mods_version) of the list last loaded.
+    """
+
+    def __init__(self, user_ids=(), role_id=None, version=None):
+        self._users = dict.fromkeys(int(user_id) for user_id in user_ids)
+        self.role_id = role_id
+        self.version = version
+        self.revision = 0
+
+    def __len__(self):
+        return len(self._users)
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def allows(self, member):
+        if member.id in self._users:
+            return True
+        role_id = self.role_id
+        return role_id is not None and member.get_role(role_id) is not None
+
+    # --- Mutation ---
+    def add(self, user_id):
+        """Returns False if the user was already listed"""
+        if user_id in self._users:
+            return False
+        self._users[user_id] = None
+        self.revision += 1
+        return True
+
+    def remove(self, user_id):
+        """Returns False if the user was not listed"""
+        if self._users.pop(user_id, False) is False:
+            return False
+        self.revision += 1
+        return True
+
+    def add_many(self, user_ids):
+        for user_id in user_ids:
+            self._users.setdefault(user_id)
+        self.revision += 1
+
+    def remove_many(self, user_ids):
+        for user_id in user_ids:
+            self._users.pop(user_id, None)
+        self.revision += 1
+
+    def replace(self, user_ids, version=None):
+        """Swap in a list read from storage; returns (added, removed) user id sets"""
+        fresh = dict.fromkeys(int(user_id) for user_id in user_ids)
+        added = fresh.keys() - self._users.keys()
+        removed = self._users.keys() - fresh.keys()
+        self._users = fresh
+        self.version = version
+        self.revision += 1
+        return added, removed
@@ -0,0 +1,243 @@
+import math
+
+from history import DAY, RECORD
+
+try:
+    import numpy as np
+except ImportError:  # batch recompute falls back to a pure-Python loop
+    np = None
+
+HOUR = 3600
+VECTORISED = np is not None
+
+if np is not None:
+    # Matches history.RECORD ("<QddHiB", packed, 31 bytes)
+    RECORD_DTYPE = np.dtype({
+        "names": ["user_id", "start", "end", "continues", "points", "auto"],
+        "formats": ["<u8", "<f8", "<f8", "<u2", "<i4", "u1"],
+        "offsets": [0, 8, 16, 24, 26, 30],
+        "itemsize": RECORD.size,
+    })
+
+
+def parse_hour_multipliers(spec):
+    """"22-6:1.5,12-14:1.2" -> 24 per-hour multipliers (UTC, end hour exclusive, ranges may wrap midnight)"""
+    multipliers = [1.0] * 24
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            hours, value = part.split(":")
+            first, last = (int(hour) for hour in hours.split("-"))
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"invalid hour range {part!r}; expected start-end:multiplier")
+        if not (0 <= first < 24 and 0 <= last <= 24) or first == last or value < 0:
+            raise ValueError(f"invalid hour range {part!r}")
+        for offset in range((last - first) % 24 or 24):
+            multipliers[(first + offset) % 24] = value
+    return multipliers
+
+
+def format_hour_multipliers(multipliers):
+    parts = []
+    hour = 0
+    while hour < 24:
+        end = hour
+        while end < 24 and multipliers[end] == multipliers[hour]:
+            end += 1
+        if multipliers[hour] != 1.0:
+            parts.append(f"{hour}-{end}:{multipliers[hour]:g}")
+        hour = end
+    return ",".join(parts)
+
+
+class PointRules:
+    """How many points a finished duty session earns.
+
+    base = whole minutes on duty // minutes_per_point, scaled by the
+    multiplier of the UTC hour the session started in and by
+    weekend_multiplier if it started on a Saturday or Sunday, then capped at
+    shift_cap. Auto-ended sessions are further scaled by auto_end_multiplier
+    and lose auto_end_penalty points, never going below zero. The defaults
+    reproduce the original minutes // 4.
+
+    score() is used live when a duty ends; score_many() applies exactly the
+    same arithmetic to whole arrays of sessions.
+    """
+
+    def __init__(self, minutes_per_point=4, hour_multipliers=None, weekend_multiplier=1.0, shift_cap=None,
+                 auto_end_multiplier=1.0, auto_end_penalty=0):
+        self.minutes_per_point = minutes_per_point
+        self.hour_multipliers = list(hour_multipliers or [1.0] * 24)
+        self.weekend_multiplier = weekend_multiplier
+        self.shift_cap = shift_cap
+        self.auto_end_multiplier = auto_end_multiplier
+        self.auto_end_penalty = auto_end_penalty
+
+    @classmethod
+    def from_dict(cls, data, minutes_per_point=4):
+        data = data or {}
+        return cls(
+            minutes_per_point,
+            parse_hour_multipliers(data.get("hours", "")),
+            data.get("weekend", 1.0),
+            data.get("cap"),
+            data.get("auto_multiplier", 1.0),
+            data.get("auto_penalty", 0),
+        )
+
+    def to_dict(self):
+        """Everything except the base rate, which lives in the guild config's point_minutes"""
+        return {
+            "hours": format_hour_multipliers(self.hour_multipliers),
+            "weekend": self.weekend_multiplier,
+            "cap": self.shift_cap,
+            "auto_multiplier": self.auto_end_multiplier,
+            "auto_penalty": self.auto_end_penalty,
+        }
+
+    def describe(self):
+        lines = [f"1 point per {self.minutes_per_point} minutes"]
+        hours = format_hour_multipliers(self.hour_multipliers)
+        if hours:
+            lines.append(f"Hour multipliers (UTC, by shift start): {hours}")
+        if self.weekend_multiplier != 1.0:
+            lines.append(f"Weekend multiplier: {self.weekend_multiplier:g}x")
+        if self.shift_cap is not None:
+            lines.append(f"At most {self.shift_cap} points per shift")
+        if self.auto_end_multiplier != 1.0 or self.auto_end_penalty:
+            lines.append(f"Auto-ended shifts: {self.auto_end_multiplier:g}x, then -{self.auto_end_penalty} points")
+        return lines
+
+    # --- Scoring ---
+    def score(self, start, end, auto):
+        """Points for one session; start and end in epoch seconds"""
+        base = int(max(0.0, end - start) // 60) // self.minutes_per_point
+        multiplier = self.hour_multipliers[int(start // HOUR) % 24]
+        if (int(start // DAY) + 3) % 7 >= 5:
+            multiplier = multiplier * self.weekend_multiplier
+        points = math.floor(base * multiplier)
+        if self.shift_cap is not None:
+            points = min(points, self.shift_cap)
+        if auto:
+            points = max(0, math.floor(points * self.auto_end_multiplier) - self.auto_end_penalty)
+        return points
+
+    def score_many(self, start, end, auto):
+        """Vectorised score() over NumPy arrays of start, end and auto flags"""
+        base = (np.maximum(end - start, 0.0) // 60).astype(np.int64) // self.minutes_per_point
+        multiplier = np.asarray(self.hour_multipliers, dtype=np.float64)[(start // HOUR).astype(np.int64) % 24]
+        weekend = ((start // DAY).astype(np.int64) + 3) % 7 >= 5
+        multiplier = np.where(weekend, multiplier * self.weekend_multiplier, multiplier)
+        points = np.floor(base * multiplier).astype(np.int64)
+        if self.shift_cap is not None:
+            points = np.minimum(points, self.shift_cap)
+        penalised = np.maximum(np.floor(points * self.auto_end_multiplier).astype(np.int64) - self.auto_end_penalty, 0)
+        return np.where(auto != 0, penalised, points)
+
+
+class Rescore:
+    """Result of re-scoring a block of history records under a set of rules.
+
+    Only records whose points change are kept: their positions and new
+    points (to patch the history file), per-user old/new totals (the diff
+    report and the points table adjustment) and per-(day, user) deltas (to
+    patch the history rollups).
+    """
+
+    def __init__(self, count, indices, points, user_diffs, day_deltas):
+        self.count = count  # records scored (those in range)
+        self.indices = indices
+        self.points = points
+        self.user_diffs = user_diffs  # {user_id: (old total, new total)}, changed users only
+        self.day_deltas = day_deltas  # {(day, user_id): points delta}
+
+    @property
+    def sessions_changed(self):
+        return len(self.indices)
+
+    @property
+    def old_total(self):
+        return sum(old for old, _ in self.user_diffs.values())
+
+    @property
+    def new_total(self):
+        return sum(new for _, new in self.user_diffs.values())
+
+    def report_csv(self):
+        lines = ["user_id,old_points,new_points,delta"]
+        for user_id, (old, new) in sorted(self.user_diffs.items(), key=lambda item: item[1][1] - item[1][0]):
+            lines.append(f"{user_id},{old},{new},{new - old}")
+        return "\n".join(lines) + "\n"
+
+
+def rescore_records(data, rules, ended_after=None):
+    """Re-score packed history records (bytes in history.RECORD format), vectorised when NumPy is installed.
+
+    With ended_after (epoch seconds) only sessions that ended at or after it
+    are scored; earlier ones keep their points. Indices stay positions in
+    the whole of data.
+    """
+    count = len(data) // RECORD.size
+    data = memoryview(data)[:count * RECORD.size]
+    if np is not None:
+        return _rescore_numpy(data, count, rules, ended_after)
+    return _rescore_python(data, count, rules, ended_after)
+
+
+def _rescore_numpy(data, count, rules, ended_after):
+    records = np.frombuffer(data, dtype=RECORD_DTYPE, count=count)
+    old = records["points"].astype(np.int64)
+    new = rules.score_many(records["start"], records["end"], records["auto"])
+    if ended_after is not None:
+        in_range = records["end"] >= ended_after
+        new = np.where(in_range, new, old)
+        count = int(np.count_nonzero(in_range))
+    indices = np.nonzero(new != old)[0]
+    user_ids = records["user_id"][indices]
+    deltas = (new - old)[indices]
+
+    users, inverse = np.unique(user_ids, return_inverse=True)
+    old_sums = np.bincount(inverse, weights=old[indices], minlength=len(users)).astype(np.int64)
+    new_sums = np.bincount(inverse, weights=new[indices], minlength=len(users)).astype(np.int64)
+    user_diffs = {
+        user_id: (old_sum, new_sum)
+        for user_id, old_sum, new_sum in zip(users.tolist(), old_sums.tolist(), new_sums.tolist())
+        if old_sum != new_sum
+    }
+
+    # Sum deltas per (day, user) through one int64 key: day offset * user count + user position
+    days = (records["start"][indices] // DAY).astype(np.int64)
+    first_day = days.min() if len(days) else 0
+    day_keys, key_inverse = np.unique((days - first_day) * len(users) + inverse, return_inverse=True)
+    day_sums = np.bincount(key_inverse, weights=deltas, minlength=len(day_keys)).astype(np.int64)
+    user_list = users.tolist()
+    day_deltas = {
+        (int(first_day) + key // len(users), user_list[key % len(users)]): delta
+        for key, delta in zip(day_keys.tolist(), day_sums.tolist())
+        if delta
+    }
+
+    return Rescore(count, indices.tolist(), new[indices].tolist(), user_diffs, day_deltas)
+
+
+def _rescore_python(data, count, rules, ended_after):
+    score = rules.score
+    indices = []
+    points = []
+    sums = {}
+    day_deltas = {}
+    for index, (user_id, start, end, _, old, auto) in enumerate(RECORD.iter_unpack(data)):
+        if ended_after is not None and end < ended_after:
+            count -= 1
+            continue
+        new = score(start, end, auto)
+        if new != old:
+            indices.append(index)
+            points.append(new)
+            row = sums.setdefault(user_id, [0, 0])
+            row[0] += old
+            row[1] += new
+            key = (int(start // DAY), user_id)
+            day_deltas[key] = day_deltas.get(key, 0) + new - old
+    user_diffs = {user_id: (old, new) for user_id, (old, new) in sums.items() if old != new}
+    return Rescore(count, indices, points, user_diffs, {key: delta for key, delta in day_deltas.items() if delta})
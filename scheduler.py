@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import itertools
+
+
+class DutyScheduler:
+    """Single timer heap for every per-user duty event (reminders, expiries).
+
+    Entries are keyed by (kind, user_id); scheduling pushes onto the heap in
+    O(log n) and cancelling just forgets the key, so stale heap entries are
+    skipped when they surface and the heap is rebuilt if they pile up. One
+    background task sleeps until the earliest deadline and hands everything
+    that is due to the handler in batches.
+    """
+
+    def __init__(self, handler, max_batch=256):
+        self.handler = handler
+        self.max_batch = max_batch
+        self._heap = []
+        self._entries = {}  # (kind, user_id) -> (due, seq)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._batches = set()
+        self.lag = 0.0  # seconds the last batch fired after its earliest deadline
+        self.fired = 0
+
+    @staticmethod
+    def _now():
+        return asyncio.get_running_loop().time()
+
+    # --- Scheduling ---
+    def schedule(self, kind, user_id, delay):
+        """(Re)schedule an event delay seconds from now, replacing any pending one with the same key"""
+        due = self._now() + delay
+        seq = next(self._seq)
+        key = (kind, user_id)
+        self._entries[key] = (due, seq)
+        heapq.heappush(self._heap, (due, seq, key))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, kind, user_id):
+        if self._entries.pop((kind, user_id), None) is not None:
+            self._maybe_rebuild()
+
+    def cancel_user(self, user_id, kinds):
+        for kind in kinds:
+            self._entries.pop((kind, user_id), None)
+        self._maybe_rebuild()
+
+    def clear(self):
+        """Forget every pending event (e.g. when another process takes over the timers)"""
+        self._entries.clear()
+        self._heap.clear()
+
+    def is_scheduled(self, kind, user_id):
+        return (kind, user_id) in self._entries
+
+    def due_in(self, kind, user_id):
+        entry = self._entries.get((kind, user_id))
+        return None if entry is None else entry[0] - self._now()
+
+    def _maybe_rebuild(self):
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [(due, seq, key) for key, (due, seq) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    # --- Monitoring ---
+    @property
+    def depth(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"depth": self.depth, "heap": len(self._heap), "lag": round(self.lag, 3), "fired": self.fired}
+
+    # --- Runner ---
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._next_delay()
+            if delay is None:
+                await self._wakeup.wait()
+                continue
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue  # an earlier deadline was scheduled
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._pop_due()
+            if batch:
+                task = asyncio.create_task(self.handler(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    def _next_delay(self):
+        while self._heap:
+            due, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return due - self._now()
+            heapq.heappop(self._heap)  # cancelled or superseded
+        return None
+
+    def _pop_due(self):
+        now = self._now()
+        batch = []
+        while self._heap and len(batch) < self.max_batch:
+            due, seq, key = self._heap[0]
+            if due > now:
+                break
+            heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != seq:
+                continue
+            del self._entries[key]
+            if not batch:
+                self.lag = now - due
+            batch.append(key)
+        self.fired += len(batch)
+        return batch
@@ -0,0 +1,226 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+
+from journal import atomic_write_json
+
+MAGIC = b"DUTYSEASON1\n"
+TRAILER = struct.Struct("<Q")  # footer length, written just before the closing MAGIC
+RANK_ROW = struct.Struct("<Qq")  # user_id, points; rank is the row position
+USER_ROW = struct.Struct("<QqI")  # user_id, points, rank
+BLOCK_ROWS = 1024
+MANIFEST_FILE = "seasons.json"
+
+
+def write_archive(path, points, meta):
+    """Freeze a {user_id: points} table into an immutable, block-compressed archive.
+
+    The file holds the table twice, each split into zlib blocks of
+    BLOCK_ROWS rows: once ordered by rank (for leaderboard pages) and once
+    by user id (for per-user lookups), followed by a JSON footer indexing
+    the blocks. Readers decompress only the block they need. Written to a
+    temp file and renamed into place; returns the footer.
+    """
+    ranked = sorted(((int(user_id), value) for user_id, value in points.items() if value), key=lambda row: (-row[1], row[0]))
+    by_user = sorted((user_id, value, rank) for rank, (user_id, value) in enumerate(ranked, 1))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            rank_blocks = []
+            for start in range(0, len(ranked), BLOCK_ROWS):
+                block = zlib.compress(b"".join(RANK_ROW.pack(*row) for row in ranked[start:start + BLOCK_ROWS]), 6)
+                rank_blocks.append([f.tell(), len(block)])
+                f.write(block)
+            user_blocks = []
+            for start in range(0, len(by_user), BLOCK_ROWS):
+                block = zlib.compress(b"".join(USER_ROW.pack(*row) for row in by_user[start:start + BLOCK_ROWS]), 6)
+                user_blocks.append([by_user[start][0], f.tell(), len(block)])
+                f.write(block)
+            footer = dict(meta, users=len(ranked), total=sum(value for _, value in ranked), block_rows=BLOCK_ROWS,
+                          rank_blocks=rank_blocks, user_blocks=user_blocks)
+            encoded = json.dumps(footer, separators=(',', ':')).encode()
+            f.write(encoded)
+            f.write(TRAILER.pack(len(encoded)))
+            f.write(MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return footer
+
+
+class SeasonArchive:
+    """Read-only view of one archived season, memory-mapped and decompressed a block at a time.
+
+    Offers the same page/page_count/rank/len interface as LeaderboardIndex,
+    plus points(user_id). Only the footer and a few recently used blocks
+    are held in memory.
+    """
+
+    def __init__(self, path, cached_blocks=8):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._map) - len(MAGIC)
+        if self._map[:len(MAGIC)] != MAGIC or self._map[end:] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a season archive")
+        (footer_length,) = TRAILER.unpack_from(self._map, end - TRAILER.size)
+        footer_start = end - TRAILER.size - footer_length
+        self.meta = json.loads(self._map[footer_start:footer_start + footer_length])
+        self._rank_blocks = self.meta.pop("rank_blocks")
+        self._user_blocks = self.meta.pop("user_blocks")
+        self._first_user_ids = [first for first, _, _ in self._user_blocks]
+        self._block_rows = self.meta["block_rows"]
+        self._cache = OrderedDict()
+        self._cached_blocks = cached_blocks
+
+    def __len__(self):
+        return self.meta["users"]
+
+    def _block(self, offset, length):
+        data = self._cache.get(offset)
+        if data is None:
+            data = self._cache[offset] = zlib.decompress(self._map[offset:offset + length])
+            if len(self._cache) > self._cached_blocks:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(offset)
+        return data
+
+    def _user_row(self, user_id):
+        index = bisect.bisect_right(self._first_user_ids, user_id) - 1
+        if index < 0:
+            return None
+        _, offset, length = self._user_blocks[index]
+        data = self._block(offset, length)
+        low, high = 0, len(data) // USER_ROW.size
+        while low < high:  # binary search inside the block
+            middle = (low + high) // 2
+            row = USER_ROW.unpack_from(data, middle * USER_ROW.size)
+            if row[0] < user_id:
+                low = middle + 1
+            elif row[0] > user_id:
+                high = middle
+            else:
+                return row
+        return None
+
+    def points(self, user_id):
+        row = self._user_row(int(user_id))
+        return row[1] if row else 0
+
+    def rank(self, user_id):
+        row = self._user_row(int(user_id))
+        return row[2] if row else None
+
+    def slice(self, start, stop):
+        """[(rank, user_id, points), ...] for 0-based positions start..stop-1"""
+        stop = min(stop, len(self))
+        rows = []
+        position = start
+        while position < stop:
+            block_index, offset_in_block = divmod(position, self._block_rows)
+            data = self._block(*self._rank_blocks[block_index])
+            take = min(stop - position, self._block_rows - offset_in_block)
+            for i in range(offset_in_block, offset_in_block + take):
+                user_id, value = RANK_ROW.unpack_from(data, i * RANK_ROW.size)
+                rows.append((block_index * self._block_rows + i + 1, user_id, value))
+            position += take
+        return rows
+
+    def page(self, page, page_size=10):
+        return self.slice(page * page_size, (page + 1) * page_size)
+
+    def page_count(self, page_size=10):
+        return max(1, -(-len(self) // page_size))
+
+    def close(self):
+        self._cache.clear()
+        self._map.close()
+        self._file.close()
+
+
+class SeasonIndex:
+    """The archived seasons of one guild.
+
+    Only the small manifest is loaded up front; an archive is opened (and
+    memory-mapped) the first time it is queried, and at most max_open stay
+    open.
+    """
+
+    def __init__(self, directory, max_open=4):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.max_open = max_open
+        self.seasons = []  # manifest entries, oldest first
+        self._open = OrderedDict()  # season number -> SeasonArchive
+
+    def load(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                seasons = json.load(f)
+        except FileNotFoundError:
+            seasons = []
+        if seasons != self.seasons:
+            self.close()
+            self.seasons = seasons
+        return len(self.seasons)
+
+    @property
+    def current(self):
+        """Number of the season in progress"""
+        return self.seasons[-1]["season"] + 1 if self.seasons else 1
+
+    @property
+    def current_started(self):
+        return self.seasons[-1]["ended"] if self.seasons else None
+
+    def entry(self, season):
+        for entry in self.seasons:
+            if entry["season"] == season:
+                return entry
+        return None
+
+    def archive(self, season):
+        """The archive of a past season, or None if there is no such season"""
+        archive = self._open.get(season)
+        if archive is None:
+            entry = self.entry(season)
+            if entry is None:
+                return None
+            archive = self._open[season] = SeasonArchive(os.path.join(self.directory, entry["file"]))
+            if len(self._open) > self.max_open:
+                self._open.popitem(last=False)[1].close()
+        else:
+            self._open.move_to_end(season)
+        return archive
+
+    def freeze(self, points, name, ended):
+        """Write the archive of the current season and add it to the manifest; call from a worker thread"""
+        season = self.current
+        filename = f"season-{season}.dsa"
+        meta = {"season": season, "name": name or f"Season {season}", "started": self.current_started, "ended": ended}
+        footer = write_archive(os.path.join(self.directory, filename), points, meta)
+        entry = dict(meta, file=filename, users=footer["users"], total=footer["total"])
+        atomic_write_json(self.manifest_path, self.seasons + [entry])
+        self.seasons = self.seasons + [entry]
+        return entry
+
+    def close(self):
+        for archive in self._open.values():
+            archive.close()
+        self._open.clear()
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from journal import DutyJournal, PointsJournal, atomic_write_json
+
+
+class Storage:
+    """Base class for persistence backends.
+
+    Every write is submitted to a single worker thread so it never blocks the
+    Discord loop, and reads go through the same thread so they always observe
+    earlier writes.
+    """
+
+    def __init__(self, on_error=None):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=type(self).__name__)
+        self._on_error = on_error
+
+    def _submit(self, fn, *args):
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._report_error)
+        return future
+
+    def _report_error(self, future):
+        error = future.exception()
+        if error is not None and self._on_error is not None:
+            self._on_error(error)
+
+    async def _query(self, fn, *args):
+        return await asyncio.wrap_future(self._executor.submit(fn, *args))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    # --- Backend interface ---
+    def load_points(self):
+        raise NotImplementedError
+
+    def add_points(self, user_id, amount):
+        raise NotImplementedError
+
+    def add_points_many(self, deltas):
+        """Apply {user_id: amount} as a single write"""
+        raise NotImplementedError
+
+    def reset_points(self):
+        raise NotImplementedError
+
+    async def get_points(self, user_id):
+        raise NotImplementedError
+
+    def load_mods(self):
+        raise NotImplementedError
+
+    def save_mods(self, mods):
+        raise NotImplementedError
+
+    def mods_version(self):
+        """Cheap token that changes when the stored moderator list may have changed, including from outside the bot.
+
+        Answered by the worker thread, so every write submitted before the
+        call is already reflected in it.
+        """
+        raise NotImplementedError
+
+    def load_duties(self):
+        """Active duty records as dicts with user_id, start, last_continue (epoch seconds) and continues"""
+        raise NotImplementedError
+
+    def save_duty(self, record):
+        raise NotImplementedError
+
+    def delete_duty(self, user_id):
+        raise NotImplementedError
+
+
+class JsonStorage(Storage):
+    """The original flat-file layout: journaled points.json and authorized_mods.json.
+
+    Point reads are served from the dict returned by load_points, which the
+    caller keeps current as it records deltas.
+    """
+
+    def __init__(self, points_file, mods_file, duties_file, on_error=None):
+        super().__init__(on_error)
+        self.points_file = points_file
+        self.mods_file = mods_file
+        self.journal = PointsJournal(points_file, on_error=on_error)
+        self.duties = DutyJournal(duties_file, on_error=on_error)
+        self._points = {}
+
+    def load_points(self):
+        self._points = self.journal.load()
+        return self._points
+
+    def add_points(self, user_id, amount):
+        self.journal.add(str(user_id), amount)
+
+    def add_points_many(self, deltas):
+        self.journal.add_many({str(user_id): amount for user_id, amount in deltas.items()})
+
+    def reset_points(self):
+        self.journal.reset()
+
+    async def get_points(self, user_id):
+        return self._points.get(str(user_id), 0)
+
+    def load_mods(self):
+        with open(self.mods_file, 'r') as f:
+            return json.load(f)
+
+    def save_mods(self, mods):
+        self._submit(atomic_write_json, self.mods_file, list(mods))
+
+    def mods_version(self):
+        return self._executor.submit(self._mods_stat).result()
+
+    def _mods_stat(self):
+        # atomic_write_json renames a new file into place, so the inode changes even within one mtime tick
+        try:
+            stat = os.stat(self.mods_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def load_duties(self):
+        return list(self.duties.load().values())
+
+    def save_duty(self, record):
+        self.duties.put(record["user_id"], record)
+
+    def delete_duty(self, user_id):
+        self.duties.delete(user_id)
+
+    def close(self):
+        super().close()
+        self.journal.close()
+        self.duties.close()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS points (
+    user_id INTEGER PRIMARY KEY,
+    points INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS authorized_mods (
+    user_id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS active_duties (
+    user_id INTEGER PRIMARY KEY,
+    start REAL NOT NULL,
+    last_continue REAL NOT NULL,
+    continues INTEGER NOT NULL,
+    reminder_seq INTEGER NOT NULL DEFAULT 0,
+    awaiting_seq INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Columns added after a table was first created: table -> [(column, definition)]
+ADDED_COLUMNS = {
+    "active_duties": [
+        ("reminder_seq", "INTEGER NOT NULL DEFAULT 0"),
+        ("awaiting_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ],
+}
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, definition in columns:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return conn
+
+
+class SqliteStorage(Storage):
+    """SQLite database in WAL mode; the connection is only ever used from the worker thread"""
+
+    def __init__(self, path, on_error=None):
+        super().__init__(on_error)
+        self.path = path
+        self._conn = self._executor.submit(connect, path).result()
+        self._mods = set()
+
+    def load_points(self):
+        rows = self._executor.submit(self._fetchall, "SELECT user_id, points FROM points", ()).result()
+        return {str(user_id): value for user_id, value in rows}
+
+    def add_points(self, user_id, amount):
+        self._submit(
+            self._conn.execute,
+            "INSERT INTO points (user_id, points) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET points = points + excluded.points",
+            (int(user_id), amount),
+        )
+
+    def add_points_many(self, deltas):
+        self._submit(self._apply_point_deltas, [(int(user_id), amount) for user_id, amount in deltas.items()])
+
+    def _apply_point_deltas(self, rows):
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT INTO points (user_id, points) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET points = points + excluded.points",
+                rows,
+            )
+
+    def reset_points(self):
+        self._submit(self._conn.execute, "DELETE FROM points")
+
+    async def get_points(self, user_id):
+        row = await self._query(self._fetchone, "SELECT points FROM points WHERE user_id = ?", (int(user_id),))
+        return row[0] if row else 0
+
+    def load_mods(self):
+        rows = self._executor.submit(self._fetchall, "SELECT user_id FROM authorized_mods", ()).result()
+        self._mods = {user_id for (user_id,) in rows}
+        return [user_id for (user_id,) in rows]
+
+    def save_mods(self, mods):
+        # Only the difference from the last saved list is written
+        current = set(mods)
+        added = [(uid,) for uid in current - self._mods]
+        removed = [(uid,) for uid in self._mods - current]
+        self._mods = current
+        if added or removed:
+            self._submit(self._apply_mods, added, removed)
+
+    def mods_version(self):
+        # Bumped whenever another connection (another replica, or an edit from outside the bot) commits
+        return self._executor.submit(self._fetchone, "PRAGMA data_version", ()).result()[0]
+
+    def _apply_mods(self, added, removed):
+        with self._transaction():
+            self._conn.executemany("INSERT OR IGNORE INTO authorized_mods (user_id) VALUES (?)", added)
+            self._conn.executemany("DELETE FROM authorized_mods WHERE user_id = ?", removed)
+
+    def load_duties(self):
+        rows = self._executor.submit(
+            self._fetchall,
+            "SELECT user_id, start, last_continue, continues, reminder_seq, awaiting_seq FROM active_duties",
+            (),
+        ).result()
+        keys = ("user_id", "start", "last_continue", "continues", "reminder_seq", "awaiting_seq")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def save_duty(self, record):
+        self._submit(
+            self._conn.execute,
+            "INSERT OR REPLACE INTO active_duties (user_id, start, last_continue, continues, reminder_seq, awaiting_seq) "
+            "VALUES (:user_id, :start, :last_continue, :continues, :reminder_seq, :awaiting_seq)",
+            record,
+        )
+
+    def delete_duty(self, user_id):
+        self._submit(self._conn.execute, "DELETE FROM active_duties WHERE user_id = ?", (int(user_id),))
+
+    def _fetchone(self, sql, params):
+        return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def close(self):
+        self._executor.submit(self._conn.close)
+        super().close()
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def migrate_json_to_sqlite(points_file, mods_file, db_path, duties_file=None):
+    """One-shot import of the JSON files, open duties included, into a SQLite database"""
+    points = PointsJournal(points_file)
+    data = points.load()
+    points.close()
+    duty_records = []
+    if duties_file is not None:
+        journal = DutyJournal(duties_file)
+        # Records checkpointed before reminders were tracked lack the reminder fields
+        duty_records = [{"reminder_seq": 0, "awaiting_seq": 0, **record} for record in journal.load().values()]
+        journal.close()
+    try:
+        with open(mods_file, 'r') as f:
+            mods = json.load(f)
+    except FileNotFoundError:
+        mods = []
+
+    conn = connect(db_path)
+    with _Transaction(conn):
+        conn.executemany(
+            "INSERT INTO points (user_id, points) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET points = excluded.points",
+            [(int(uid), value) for uid, value in data.items()],
+        )
+        conn.executemany("INSERT OR IGNORE INTO authorized_mods (user_id) VALUES (?)", [(int(uid),) for uid in mods])
+        conn.executemany(
+            "INSERT OR REPLACE INTO active_duties (user_id, start, last_continue, continues, reminder_seq, awaiting_seq) "
+            "VALUES (:user_id, :start, :last_continue, :continues, :reminder_seq, :awaiting_seq)",
+            duty_records,
+        )
+    conn.close()
+    return len(data), len(mods), len(duty_records)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python storage.py migrate [points.json] [authorized_mods.json] [duty_bot.db] [active_duties.json]")
+        sys.exit(1)
+    args = sys.argv[2:] + ["points.json", "authorized_mods.json", "duty_bot.db", "active_duties.json"][len(sys.argv) - 2:]
+    user_count, mod_count, duty_count = migrate_json_to_sqlite(args[0], args[1], args[2], args[3])
+    print(f"Migrated {user_count} point totals, {mod_count} moderators and {duty_count} active duties into {args[2]}")
@@ -0,0 +1,30 @@
+from storage import JsonStorage, SqliteStorage, migrate_json_to_sqlite
+
+
+def test_migrate_json_to_sqlite_keeps_open_duties(tmp_path):
+    points_file, mods_file, duties_file = (str(tmp_path / name) for name in ("points.json", "authorized_mods.json", "active_duties.json"))
+    db_path = str(tmp_path / "duty_bot.db")
+    (tmp_path / "authorized_mods.json").write_text("[11, 12]")
+    duties = [
+        {"user_id": 11, "start": 1000.0, "last_continue": 1600.0, "continues": 1, "reminder_seq": 2, "awaiting_seq": 2},
+        {"user_id": 12, "start": 2000.0, "last_continue": 2000.0, "continues": 0},
+    ]
+
+    json_storage = JsonStorage(points_file, mods_file, duties_file)
+    json_storage.load_points()
+    json_storage.load_duties()
+    json_storage.add_points(11, 5)
+    for record in duties + [dict(duties[0], user_id=13)]:
+        json_storage.save_duty(record)
+    json_storage.delete_duty(13)  # ended before the migration
+    json_storage.close()
+
+    assert migrate_json_to_sqlite(points_file, mods_file, db_path, duties_file) == (1, 2, 2)
+
+    sqlite_storage = SqliteStorage(db_path)
+    try:
+        assert sqlite_storage.load_points() == {"11": 5}
+        restored = sorted(sqlite_storage.load_duties(), key=lambda record: record["user_id"])
+    finally:
+        sqlite_storage.close()
+    assert restored == [duties[0], dict(duties[1], reminder_seq=0, awaiting_seq=0)]
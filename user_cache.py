@@ -0,0 +1,123 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class UserResolver:
+    """Resolves user ids to User objects with as few REST calls as possible.
+
+    Lookups try the TTL/LRU cache first, then the gateway cache
+    (bot.get_user and the members of the guild the lookup is for, if
+    given), and only then fetch_user, with at
+    most `concurrency` fetches in flight. Unknown users are cached as None
+    so deleted accounts don't cost a request every time.
+    """
+
+    def __init__(self, bot, max_size=5000, ttl=600, negative_ttl=120, concurrency=8):
+        self.bot = bot
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = OrderedDict()  # user_id -> (expires_at, user or None)
+        self._inflight = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.cache_hits = 0
+        self.gateway_hits = 0
+        self.fetches = 0
+        self.failures = 0
+
+    # --- Cache ---
+    def _get_cached(self, user_id):
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return _MISSING
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._cache[user_id]
+            return _MISSING
+        self._cache.move_to_end(user_id)
+        return user
+
+    def _store(self, user_id, user, ttl):
+        self._cache[user_id] = (time.monotonic() + ttl, user)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self._cache.pop(user_id, None)
+
+    def _from_gateway(self, user_id, guild_id):
+        user = self.bot.get_user(user_id)
+        if user is not None or guild_id is None:
+            return user
+        guild = self.bot.get_guild(guild_id)
+        return guild.get_member(user_id) if guild is not None else None
+
+    # --- Resolution ---
+    def get(self, user_id, guild_id=None):
+        """Resolve from memory only; returns None if a REST call would be needed"""
+        user = self._get_cached(user_id)
+        if user is not _MISSING:
+            self.cache_hits += 1
+            return user
+        user = self._from_gateway(user_id, guild_id)
+        if user is not None:
+            self.gateway_hits += 1
+            self._store(user_id, user, self.ttl)
+        return user
+
+    async def resolve(self, user_id, guild_id=None):
+        user_id = int(user_id)
+        user = self._get_cached(user_id)
+        if user is not _MISSING:
+            self.cache_hits += 1
+            return user
+        user = self._from_gateway(user_id, guild_id)
+        if user is not None:
+            self.gateway_hits += 1
+            self._store(user_id, user, self.ttl)
+            return user
+
+        # Concurrent lookups of the same id share one request
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, user_id):
+        async with self._semaphore:
+            self.fetches += 1
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except Exception as e:
+                self.failures += 1
+                if getattr(e, 'status', None) == 404:
+                    self._store(user_id, None, self.negative_ttl)
+                return None
+        self._store(user_id, user, self.ttl)
+        return user
+
+    async def resolve_many(self, user_ids, guild_id=None):
+        """Resolve several ids concurrently, preserving order"""
+        return await asyncio.gather(*(self.resolve(user_id, guild_id) for user_id in user_ids))
+
+    # --- Stats ---
+    @property
+    def hit_rate(self):
+        lookups = self.cache_hits + self.gateway_hits + self.fetches
+        return (self.cache_hits + self.gateway_hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "gateway_hits": self.gateway_hits,
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "hit_rate": round(self.hit_rate, 3),
+        }